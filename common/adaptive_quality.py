@@ -0,0 +1,154 @@
+import time
+
+# Closed-loop JPEG quality, output scale and publish rate for the frame
+# publishers (detection_main.py, feed_streamer/zmq_publisher.py).
+#
+# Two signals, each steering what it is best at:
+#   encoder time  -> scale. Encoding cost follows the pixel count, so an
+#                    encoder over its time budget gets a smaller image, and
+#                    a larger one back once the estimate for it fits.
+#   bridge feedback (feedback stream, sent by feed_streamer/bridge.py about
+#   twice a second: lag of the newest frame, share of client sends dropped)
+#                 -> quality first, then frame rate (then scale). Congestion
+#                    lowers quality to its floor before it costs frames;
+#                    when the link is healthy the frame rate comes back
+#                    first.
+#
+# Hysteresis: each signal has separate "bad" and "good" thresholds, a bad
+# state must persist for down_after seconds and a good one for up_after
+# seconds before a step, and every step restarts both clocks. Without
+# fresh feedback (no bridge, or it stopped) quality and rate hold still.
+#
+#   controller = AdaptiveQuality()
+#   if controller.due(now):                   # publish rate
+#       resize by controller.scale, encode with controller.quality
+#       controller.observe_encode(seconds)
+#       message["encoding"] = controller.settings()
+#   controller.feedback(json message from the feedback stream)
+#   controller.update(now)
+
+class AdaptiveQuality:
+    def __init__(self, quality=(40, 90), quality_step=10, scales=(1.0, 0.75, 0.5), fps=(5.0, 30.0),
+                 encode_budget=0.010, lag_high=0.25, lag_low=0.08, drop_high=0.10, drop_low=0.02,
+                 down_after=0.5, up_after=3.0, feedback_timeout=2.0, start_quality=80):
+        self.min_quality, self.max_quality = quality
+        self.quality_step = quality_step
+        self.scales = sorted(scales, reverse=True)
+        self.min_fps, self.max_fps = fps
+        self.encode_budget = encode_budget
+        self.lag_high, self.lag_low = lag_high, lag_low
+        self.drop_high, self.drop_low = drop_high, drop_low
+        self.down_after, self.up_after = down_after, up_after
+        self.feedback_timeout = feedback_timeout
+
+        self.quality = max(self.min_quality, min(self.max_quality, start_quality))
+        self.scale_index = 0
+        self.fps = self.max_fps
+        self.encode_time = None   # EWMA of the encode time, seconds
+        self.lag = None
+        self.drop_rate = None
+        self.feedback_time = None
+        self.changes = 0
+        self.next_frame = 0.0
+        self.encode_since = {"over": None, "under": None}
+        self.link_since = {"bad": None, "good": None}
+
+    @property
+    def scale(self):
+        return self.scales[self.scale_index]
+
+    def settings(self):
+        return {"quality": self.quality, "scale": self.scale, "fps": round(self.fps, 2)}
+
+    def due(self, now=None):
+        # True when the next frame should be published at the current rate.
+        now = time.monotonic() if now is None else now
+        period = 1.0 / self.fps
+        # A little early still counts (capture jitter at the camera's own rate)
+        if now < self.next_frame - 0.2 * period:
+            return False
+        # Catch up by at most one period instead of bursting after a stall
+        self.next_frame = max(self.next_frame, now - period) + period
+        return True
+
+    def observe_encode(self, seconds):
+        # Encode time at the current scale (resize included).
+        if self.encode_time is None:
+            self.encode_time = seconds
+        else:
+            self.encode_time += 0.2 * (seconds - self.encode_time)
+
+    def feedback(self, message, now=None):
+        self.lag = message.get("lag")
+        self.drop_rate = message.get("drop_rate")
+        self.feedback_time = time.monotonic() if now is None else now
+
+    def _held(self, clocks, state, condition, now):
+        # Seconds `state` has held, tracking entry into it; None if not in it.
+        if not condition:
+            clocks[state] = None
+            return None
+        if clocks[state] is None:
+            clocks[state] = now
+        return now - clocks[state]
+
+    def _changed(self):
+        self.changes += 1
+        for clocks in (self.encode_since, self.link_since):
+            for state in clocks:
+                clocks[state] = None
+        # The encode estimate belongs to the old scale
+        self.encode_time = None
+        return True
+
+    def update(self, now=None):
+        # Apply at most one step; True if the settings changed.
+        now = time.monotonic() if now is None else now
+        fresh = self.feedback_time is not None and now - self.feedback_time <= self.feedback_timeout
+
+        if self.encode_time is not None:
+            over = self._held(self.encode_since, "over", self.encode_time > self.encode_budget, now)
+            # Would the next larger scale still fit with some margin?
+            larger = self.scales[self.scale_index - 1] if self.scale_index > 0 else None
+            fits = larger is not None and \
+                self.encode_time * (larger / self.scale) ** 2 < 0.8 * self.encode_budget
+            under = self._held(self.encode_since, "under", fits, now)
+            if over is not None and over >= self.down_after and self.scale_index < len(self.scales) - 1:
+                self.scale_index += 1
+                return self._changed()
+            if under is not None and under >= self.up_after and not (fresh and self._link_bad()):
+                self.scale_index -= 1
+                return self._changed()
+
+        if not fresh:
+            self.link_since["bad"] = self.link_since["good"] = None
+            return False
+        bad = self._held(self.link_since, "bad", self._link_bad(), now)
+        good = self._held(self.link_since, "good", self._link_good(), now)
+        if bad is not None and bad >= self.down_after:
+            if self.quality > self.min_quality:
+                self.quality = max(self.min_quality, self.quality - self.quality_step)
+                return self._changed()
+            if self.fps > self.min_fps:
+                self.fps = max(self.min_fps, self.fps * 0.75)
+                return self._changed()
+            if self.scale_index < len(self.scales) - 1:
+                # Last resort; the encoder rule probes the larger size again
+                self.scale_index += 1
+                return self._changed()
+        if good is not None and good >= self.up_after:
+            if self.fps < self.max_fps:
+                self.fps = min(self.max_fps, self.fps / 0.75)
+                return self._changed()
+            if self.quality < self.max_quality:
+                self.quality = min(self.max_quality, self.quality + self.quality_step)
+                return self._changed()
+        return False
+
+    def _link_bad(self):
+        return (self.lag is not None and self.lag > self.lag_high) or \
+               (self.drop_rate is not None and self.drop_rate > self.drop_high)
+
+    def _link_good(self):
+        return (self.lag is None or self.lag < self.lag_low) and \
+               (self.drop_rate is None or self.drop_rate < self.drop_low)
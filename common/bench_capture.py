@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+# How stale the frames get in each capture mode (common/capture.py) when
+# the processing is slower than the source. A file is played as if it
+# were a camera: the frame that "should" be current is elapsed time x fps,
+# and each frame carries its index in its pixels, so the staleness is how
+# many frames behind that the read one is. Without --source a short test
+# file is written first. "test" (videotestsrc) and cameras have no frame
+# index, so only the frame age and skipped frames are shown for them.
+#
+#   python3 common/bench_capture.py [--source clip.mp4|test|camera] [--work 0.08] [--modes queue,latest]
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from common.capture import MODES, open_capture
+
+def write_test_video(path, frames, fps, size=(320, 240)):
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"MJPG"), fps, size)
+    for i in range(frames):
+        writer.write(np.full((size[1], size[0], 3), i % 256, np.uint8))
+    writer.release()
+
+def run(source, mode, work, seconds, indexed):
+    cap = open_capture(source, mode)
+    if not cap.isOpened():
+        print("{:>8}  could not open {}".format(mode, source))
+        return
+    fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+    ages, behind = [], []
+    start = time.monotonic()
+    wraps = 0
+    last_index = -1
+    while time.monotonic() - start < seconds:
+        ok, frame = cap.read()
+        if not ok:
+            break
+        ages.append(cap.age())
+        if indexed:
+            index = int(frame[0, 0, 0])
+            if index < last_index:
+                wraps += 1
+            last_index = index
+            behind.append((time.monotonic() - start) * fps - (index + 256 * wraps))
+        time.sleep(work)   # stands in for inference and encoding
+    cap.release()
+    if not ages:
+        print("{:>8}  no frames".format(mode))
+        return
+    line = "{:>8} {:>7} {:>8} {:>8} {:>12.2f}".format(mode, len(ages), cap.grabbed, cap.skipped,
+                                                       np.median(ages) * 1e3)
+    if behind:
+        line += " {:>12.1f} {:>12.1f}".format(behind[-1], behind[-1] / fps * 1e3)
+    print(line)
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--source", default="", help="Video file, 'test' or 'camera' (default: generated file)")
+    parser.add_argument("--modes", default="queue,latest", help="Comma separated, from " + ", ".join(MODES))
+    parser.add_argument("--work", type=float, default=0.08, help="Simulated processing time per frame (s)")
+    parser.add_argument("--seconds", type=float, default=5.0)
+    args = parser.parse_args()
+
+    source = args.source
+    if not source:
+        source = os.path.join(tempfile.gettempdir(), "bench_capture.avi")
+        write_test_video(source, int(args.seconds * 30) + 30, 30)
+        print("Test video: 30 fps,", source)
+    indexed = not args.source
+    print("Processing {:.0f} ms per frame\n".format(args.work * 1e3))
+    print("{:>8} {:>7} {:>8} {:>8} {:>12}{}".format("mode", "frames", "grabbed", "skipped", "age ms",
+                                                  " {:>12} {:>12}".format("behind", "behind ms") if indexed else ""))
+    for mode in args.modes.split(","):
+        run(source, mode, args.work, args.seconds, indexed)
+    if not args.source:
+        os.remove(source)
+
+if __name__ == "__main__":
+    main()
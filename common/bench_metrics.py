@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+# Per-call cost of the metrics calls a node makes in its hot loop, against
+# an empty loop, and what that adds to a frame at a given rate. The
+# snapshot is serialized and sent on an inproc socket so publish() is
+# measured with its JSON encoding.
+#
+#   python3 common/bench_metrics.py [--calls 200000] [--stages 6]
+import argparse
+import os
+import sys
+import time
+import zmq
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from common.metrics import Metrics
+
+def per_call(function, calls):
+    start = time.perf_counter()
+    for _ in range(calls):
+        function()
+    return (time.perf_counter() - start) / calls
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--calls", type=int, default=200000)
+    parser.add_argument("--stages", type=int, default=6, help="Timed stages per frame (detection_main.py has 6)")
+    parser.add_argument("--fps", type=float, default=30.0)
+    args = parser.parse_args()
+
+    context = zmq.Context()
+    sink = context.socket(zmq.PULL)
+    sink.bind("inproc://metrics")
+    socket = context.socket(zmq.PUSH)
+    socket.setsockopt(zmq.SNDHWM, 0)
+    socket.connect("inproc://metrics")
+    metrics = Metrics("bench", socket=socket)
+    # A realistic snapshot: a few counters and gauges, one histogram per stage
+    for i in range(args.stages):
+        metrics.observe("stage{}".format(i), 0.001)
+        metrics.count("counter{}".format(i))
+        metrics.gauge("gauge{}".format(i), i)
+
+    def timed():
+        with metrics.timer("stage0"):
+            pass
+
+    baseline = per_call(lambda: None, args.calls)
+    results = [
+        ("count", per_call(lambda: metrics.count("counter0"), args.calls)),
+        ("gauge", per_call(lambda: metrics.gauge("gauge0", 1), args.calls)),
+        ("observe", per_call(lambda: metrics.observe("stage0", 0.003), args.calls)),
+        ("timer", per_call(timed, args.calls)),
+        ("maybe_publish (not due)", per_call(metrics.maybe_publish, args.calls)),
+    ]
+    publish_calls = max(1, args.calls // 100)
+    results.append(("publish", per_call(metrics.publish, publish_calls)))
+    sink.setsockopt(zmq.RCVTIMEO, 100)
+    size = len(sink.recv_multipart()[1])
+
+    print("Per call, empty loop ({:.3f} us) subtracted:".format(baseline * 1e6))
+    cost = {}
+    for name, seconds in results:
+        cost[name] = max(0.0, seconds - baseline)
+        print("  {:<24} {:>8.3f} us".format(name, cost[name] * 1e6))
+    print("Snapshot: {} bytes".format(size))
+
+    # What detection_main.py does per frame: one observe per stage, a few
+    # counts and a gauge, maybe_publish; plus one publish per second.
+    frame = args.stages * cost["observe"] + 3 * cost["count"] + cost["gauge"] + cost["maybe_publish (not due)"]
+    per_second = frame * args.fps + cost["publish"]
+    print("Per frame: {:.2f} us; at {:.0f} fps {:.3f} ms/s ({:.4f} % of one core)".format(
+        frame * 1e6, args.fps, per_second * 1e3, per_second * 100))
+
+    socket.close(linger=0)
+    sink.close(linger=0)
+    context.term()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+# Compare the base64-over-ZMQ frame path with the shared memory ring path.
+# A separate reader process plays the bridge: latency is measured from the
+# moment the publisher has the JPEG until the reader holds the base64 string
+# it would forward to the browser.
+#
+#   python3 common/bench_shm_ring.py [--frames 300] [--size-kb 180] [--scheme ipc]
+import argparse
+import base64
+import json
+import multiprocessing
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from common import shm_ring, transport
+
+# Buffer copies of the frame bytes each path makes by design (publisher ->
+# bridge). Listed for reference only; the benchmark measures latency.
+COPIES = {
+    "zmq": ["base64 encode", "json.dumps", "send_string into zmq message", "kernel socket write",
+            "kernel socket read", "json.loads"],
+    "shm": ["memcpy into ring slot", "base64 encode from slot view"],
+}
+
+def reader(path, frames, scheme, results):
+    import zmq
+    context = transport.make_context()
+    sub = context.socket(zmq.SUB)
+    sub.setsockopt(zmq.RCVTIMEO, 5000)
+    sub.connect(transport.endpoint("detection", scheme=scheme))
+    sub.setsockopt(zmq.SUBSCRIBE, b"")
+
+    latencies = []
+    lost = 0
+    try:
+        while len(latencies) + lost < frames:
+            message = json.loads(sub.recv())
+            if message.get("warmup"):
+                continue
+            if path == "shm" and not shm_ring.resolve_image(message):
+                lost += 1
+                continue
+            latencies.append(time.monotonic() - message["t"])
+    except zmq.Again:
+        pass
+    results.send((latencies, lost))
+    sub.close(linger=0)
+    context.term()
+
+def run(path, payload, frames, scheme, interval):
+    import zmq
+    context = transport.make_context()
+    pub = context.socket(zmq.PUB)
+    pub.setsockopt(zmq.SNDHWM, 0)
+    pub.bind(transport.endpoint("detection", bind=True, scheme=scheme))
+    ring = shm_ring.FrameRingWriter("sensor_nest_bench", slot_count=8, slot_size=len(payload)) if path == "shm" else None
+
+    parent_end, child_end = multiprocessing.Pipe()
+    proc = multiprocessing.Process(target=reader, args=(path, frames, scheme, child_end))
+    proc.start()
+    # Warm up until the subscription is live so no measured frame is lost.
+    for _ in range(20):
+        pub.send_string(json.dumps({"warmup": True}))
+        time.sleep(0.05)
+
+    for i in range(frames):
+        t = time.monotonic()
+        message = {"frame": i, "detections": [], "t": t}
+        if ring is not None:
+            message["shm"] = ring.write(payload)
+        else:
+            message["image"] = base64.b64encode(payload).decode('utf-8')
+        pub.send_string(json.dumps(message))
+        time.sleep(interval)
+
+    latencies, lost = parent_end.recv()
+    proc.join()
+    pub.close(linger=0)
+    context.term()
+    if ring is not None:
+        # The forked reader shares our resource tracker and unregistered the
+        # block when it attached; register it again so unlink stays quiet.
+        from multiprocessing import resource_tracker
+        resource_tracker.register(ring.shm._name, "shared_memory")
+        ring.close()
+    latencies.sort()
+    return latencies, lost
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--frames", type=int, default=300)
+    parser.add_argument("--size-kb", type=int, default=180, help="JPEG size; ~180 KiB for 1280x960 at quality 80")
+    parser.add_argument("--scheme", default="ipc", choices=["tcp", "ipc"])
+    parser.add_argument("--interval", type=float, default=0.005, help="Seconds between frames")
+    args = parser.parse_args()
+
+    payload = os.urandom(args.size_kb * 1024)
+    print("Frame: {} KiB JPEG, {} frames over {}".format(args.size_kb, args.frames, args.scheme))
+    print("{:<5} {:>9} {:>9} {:>9} {:>6}".format("path", "p50 ms", "p90 ms", "max ms", "lost"))
+    for path in ("zmq", "shm"):
+        latencies, lost = run(path, payload, args.frames, args.scheme, args.interval)
+        n = len(latencies)
+        print("{:<5} {:>9.3f} {:>9.3f} {:>9.3f} {:>6}".format(
+            path, latencies[n // 2] * 1000.0, latencies[int(n * 0.9)] * 1000.0, latencies[-1] * 1000.0, lost))
+    print("Expected copies per design (not measured):")
+    for path, steps in COPIES.items():
+        print("  {}: {} ({})".format(path, len(steps), ", ".join(steps)))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+# Compare PUB/SUB latency and throughput for tcp, ipc and inproc endpoints
+# using frame-sized payloads.
+#
+#   python3 common/bench_transport.py [--frames 200] [--image detection_node/images/000001.jpg]
+import argparse
+import base64
+import json
+import os
+import sys
+import threading
+import time
+import zmq
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from common import transport
+
+DEFAULT_IMAGE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "detection_node", "images", "000001.jpg")
+
+def make_payloads(image_path):
+    # Build the same messages detection_main.py publishes: a base64 JPEG of a
+    # 1280x960 frame inside JSON, plus the raw BGR frame for reference.
+    try:
+        import cv2
+        frame = cv2.imread(image_path)
+        if frame is None:
+            raise IOError("Could not read " + image_path)
+        frame = cv2.resize(frame, (1280, 960))
+        ok, jpeg = cv2.imencode('.jpg', frame, [int(cv2.IMWRITE_JPEG_QUALITY), 80])
+        jpeg = jpeg.tobytes()
+        raw = frame.tobytes()
+    except Exception as e:
+        # Random bytes compress like JPEG data, so sizes stay realistic.
+        print("OpenCV frame unavailable ({}), using random payloads of frame size.".format(e))
+        jpeg = os.urandom(180 * 1024)
+        raw = os.urandom(1280 * 960 * 3)
+
+    message = json.dumps({
+        "frame": 1,
+        "detections": [],
+        "image": base64.b64encode(jpeg).decode('utf-8')
+    }).encode()
+    return [("json+base64 jpeg", message), ("raw jpeg", jpeg), ("raw bgr 1280x960", raw)]
+
+def bench(scheme, payload, frames, io_threads):
+    context = transport.make_context(io_threads=io_threads)
+    pub = context.socket(zmq.PUB)
+    pub.setsockopt(zmq.SNDHWM, 0)  # Unlimited, so throughput is not capped by drops
+    pub.bind(transport.endpoint("detection", bind=True, scheme=scheme))
+    sub = context.socket(zmq.SUB)
+    sub.setsockopt(zmq.RCVHWM, 0)
+    sub.setsockopt(zmq.RCVTIMEO, 5000)
+    sub.connect(transport.endpoint("detection", scheme=scheme))
+    sub.setsockopt(zmq.SUBSCRIBE, b"")
+    time.sleep(0.3)  # Let the subscription propagate
+
+    # Latency: one message in flight at a time.
+    latencies = []
+    for _ in range(min(frames, 100)):
+        start = time.perf_counter()
+        pub.send(payload, copy=False)
+        sub.recv(copy=False)
+        latencies.append(time.perf_counter() - start)
+    latencies.sort()
+
+    # Throughput: receiver thread drains while the sender pushes back to back.
+    received = [0, 0.0]
+    def drain():
+        try:
+            for _ in range(frames):
+                sub.recv(copy=False)
+                received[0] += 1
+                received[1] = time.perf_counter()
+        except zmq.Again:
+            pass  # Remaining messages were dropped at a high-water mark
+    receiver = threading.Thread(target=drain)
+    receiver.start()
+    start = time.perf_counter()
+    for _ in range(frames):
+        pub.send(payload, copy=False)
+    receiver.join()
+    elapsed = max(received[1] - start, 1e-9)
+
+    pub.close(linger=0)
+    sub.close(linger=0)
+    context.term()
+    return {
+        "p50_ms": latencies[len(latencies) // 2] * 1000.0,
+        "p99_ms": latencies[int(len(latencies) * 0.99) - 1] * 1000.0,
+        "msgs_per_s": received[0] / elapsed,
+        "mb_per_s": received[0] * len(payload) / elapsed / 1e6,
+        "dropped": frames - received[0],
+    }
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--frames", type=int, default=200)
+    parser.add_argument("--image", default=DEFAULT_IMAGE)
+    parser.add_argument("--io-threads", type=int, default=1)
+    args = parser.parse_args()
+
+    for name, payload in make_payloads(args.image):
+        print("\nPayload: {} ({:.1f} KiB)".format(name, len(payload) / 1024.0))
+        print("{:<8} {:>9} {:>9} {:>10} {:>9} {:>8}".format("scheme", "p50 ms", "p99 ms", "msgs/s", "MB/s", "dropped"))
+        for scheme in transport.SCHEMES:
+            r = bench(scheme, payload, args.frames, args.io_threads)
+            print("{:<8} {:>9.3f} {:>9.3f} {:>10.1f} {:>9.1f} {:>8}".format(
+                scheme, r["p50_ms"], r["p99_ms"], r["msgs_per_s"], r["mb_per_s"], r["dropped"]))
+
+if __name__ == "__main__":
+    main()
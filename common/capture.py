@@ -0,0 +1,213 @@
+import threading
+import time
+
+import cv2
+
+# Camera and file capture for the frame publishers (detection_main.py,
+# feed_streamer/zmq_publisher.py), with a choice of what happens to frames
+# arriving while the caller is still busy with the previous one:
+#
+#   queue   plain appsink: every frame is delivered, in order. When
+#           processing is slower than the camera, frames pile up in the
+#           sink and each read() returns an older one, so latency grows.
+#   drop    appsink drop=true max-buffers=1: GStreamer keeps only the newest
+#           frame, read() returns at once with a frame up to one camera
+#           period old. Needs OpenCV built with GStreamer (files too).
+#   latest  a grabber thread calls grab() continuously and retrieve()s only
+#           when the caller asks, so read() waits for the next frame (up to
+#           one period) and gets it fresh; frames nobody asked for are never
+#           decoded. Works with any OpenCV backend.
+#
+# Sources: "camera"/"0" (the device argument, /dev/video0 by default), a
+# /dev/videoN path, "test" (a live videotestsrc, for testing without a
+# camera) or a video file. Files are played at their own frame rate in
+# drop and latest mode, so they behave like a camera; in queue mode they
+# are read as fast as the caller reads.
+#
+#   cap = open_capture("camera", "latest")
+#   ok, frame = cap.read()
+#   age = cap.age()            # seconds since the frame was grabbed
+#   cap.frame_ns               # wall clock of the grab, for message timestamps
+#
+# For GStreamer pipelines (queue and drop modes) the grab time is taken
+# from the buffer timestamp (CAP_PROP_POS_MSEC, running time since the
+# pipeline started) rather than from when OpenCV handed the frame over, so
+# the time a frame waited in the sink counts towards its age. The clock
+# offset is the smallest seen (grab time - timestamp), i.e. the age is
+# relative to the freshest frame delivered so far. Other sources, and the
+# latest mode whose thread grabs continuously, use the hand-over time.
+
+MODES = ("queue", "drop", "latest")
+CAMERA_SIZE = (1280, 960)
+CAMERA_FPS = 30
+
+def gst_source(source, device="/dev/video0", size=CAMERA_SIZE, fps=CAMERA_FPS):
+    # GStreamer source elements for a camera or test source, None for files.
+    width, height = size
+    if source.lower() in ("camera", "0"):
+        source = device
+    if source.startswith("/dev/video"):
+        # Force MJPG at 1280x960 at 30 fps
+        return ("v4l2src device={} ! image/jpeg,framerate={}/1,width={},height={} ! "
+                "jpegparse ! jpegdec ! videoconvert".format(source, fps, width, height))
+    if source.lower() == "test":
+        return ("videotestsrc is-live=true pattern=ball ! video/x-raw,framerate={}/1,width={},height={} ! "
+                "videoconvert".format(fps, width, height))
+    return None
+
+def appsink(mode, live=True):
+    if mode == "drop":
+        # Files only play in real time when the sink syncs to the clock
+        return "appsink drop=true max-buffers=1 sync={}".format("false" if live else "true")
+    return "appsink"
+
+def open_capture(source, mode="queue", device="/dev/video0"):
+    # A Capture (queue, drop) or LatestFrameCapture (latest); check isOpened().
+    if mode not in MODES:
+        raise ValueError("Unknown capture mode {!r} (expected one of {})".format(mode, ", ".join(MODES)))
+    pipeline = gst_source(source, device)
+    if pipeline is not None:
+        cap = cv2.VideoCapture(pipeline + " ! " + appsink(mode), cv2.CAP_GSTREAMER)
+        description = "{} ({})".format(pipeline.split(" ! ")[0], mode)
+        live = True
+    elif mode == "drop":
+        cap = cv2.VideoCapture('filesrc location="{}" ! decodebin ! videoconvert ! {}'.format(
+            source, appsink(mode, live=False)), cv2.CAP_GSTREAMER)
+        description = "video file {} (drop)".format(source)
+        live = True   # the sink paces it
+    else:
+        cap = cv2.VideoCapture(source)
+        description = "video file {} ({})".format(source, mode)
+        live = False
+
+    if mode != "latest":
+        return Capture(cap, description, buffer_clock=live)
+    fps = cap.get(cv2.CAP_PROP_FPS) if cap.isOpened() else 0
+    pace = 1.0 / fps if not live and fps > 0 else 0.0
+    return LatestFrameCapture(cap, description, pace=pace)
+
+class Capture:
+    def __init__(self, cap, description, buffer_clock=False):
+        self.cap = cap
+        self.description = description
+        self.buffer_clock = buffer_clock  # date frames by their GStreamer buffer timestamps
+        self.clock_offset = None  # smallest (grab time - buffer timestamp) seen, s
+        self.frame_time = None   # monotonic time of the current frame's grab
+        self.frame_ns = None     # wall clock of the same, ns
+        self.grabbed = 0         # frames taken from the source
+        self.skipped = 0         # of those, never handed to the caller
+
+    def isOpened(self):
+        return self.cap.isOpened()
+
+    def get(self, prop):
+        return self.cap.get(prop)
+
+    def grab(self):
+        if not self.cap.grab():
+            return False
+        self.frame_time, self.frame_ns = time.monotonic(), time.time_ns()
+        if self.buffer_clock:
+            position = self.cap.get(cv2.CAP_PROP_POS_MSEC) / 1e3
+            if position > 0:
+                offset = self.frame_time - position
+                if self.clock_offset is None or offset < self.clock_offset:
+                    self.clock_offset = offset
+                waited = offset - self.clock_offset
+                self.frame_time -= waited
+                self.frame_ns -= int(waited * 1e9)
+        self.grabbed += 1
+        return True
+
+    def retrieve(self):
+        return self.cap.retrieve()
+
+    def read(self):
+        if not self.grab():
+            return False, None
+        return self.retrieve()
+
+    def age(self, now=None):
+        if self.frame_time is None:
+            return None
+        return (time.monotonic() if now is None else now) - self.frame_time
+
+    def release(self):
+        self.cap.release()
+
+class LatestFrameCapture(Capture):
+    # Only the grabber thread touches the VideoCapture. grab() asks for the
+    # next frame and returns at once; retrieve() waits for it. So two
+    # cameras grabbed back to back (stereo) hand over frames from about the
+    # same moment.
+    def __init__(self, cap, description, pace=0.0, timeout=2.0):
+        super().__init__(cap, description)
+        self.pace = pace          # seconds per frame for files, 0 for live sources
+        self.timeout = timeout
+        self.condition = threading.Condition()
+        self.wanted = False
+        self.ready = False
+        self.frame = None
+        self.ended = False
+        # Read once here: the thread owns the capture from now on
+        self.properties = {prop: cap.get(prop) for prop in
+                           (cv2.CAP_PROP_FRAME_WIDTH, cv2.CAP_PROP_FRAME_HEIGHT, cv2.CAP_PROP_FPS)}
+        self.running = cap.isOpened()
+        self.thread = threading.Thread(target=self._grab_loop, daemon=True)
+        if self.running:
+            self.thread.start()
+
+    def get(self, prop):
+        return self.properties[prop] if prop in self.properties else self.cap.get(prop)
+
+    def _grab_loop(self):
+        next_time = time.monotonic()
+        while self.running:
+            if self.pace:
+                delay = next_time - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+                next_time = max(next_time + self.pace, time.monotonic())
+            ok = self.cap.grab()
+            grab_time, grab_ns = time.monotonic(), time.time_ns()
+            with self.condition:
+                if not ok:
+                    self.ended = True
+                    self.condition.notify_all()
+                    return
+                self.grabbed += 1
+                if not self.wanted:
+                    self.skipped += 1
+                    continue
+                ok, frame = self.cap.retrieve()
+                self.wanted = False
+                self.ready = True
+                self.frame = frame if ok else None
+                self.frame_time, self.frame_ns = grab_time, grab_ns
+                self.condition.notify_all()
+
+    def grab(self):
+        with self.condition:
+            if self.ended or not self.running:
+                return False
+            self.wanted = True
+            self.ready = False
+            self.frame = None
+        return True
+
+    def retrieve(self):
+        with self.condition:
+            self.condition.wait_for(lambda: self.ready or self.ended, self.timeout)
+            frame, self.frame = self.frame, None
+            if not self.ready:
+                self.wanted = False
+                return False, None
+            self.ready = False
+            return frame is not None, frame
+
+    def release(self):
+        self.running = False
+        if self.thread.is_alive():
+            # A live grab returns within a frame period
+            self.thread.join(timeout=1.0)
+        self.cap.release()
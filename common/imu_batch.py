@@ -0,0 +1,45 @@
+import struct
+from collections import namedtuple
+import numpy as np
+
+# Batches of raw MPU6050 FIFO samples as published by imu_node on the
+# imu_batch stream (imu.py --fifo).
+#
+#   header  magic(4s) version(B) flags(B) count(H) seq(I) first_ns(Q)
+#           period_ns(I) accel_lsb(f) gyro_lsb(f) overflows(I) lost(I)
+#   body    int16 samples[count][6]   accel x/y/z, gyro x/y/z (little-endian)
+#
+# Sample i was taken at first_ns + i * period_ns (the FIFO runs at a fixed
+# rate, so the timestamps are implied). Values stay in LSB; divide by
+# accel_lsb (LSB per g) and gyro_lsb (LSB per deg/s) for physical units.
+# overflows and lost are running totals: a jump between two batches means
+# the FIFO overflowed in between and that many samples are missing.
+# FLAG_GAP marks the first batch after such a gap (or a FIFO reset).
+
+MAGIC = b"IMUB"
+VERSION = 1
+HEADER = struct.Struct("<4sBBHIQIffII")
+
+FLAG_GAP = 0x01
+
+Batch = namedtuple("Batch", ["seq", "gap", "first_ns", "period_ns", "overflows", "lost",
+                             "timestamps", "accel", "gyro"])
+
+def encode_batch(raw, first_ns, period_ns, accel_lsb, gyro_lsb, seq, overflows=0, lost=0, gap=False):
+    # raw: (N, 6) int16 array of accel x/y/z and gyro x/y/z.
+    raw = np.ascontiguousarray(raw, dtype="<i2").reshape(-1, 6)
+    header = HEADER.pack(MAGIC, VERSION, FLAG_GAP if gap else 0, len(raw), seq & 0xFFFFFFFF,
+                         first_ns, period_ns, accel_lsb, gyro_lsb, overflows & 0xFFFFFFFF, lost & 0xFFFFFFFF)
+    return header + raw.tobytes()
+
+def decode_batch(buf):
+    # Timestamps as int64 ns, accel in g and gyro in deg/s as float32 arrays.
+    magic, version, flags, count, seq, first_ns, period_ns, accel_lsb, gyro_lsb, overflows, lost = \
+        HEADER.unpack_from(buf, 0)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError("Not an IMU batch frame")
+    raw = np.frombuffer(buf, dtype="<i2", count=6 * count, offset=HEADER.size).reshape(count, 6)
+    timestamps = first_ns + np.arange(count, dtype=np.int64) * period_ns
+    accel = raw[:, :3].astype(np.float32) / np.float32(accel_lsb)
+    gyro = raw[:, 3:].astype(np.float32) / np.float32(gyro_lsb)
+    return Batch(seq, bool(flags & FLAG_GAP), first_ns, period_ns, overflows, lost, timestamps, accel, gyro)
@@ -0,0 +1,134 @@
+import struct
+import zlib
+import numpy as np
+
+try:
+    import lz4.frame
+except ImportError:
+    lz4 = None
+
+# Keyframe + delta codec for LiDAR scans on a fixed angular grid.
+#
+# Ranges are quantized to uint16 millimetres per bin (0 = no return). A
+# keyframe carries every bin; a delta carries only the bins whose range moved
+# by more than `threshold_mm` since the previous frame, as (index, value)
+# pairs. The encoder tracks exactly what a decoder holds, so sub-threshold
+# changes never accumulate into drift.
+#
+#   header  magic(4s) kind(B) flags(B) bins(H) seq(I) count(I) timestamp_ns(Q)
+#   key     uint16 ranges[bins]
+#   delta   uint16 indices[count] uint16 ranges[count]
+#
+# The body may be zlib (FLAG_ZLIB) or lz4-frame (FLAG_LZ4) compressed. The
+# browser decoder in feed_streamer/index.html handles uncompressed and zlib.
+# A decoder that misses a frame (seq gap) waits for the next keyframe.
+
+MAGIC = b"LDC1"
+HEADER = struct.Struct("<4sBBHIIQ")
+
+KIND_KEY = 0
+KIND_DELTA = 1
+
+FLAG_ZLIB = 0x01
+FLAG_LZ4 = 0x02
+
+def _compress(body, compression):
+    if compression == "zlib":
+        return zlib.compress(body, 1), FLAG_ZLIB
+    if compression == "lz4":
+        return lz4.frame.compress(body), FLAG_LZ4
+    return body, 0
+
+def _decompress(body, flags):
+    if flags & FLAG_ZLIB:
+        return zlib.decompress(body)
+    if flags & FLAG_LZ4:
+        if lz4 is None:
+            raise ValueError("lz4 frame received but the lz4 module is not installed")
+        return lz4.frame.decompress(body)
+    return body
+
+def quantize_ranges(ranges):
+    return np.rint(np.clip(np.asarray(ranges, dtype=np.float32) * 1000.0, 0, 65535)).astype(np.uint16)
+
+def grid_angles(bins):
+    # Bin centres over [-pi, pi), matching lidar_node/scan_reduce.py.
+    return (-np.pi + (np.arange(bins) + 0.5) * (2.0 * np.pi / bins)).astype(np.float32)
+
+class DeltaEncoder:
+    def __init__(self, keyframe_interval=12, threshold_mm=20, compression=None):
+        if compression not in (None, "zlib", "lz4"):
+            raise ValueError("Unknown compression: {}".format(compression))
+        if compression == "lz4" and lz4 is None:
+            raise ValueError("lz4 compression requested but the lz4 module is not installed")
+        self.keyframe_interval = keyframe_interval
+        self.threshold_mm = threshold_mm
+        self.compression = compression
+        self.state = None
+        self.seq = 0
+        self.since_key = 0
+
+    def encode(self, ranges, timestamp=0):
+        # ranges: metres per grid bin (0 = empty). Returns the frame as bytes.
+        values = quantize_ranges(ranges)
+        self.seq = (self.seq + 1) & 0xFFFFFFFF
+        if self.state is None or len(values) != len(self.state) or self.since_key >= self.keyframe_interval:
+            self.state = values
+            self.since_key = 1
+            kind, count, body = KIND_KEY, len(values), values.tobytes()
+        else:
+            diff = np.abs(values.astype(np.int32) - self.state.astype(np.int32))
+            # A bin appearing or disappearing is always a change.
+            changed = np.flatnonzero((diff > self.threshold_mm) | ((values == 0) != (self.state == 0)))
+            self.state[changed] = values[changed]
+            self.since_key += 1
+            kind, count = KIND_DELTA, len(changed)
+            body = changed.astype(np.uint16).tobytes() + values[changed].tobytes()
+        body, flags = _compress(body, self.compression)
+        return HEADER.pack(MAGIC, kind, flags, len(values), self.seq, count, int(timestamp)) + body
+
+class DeltaDecoder:
+    def __init__(self):
+        self.state = None
+        self.seq = None
+        self.timestamp = 0
+        self.gaps = 0
+
+    def decode(self, buf):
+        # Returns the uint16 millimetre ranges per bin, or None while waiting
+        # for a keyframe after a gap.
+        magic, kind, flags, bins, seq, count, timestamp = HEADER.unpack_from(buf, 0)
+        if magic != MAGIC:
+            raise ValueError("Not a LiDAR delta frame")
+        body = _decompress(bytes(buf[HEADER.size:]), flags) if flags else memoryview(buf)[HEADER.size:]
+
+        if kind == KIND_KEY:
+            self.state = np.frombuffer(body, dtype=np.uint16, count=bins).copy()
+        else:
+            if self.state is None or self.seq is None or seq != ((self.seq + 1) & 0xFFFFFFFF) or len(self.state) != bins:
+                if self.state is not None:
+                    self.gaps += 1
+                self.state = None
+                self.seq = None
+                return None
+            indices = np.frombuffer(body, dtype=np.uint16, count=count)
+            values = np.frombuffer(body, dtype=np.uint16, count=count, offset=2 * count)
+            self.state[indices] = values
+        self.seq = seq
+        self.timestamp = timestamp
+        return self.state
+
+    def ranges(self):
+        # Current state as float32 metres.
+        return self.state.astype(np.float32) * np.float32(0.001)
+
+    def keyframe(self):
+        # Keyframe of the current state, e.g. for a client that joins between
+        # keyframes. Carries the current seq so following deltas apply to it.
+        if self.state is None:
+            return None
+        return HEADER.pack(MAGIC, KIND_KEY, 0, len(self.state), self.seq, len(self.state), self.timestamp) + \
+            self.state.tobytes()
+
+def is_delta_frame(buf):
+    return len(buf) >= HEADER.size and bytes(buf[:4]) == MAGIC
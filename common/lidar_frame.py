@@ -0,0 +1,84 @@
+import json
+import struct
+from collections import namedtuple
+import numpy as np
+
+# Binary LiDAR scan frame: a small fixed header followed by the angle array and
+# the range array, each stored contiguously.
+#
+#   header  magic(4s) version(B) encoding(B) reserved(H) count(I) timestamp_ns(Q) scan_frequency(f)
+#   body    angles[count] ranges[count]
+#
+# ENCODING_FLOAT32: angles in radians, ranges in metres (float32).
+# ENCODING_UINT16:  angles quantized over [-pi, pi) to 0..65535 (~0.0055 deg),
+#                   ranges in millimetres (0 = no return).
+
+MAGIC = b"LSCN"
+VERSION = 1
+HEADER = struct.Struct("<4sBBHIQf")
+
+ENCODING_FLOAT32 = 0
+ENCODING_UINT16 = 1
+
+ANGLE_SCALE = 65536.0 / (2.0 * np.pi)
+
+Scan = namedtuple("Scan", ["timestamp", "scan_frequency", "encoding", "angles", "ranges"])
+
+def points_to_arrays(points):
+    # One pass over a sequence of objects with .angle/.range (the YDLIDAR SDK
+    # point vector) into contiguous float32 angle and range arrays.
+    n = len(points)
+    pairs = np.fromiter((v for p in points for v in (p.angle, p.range)), dtype=np.float32, count=2 * n)
+    columns = pairs.reshape(n, 2).T.copy()
+    return columns[0], columns[1]
+
+def encode_scan(angles, ranges, timestamp=0, scan_frequency=0.0, quantize=False):
+    # angles/ranges: float arrays of equal length. Returns the frame as bytes.
+    if quantize:
+        encoding = ENCODING_UINT16
+        a = np.mod(np.rint((np.asarray(angles, dtype=np.float32) + np.pi) * ANGLE_SCALE), 65536).astype(np.uint16)
+        r = np.rint(np.clip(np.asarray(ranges, dtype=np.float32) * 1000.0, 0, 65535)).astype(np.uint16)
+    else:
+        encoding = ENCODING_FLOAT32
+        a = np.ascontiguousarray(angles, dtype=np.float32)
+        r = np.ascontiguousarray(ranges, dtype=np.float32)
+    header = HEADER.pack(MAGIC, VERSION, encoding, 0, len(a), int(timestamp), scan_frequency)
+    return b"".join((header, memoryview(a), memoryview(r)))
+
+def decode_scan(buf):
+    # Returns a Scan whose angles/ranges are zero-copy np.frombuffer views
+    # into `buf`, in the frame's own encoding.
+    magic, version, encoding, _, count, timestamp, scan_frequency = HEADER.unpack_from(buf, 0)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError("Not a LiDAR scan frame")
+    dtype = np.float32 if encoding == ENCODING_FLOAT32 else np.uint16
+    itemsize = np.dtype(dtype).itemsize
+    angles = np.frombuffer(buf, dtype=dtype, count=count, offset=HEADER.size)
+    ranges = np.frombuffer(buf, dtype=dtype, count=count, offset=HEADER.size + count * itemsize)
+    return Scan(timestamp, scan_frequency, encoding, angles, ranges)
+
+def is_scan_frame(buf):
+    return len(buf) >= HEADER.size and bytes(buf[:4]) == MAGIC
+
+def scan_arrays(scan):
+    # Angles (radians) and ranges (metres) as float32. Free for float32 frames,
+    # one vectorized conversion for quantized ones.
+    if scan.encoding == ENCODING_FLOAT32:
+        return scan.angles, scan.ranges
+    angles = scan.angles.astype(np.float32) / np.float32(ANGLE_SCALE) - np.float32(np.pi)
+    ranges = scan.ranges.astype(np.float32) * np.float32(0.001)
+    return angles, ranges
+
+def scan_to_dict(scan, decimals=4):
+    # Compact JSON-ready form for the browser: parallel angle/range lists
+    # instead of one object per point.
+    angles, ranges = scan_arrays(scan)
+    return {
+        "timestamp": scan.timestamp,
+        "scan_frequency": scan.scan_frequency,
+        "angles": np.round(angles.astype(np.float64), decimals).tolist(),
+        "ranges": np.round(ranges.astype(np.float64), decimals).tolist(),
+    }
+
+def scan_to_json(buf):
+    return json.dumps(scan_to_dict(decode_scan(buf)), separators=(",", ":")).encode()
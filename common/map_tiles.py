@@ -0,0 +1,63 @@
+import struct
+import zlib
+from collections import namedtuple
+import numpy as np
+
+# Occupancy map tiles as published by mapping_node on the map stream.
+#
+#   header  magic(4s) version(B) flags(B) tile_size(H) resolution(f)
+#           origin_x(f) origin_y(f) tiles_x(H) tiles_y(H) seq(I) count(H)
+#   body    count x (tx(H) ty(H)) followed by count x int8 cells[tile_size^2]
+#
+# Cells are log-odds in units of `scale` (0 = unknown, > 0 occupied, < 0 free),
+# row-major with row = y. FLAG_FULL marks a snapshot of every observed tile
+# (sent periodically so late subscribers can build the whole map); otherwise
+# the frame only carries tiles that changed. The body is zlib compressed
+# (FLAG_ZLIB), which suits maps well since most cells are runs of equal values.
+
+MAGIC = b"MTIL"
+VERSION = 1
+HEADER = struct.Struct("<4sBBHfffHHIH")
+
+FLAG_ZLIB = 0x01
+FLAG_FULL = 0x02
+
+Tiles = namedtuple("Tiles", ["seq", "full", "tile_size", "resolution", "origin", "tiles_x", "tiles_y",
+                             "coords", "cells"])
+
+def encode_tiles(grid, tiles, seq, full=False, compress=True):
+    # grid: mapping_node OccupancyGrid; tiles: (N, 2) array of (ty, tx).
+    t = grid.tile_size
+    tiles = np.asarray(tiles, dtype=np.intp).reshape(-1, 2)
+    coords = np.ascontiguousarray(tiles[:, ::-1], dtype=np.uint16)  # (tx, ty) pairs
+    blocks = grid.grid.reshape(grid.tiles_y, t, grid.tiles_x, t)[tiles[:, 0], :, tiles[:, 1], :]
+    body = coords.tobytes() + np.ascontiguousarray(blocks).tobytes()
+    flags = FLAG_FULL if full else 0
+    if compress:
+        body = zlib.compress(body, 1)
+        flags |= FLAG_ZLIB
+    header = HEADER.pack(MAGIC, VERSION, flags, t, grid.resolution, grid.origin[0], grid.origin[1],
+                         grid.tiles_x, grid.tiles_y, seq & 0xFFFFFFFF, len(tiles))
+    return header + body
+
+def decode_tiles(buf):
+    magic, version, flags, tile_size, resolution, ox, oy, tiles_x, tiles_y, seq, count = HEADER.unpack_from(buf, 0)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError("Not a map tile frame")
+    body = bytes(buf[HEADER.size:])
+    if flags & FLAG_ZLIB:
+        body = zlib.decompress(body)
+    coords = np.frombuffer(body, dtype=np.uint16, count=2 * count).reshape(count, 2)
+    cells = np.frombuffer(body, dtype=np.int8, count=count * tile_size * tile_size,
+                          offset=4 * count).reshape(count, tile_size, tile_size)
+    return Tiles(seq, bool(flags & FLAG_FULL), tile_size, resolution, (ox, oy), tiles_x, tiles_y, coords, cells)
+
+def apply_tiles(tiles, grid=None):
+    # Paste decoded tiles into a (tiles_y * tile_size, tiles_x * tile_size)
+    # int8 array, creating it if needed. Returns the array.
+    t = tiles.tile_size
+    if grid is None or grid.shape != (tiles.tiles_y * t, tiles.tiles_x * t):
+        grid = np.zeros((tiles.tiles_y * t, tiles.tiles_x * t), dtype=np.int8)
+    blocks = grid.reshape(tiles.tiles_y, t, tiles.tiles_x, t)
+    blocks[tiles.coords[:, 1], :, tiles.coords[:, 0], :] = tiles.cells
+    return grid
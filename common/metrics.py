@@ -0,0 +1,190 @@
+import bisect
+import json
+import os
+import threading
+import time
+
+from common import transport
+
+# Lightweight node metrics: counters, gauges and duration histograms, sent
+# as a compact JSON snapshot on the metrics stream about once a second and
+# turned into Prometheus text by the bridge (GET /metrics).
+#
+#   metrics = Metrics("lidar", context)
+#   metrics.count("scans")                    # events (rate = fps)
+#   metrics.gauge("ring_depth", len(ring))    # current values
+#   with metrics.timer("publish"):            # per-stage time
+#       ...
+#   metrics.observe("parse", seconds)         # when the time is already known
+#   metrics.maybe_publish()                   # once per loop iteration
+#
+# Worker threads may count any name (count() takes a lock, so increments
+# are never lost) and observe, but each histogram name from one thread
+# only; only one thread may publish (ZMQ sockets are not thread-safe). A
+# snapshot iterates over copies of the dicts (dict() copies in one step
+# under the GIL), so workers adding new names meanwhile cannot break it;
+# histograms are created under the same lock so two threads never race to
+# create the same one.
+#
+# The hot-path calls are a dict update each (plus a bisect for durations);
+# maybe_publish() is a single clock read until a snapshot is due. See
+# common/bench_metrics.py for the per-call cost.
+#
+# Snapshot (topic b"metrics/<node>"):
+#   {"node", "pid", "time": wall ns, "interval": s since the last snapshot,
+#    "counters": {name: total}, "rates": {name: per second},
+#    "gauges": {name: value},
+#    "histograms": {name: {"counts": [per bucket, last = +Inf], "sum": s, "count": n}}}
+# Histogram counts are totals since start, like the counters, so a lost
+# snapshot loses nothing.
+
+# Duration bucket upper bounds in seconds, 50 us .. 5 s
+BUCKETS = (0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+           0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+class Histogram:
+    __slots__ = ("counts", "sum", "count")
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(BUCKETS, value)] += 1
+        self.sum += value
+        self.count += 1
+
+class _Timer:
+    __slots__ = ("histogram", "start")
+
+    def __init__(self, histogram):
+        self.histogram = histogram
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.start)
+        return False
+
+class Metrics:
+    def __init__(self, node, context=None, interval=1.0, socket=None):
+        self.node = node
+        self.topic = b"metrics/" + node.encode()
+        if socket is None and context is not None:
+            socket = transport.publisher(context, "metrics")
+        self.socket = socket
+        self.interval = interval
+        self.counters = {}
+        self.gauges = {}
+        self.histograms = {}
+        self.lock = threading.Lock()
+        self.previous = {}
+        self.last_publish = time.monotonic()
+        self.next_publish = self.last_publish + interval
+
+    def count(self, name, n=1):
+        # Read-modify-write, so under the lock: workers may count the same name.
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def set_count(self, name, total):
+        # For counters a node already keeps (monotonic totals).
+        self.counters[name] = total
+
+    def gauge(self, name, value):
+        self.gauges[name] = value
+
+    def histogram(self, name):
+        histogram = self.histograms.get(name)
+        if histogram is None:
+            with self.lock:
+                histogram = self.histograms.get(name)
+                if histogram is None:
+                    histogram = self.histograms[name] = Histogram()
+        return histogram
+
+    def observe(self, name, seconds):
+        self.histogram(name).observe(seconds)
+
+    def timer(self, name):
+        return _Timer(self.histogram(name))
+
+    def maybe_publish(self, now=None):
+        now = time.monotonic() if now is None else now
+        if now < self.next_publish:
+            return False
+        self.publish(now)
+        return True
+
+    def snapshot(self, now=None):
+        now = time.monotonic() if now is None else now
+        interval = max(1e-6, now - self.last_publish)
+        counters, gauges, histograms = dict(self.counters), dict(self.gauges), dict(self.histograms)
+        rates = {name: (total - self.previous.get(name, 0)) / interval for name, total in counters.items()}
+        self.previous = counters
+        self.last_publish = now
+        return {
+            "node": self.node,
+            "pid": os.getpid(),
+            "time": time.time_ns(),
+            "interval": round(interval, 4),
+            "counters": counters,
+            "rates": {name: round(rate, 3) for name, rate in rates.items()},
+            "gauges": gauges,
+            "histograms": {name: {"counts": list(h.counts), "sum": round(h.sum, 6), "count": h.count}
+                           for name, h in histograms.items()},
+        }
+
+    def publish(self, now=None):
+        now = time.monotonic() if now is None else now
+        snapshot = self.snapshot(now)
+        self.next_publish = now + self.interval
+        if self.socket is not None:
+            self.socket.send_multipart([self.topic, json.dumps(snapshot, separators=(",", ":")).encode()])
+        return snapshot
+
+def _labels(**labels):
+    return "{" + ",".join('{}="{}"'.format(key, str(value).replace('"', '\\"')) for key, value in labels.items()) + "}"
+
+def render_prometheus(snapshots, now=None, stale_after=5.0):
+    # snapshots: {node: (received wall seconds, snapshot dict)}. Returns the
+    # Prometheus text exposition of all of them.
+    now = time.time() if now is None else now
+    families = {
+        "sensor_nest_up": ("gauge", "1 if the node sent a snapshot recently", []),
+        "sensor_nest_snapshot_age_seconds": ("gauge", "Seconds since the node's last snapshot", []),
+        "sensor_nest_events_total": ("counter", "Events counted by the node", []),
+        "sensor_nest_event_rate": ("gauge", "Events per second over the last snapshot interval", []),
+        "sensor_nest_value": ("gauge", "Gauges reported by the node", []),
+        "sensor_nest_duration_seconds": ("histogram", "Per-stage processing time", []),
+    }
+    for node in sorted(snapshots):
+        received, snapshot = snapshots[node]
+        age = now - received
+        families["sensor_nest_up"][2].append((_labels(node=node), 1 if age < stale_after else 0))
+        families["sensor_nest_snapshot_age_seconds"][2].append((_labels(node=node), round(age, 3)))
+        for name, total in sorted(snapshot.get("counters", {}).items()):
+            families["sensor_nest_events_total"][2].append((_labels(node=node, name=name), total))
+        for name, rate in sorted(snapshot.get("rates", {}).items()):
+            families["sensor_nest_event_rate"][2].append((_labels(node=node, name=name), rate))
+        for name, value in sorted(snapshot.get("gauges", {}).items()):
+            families["sensor_nest_value"][2].append((_labels(node=node, name=name), value))
+        for name, histogram in sorted(snapshot.get("histograms", {}).items()):
+            samples = families["sensor_nest_duration_seconds"][2]
+            cumulative = 0
+            for bound, count in zip(BUCKETS + ("+Inf",), histogram["counts"]):
+                cumulative += count
+                samples.append(("_bucket" + _labels(node=node, name=name, le=bound), cumulative))
+            samples.append(("_sum" + _labels(node=node, name=name), histogram["sum"]))
+            samples.append(("_count" + _labels(node=node, name=name), histogram["count"]))
+
+    lines = []
+    for family, (kind, help_text, samples) in families.items():
+        lines.append("# HELP {} {}".format(family, help_text))
+        lines.append("# TYPE {} {}".format(family, kind))
+        for suffix, value in samples:
+            lines.append("{}{} {}".format(family, suffix, value))
+    return "\n".join(lines) + "\n"
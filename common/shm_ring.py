@@ -0,0 +1,168 @@
+import base64
+import os
+import struct
+from multiprocessing import shared_memory
+
+# Same-host frame transport: a fixed number of slots in one shared memory block.
+# The writer copies each encoded frame into the next slot and publishes only a
+# tiny notification (slot, seq, length) over ZeroMQ; readers copy or view the
+# bytes straight out of shared memory.
+#
+# Layout:
+#   ring header  magic(4s) version(I) slot_count(I) slot_size(Q) write_seq(Q) instance(Q)
+#   slot header  seq_begin(Q) seq_end(Q) length(Q)  (padded to SLOT_HEADER_SIZE)
+#   slot payload slot_size bytes
+#
+# Each slot is a seqlock. The writer sets seq_begin, copies the payload and then
+# sets seq_end. A reader checks seq_end == seq before reading and
+# seq_begin == seq afterwards; any mismatch means the slot was overwritten
+# (the ring lapped the reader) or torn (a write started while we were reading).
+# Python has no memory fences, so this relies on the stores becoming visible in
+# program order, which holds on x86 and in practice on the ARM boards we use
+# since the header and payload writes are separated by a full memcpy.
+
+MAGIC = b"SNRG"
+VERSION = 1
+RING_HEADER = struct.Struct("<4sIIQQQ")
+WRITE_SEQ_OFFSET = 20
+SLOT_HEADER = struct.Struct("<QQQ")
+RING_HEADER_SIZE = 64
+SLOT_HEADER_SIZE = 64
+
+DEFAULT_NAME = "sensor_nest_frames"
+
+def _slot_offset(slot, slot_size):
+    return RING_HEADER_SIZE + slot * (SLOT_HEADER_SIZE + slot_size)
+
+class FrameRingWriter:
+    def __init__(self, name=DEFAULT_NAME, slot_count=8, slot_size=1280 * 960 * 3 // 2):
+        self.name = name
+        self.slot_count = slot_count
+        self.slot_size = slot_size
+        total = RING_HEADER_SIZE + slot_count * (SLOT_HEADER_SIZE + slot_size)
+        try:
+            self.shm = shared_memory.SharedMemory(name=name, create=True, size=total)
+        except FileExistsError:
+            # Left behind by a writer that crashed; start over with a fresh block.
+            stale = shared_memory.SharedMemory(name=name)
+            stale.close()
+            stale.unlink()
+            self.shm = shared_memory.SharedMemory(name=name, create=True, size=total)
+        self.buf = self.shm.buf
+        self.seq = 0
+        # Random id so readers can tell a restarted writer from the old one.
+        self.instance = struct.unpack("<Q", os.urandom(8))[0]
+        RING_HEADER.pack_into(self.buf, 0, MAGIC, VERSION, slot_count, slot_size, 0, self.instance)
+
+    def write(self, data):
+        # Returns the notification dict to publish, or None if the frame does
+        # not fit in a slot (the caller should fall back to the ZMQ path).
+        # Accepts bytes or a uint8 array such as the (N, 1) buffer from cv2.imencode.
+        data = memoryview(data).cast("B")
+        length = data.nbytes
+        if length > self.slot_size:
+            return None
+        self.seq += 1
+        slot = self.seq % self.slot_count
+        offset = _slot_offset(slot, self.slot_size)
+        payload = offset + SLOT_HEADER_SIZE
+
+        struct.pack_into("<Q", self.buf, offset, self.seq)                  # seq_begin
+        self.buf[payload:payload + length] = data
+        struct.pack_into("<QQ", self.buf, offset + 8, self.seq, length)     # seq_end, length
+        struct.pack_into("<Q", self.buf, WRITE_SEQ_OFFSET, self.seq)        # ring write_seq
+        return {"name": self.name, "instance": self.instance, "slot": slot, "seq": self.seq, "length": length}
+
+    def close(self):
+        self.buf = None
+        self.shm.close()
+        self.shm.unlink()
+
+class FrameRingReader:
+    def __init__(self, name=DEFAULT_NAME):
+        self.name = name
+        self.shm = shared_memory.SharedMemory(name=name)
+        try:
+            # Before Python 3.13 attaching registers the block with the resource
+            # tracker, which would unlink it when this reader exits.
+            from multiprocessing import resource_tracker
+            resource_tracker.unregister(self.shm._name, "shared_memory")
+        except Exception:
+            pass
+        self.buf = self.shm.buf
+        magic, version, self.slot_count, self.slot_size, _, self.instance = RING_HEADER.unpack_from(self.buf, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError("{} is not a frame ring (version {})".format(name, VERSION))
+        self.overwritten = 0
+        self.torn = 0
+
+    def write_seq(self):
+        return struct.unpack_from("<Q", self.buf, WRITE_SEQ_OFFSET)[0]
+
+    def view(self, slot, seq):
+        # Zero-copy view of a slot, or None if it no longer holds `seq`.
+        # The view must be checked with still_valid() after it has been used.
+        offset = _slot_offset(slot, self.slot_size)
+        seq_begin, seq_end, length = SLOT_HEADER.unpack_from(self.buf, offset)
+        if seq_end != seq or seq_begin != seq:
+            self.overwritten += 1
+            return None
+        payload = offset + SLOT_HEADER_SIZE
+        return self.buf[payload:payload + length]
+
+    def still_valid(self, slot, seq):
+        offset = _slot_offset(slot, self.slot_size)
+        if struct.unpack_from("<Q", self.buf, offset)[0] != seq:
+            self.torn += 1
+            return False
+        return True
+
+    def read(self, slot, seq):
+        # Copy a slot out of shared memory. Returns bytes or None.
+        view = self.view(slot, seq)
+        if view is None:
+            return None
+        data = bytes(view)
+        view.release()
+        if not self.still_valid(slot, seq):
+            return None
+        return data
+
+    def close(self):
+        self.buf = None
+        self.shm.close()
+
+_readers = {}
+
+def resolve_image(message):
+    # For detection messages that carry a "shm" notification instead of an
+    # "image", fetch the JPEG from the ring and fill in the base64 image the
+    # browser page expects. Returns False if the frame was lost.
+    notification = message.pop("shm", None)
+    if notification is None:
+        return True
+    name = notification["name"]
+    try:
+        reader = _readers.get(name)
+        if reader is not None and reader.instance != notification["instance"]:
+            # The writer restarted and created a new block under the same name.
+            reader.close()
+            reader = None
+        if reader is None:
+            reader = _readers[name] = FrameRingReader(name)
+        view = reader.view(notification["slot"], notification["seq"])
+    except (FileNotFoundError, ValueError):
+        # Writer restarted (or not running); reattach on the next message.
+        _readers.pop(name, None)
+        view = None
+    if view is None:
+        message["image"] = None
+        return False
+
+    image = base64.b64encode(view).decode('utf-8')
+    view.release()
+    if not reader.still_valid(notification["slot"], notification["seq"]):
+        message["image"] = None
+        return False
+    message["image"] = image
+    return True
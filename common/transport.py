@@ -0,0 +1,126 @@
+import json
+import os
+import zmq
+import zmq.asyncio
+
+# Shared ZeroMQ transport settings for all nodes and bridges.
+#
+# Endpoints, high-water marks and conflation are read from transport.json next
+# to this file (or the file named by SENSOR_NEST_TRANSPORT_CONFIG). The scheme
+# can be switched without editing the file with SENSOR_NEST_TRANSPORT=tcp|ipc|inproc.
+#
+#   tcp    - works across hosts, goes through the loopback stack on one host
+#   ipc    - unix domain sockets, same host only, no TCP overhead
+#   inproc - same process only (publisher and subscriber share one Context)
+#
+# The publisher binds and subscribers connect, except on streams marked
+# "bind": "subscriber" (many publishers, one collector, e.g. metrics), where
+# the subscriber binds and every publisher connects to it.
+
+CONFIG_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "transport.json")
+
+DEFAULT_CONFIG = {
+    "scheme": "tcp",
+    "host": "localhost",
+    "ipc_dir": "/tmp/sensor_nest",
+    "io_threads": 1,
+    "streams": {
+        "detection": {"port": 5555, "hwm": 2, "conflate": True},
+        "lidar": {"port": 5556, "hwm": 32, "conflate": False},
+        "imu": {"port": 5557, "hwm": 200, "conflate": False},
+        "fusion": {"port": 5558, "hwm": 10, "conflate": False},
+        "map": {"port": 5559, "hwm": 32, "conflate": False},
+        "pose": {"port": 5560, "hwm": 50, "conflate": False},
+        "imu_batch": {"port": 5561, "hwm": 100, "conflate": False},
+        "metrics": {"port": 5562, "hwm": 100, "conflate": False, "bind": "subscriber"},
+        "feedback": {"port": 5563, "hwm": 1, "conflate": True},
+        "detection_meta": {"port": 5564, "hwm": 100, "conflate": False},
+    },
+}
+
+SCHEMES = ("tcp", "ipc", "inproc")
+
+_config = None
+
+def load_config(path=None):
+    config = json.loads(json.dumps(DEFAULT_CONFIG))  # Deep copy of the defaults
+    path = path or os.environ.get("SENSOR_NEST_TRANSPORT_CONFIG", CONFIG_PATH)
+    if os.path.exists(path):
+        with open(path, "r") as f:
+            overrides = json.load(f)
+        streams = overrides.pop("streams", {})
+        config.update(overrides)
+        for name, settings in streams.items():
+            config["streams"].setdefault(name, {}).update(settings)
+
+    scheme = os.environ.get("SENSOR_NEST_TRANSPORT")
+    if scheme:
+        config["scheme"] = scheme
+    if config["scheme"] not in SCHEMES:
+        raise ValueError("Unknown transport scheme: {}".format(config["scheme"]))
+    return config
+
+def get_config():
+    global _config
+    if _config is None:
+        _config = load_config()
+    return _config
+
+def stream_settings(stream):
+    streams = get_config()["streams"]
+    if stream not in streams:
+        raise KeyError("Unknown stream: {}".format(stream))
+    return streams[stream]
+
+def endpoint(stream, bind=False, scheme=None):
+    config = get_config()
+    settings = stream_settings(stream)
+    # A stream may pin its own scheme, e.g. tcp for one that is read remotely.
+    scheme = scheme or settings.get("scheme", config["scheme"])
+
+    if scheme == "inproc":
+        return "inproc://{}".format(stream)
+    if scheme == "ipc":
+        if bind:
+            os.makedirs(config["ipc_dir"], exist_ok=True)
+        return "ipc://{}".format(os.path.join(config["ipc_dir"], stream + ".ipc"))
+    if bind:
+        return "tcp://*:{}".format(settings["port"])
+    return "tcp://{}:{}".format(settings.get("host", config["host"]), settings["port"])
+
+def make_context(use_asyncio=False, io_threads=None):
+    if io_threads is None:
+        io_threads = get_config()["io_threads"]
+    if use_asyncio:
+        return zmq.asyncio.Context(io_threads=io_threads)
+    return zmq.Context(io_threads=io_threads)
+
+def _apply_options(socket, settings, hwm_option):
+    # CONFLATE keeps only the newest message and must be set before bind/connect.
+    # It does not support multipart messages, so leave it off for those streams.
+    if settings.get("conflate"):
+        socket.setsockopt(zmq.CONFLATE, 1)
+    elif "hwm" in settings:
+        socket.setsockopt(hwm_option, settings["hwm"])
+
+def subscriber_binds(stream):
+    return stream_settings(stream).get("bind") == "subscriber"
+
+def publisher(context, stream, scheme=None):
+    socket = context.socket(zmq.PUB)
+    _apply_options(socket, stream_settings(stream), zmq.SNDHWM)
+    if subscriber_binds(stream):
+        socket.connect(endpoint(stream, scheme=scheme))
+    else:
+        socket.bind(endpoint(stream, bind=True, scheme=scheme))
+    return socket
+
+def subscriber(context, stream, topic=b"", scheme=None):
+    socket = context.socket(zmq.SUB)
+    _apply_options(socket, stream_settings(stream), zmq.RCVHWM)
+    if subscriber_binds(stream):
+        socket.bind(endpoint(stream, bind=True, scheme=scheme))
+    else:
+        socket.connect(endpoint(stream, scheme=scheme))
+    socket.setsockopt(zmq.SUBSCRIBE, topic)
+    return socket
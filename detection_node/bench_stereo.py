@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+# Per-frame cost of ROI stereo depth (stereo.py) against box area, and of
+# whole-frame disparity at the same scale for comparison.
+#
+#   python3 bench_stereo.py                                   # synthetic pair, known depth
+#   python3 bench_stereo.py --left left.mp4 --right right.mp4 --calibration stereo_calibration.json
+#
+# Each step uses one centered box covering the given share of the frame.
+# The synthetic pair puts a textured object at --depth in front of a
+# background at 8 m, so the depth error is reported too.
+import argparse
+import time
+
+import cv2
+import numpy as np
+
+from stereo import RoiStereo, ideal_calibration, load_stereo_calibration
+
+AREAS = (0.01, 0.02, 0.05, 0.1, 0.25, 0.5)
+
+def synthetic_pairs(size, focal, baseline, depth, count, seed=0):
+    width, height = size
+    rng = np.random.default_rng(seed)
+    background_shift = int(round(focal * baseline / 8.0))
+    object_shift = int(round(focal * baseline / depth))
+    pairs = []
+    for _ in range(count):
+        texture = rng.integers(0, 255, (height // 4, (width + 2 * object_shift) // 4 + 1, 3), dtype=np.uint8)
+        texture = cv2.resize(texture, (texture.shape[1] * 4, height), interpolation=cv2.INTER_NEAREST)
+        left = texture[:, object_shift:object_shift + width].copy()
+        right = texture[:, object_shift + background_shift:object_shift + background_shift + width].copy()
+        pairs.append((left, right))
+    return pairs, object_shift
+
+def place_object(left, right, box, shift, seed):
+    # Same texture patch at the box in the left view, `shift` px left in the right view.
+    x1, y1, x2, y2 = box
+    rng = np.random.default_rng(seed)
+    patch = rng.integers(0, 255, ((y2 - y1) // 4 + 1, (x2 - x1) // 4 + 1, 3), dtype=np.uint8)
+    patch = cv2.resize(patch, (patch.shape[1] * 4, patch.shape[0] * 4), interpolation=cv2.INTER_NEAREST)
+    patch = patch[:y2 - y1, :x2 - x1]
+    left, right = left.copy(), right.copy()
+    left[y1:y2, x1:x2] = patch
+    right[y1:y2, max(0, x1 - shift):x2 - shift] = patch[:, max(0, shift - x1):]
+    return left, right
+
+def centered_box(size, area):
+    width, height = size
+    box_width, box_height = int(width * area ** 0.5), int(height * area ** 0.5)
+    x1, y1 = (width - box_width) // 2, (height - box_height) // 2
+    return [x1, y1, x1 + box_width, y1 + box_height]
+
+def read_pairs(left_path, right_path, count):
+    left_cap, right_cap = cv2.VideoCapture(left_path), cv2.VideoCapture(right_path)
+    pairs = []
+    while len(pairs) < count:
+        left_ok, left = left_cap.read()
+        right_ok, right = right_cap.read()
+        if not (left_ok and right_ok):
+            break
+        pairs.append((left, right))
+    return pairs
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--left", default="", help="Recorded left video (default: synthetic pair)")
+    parser.add_argument("--right", default="")
+    parser.add_argument("--calibration", default="", help="Stereo calibration for recorded pairs")
+    parser.add_argument("--frames", type=int, default=20)
+    parser.add_argument("--scale", type=float, default=0.5)
+    parser.add_argument("--disparities", type=int, default=64)
+    parser.add_argument("--depth", type=float, default=2.5, help="Object depth in the synthetic pair (m)")
+    args = parser.parse_args()
+
+    synthetic = not args.left
+    if synthetic:
+        size, focal, baseline = (1280, 960), 900.0, 0.12
+        calibration = ideal_calibration(size, focal, baseline)
+        pairs, shift = synthetic_pairs(size, focal, baseline, args.depth, min(args.frames, 5))
+        print("Synthetic 1280x960 pair, object at {} m ({} px disparity)".format(args.depth, shift))
+    else:
+        calibration = load_stereo_calibration(args.calibration)
+        size = calibration.image_size
+        pairs = read_pairs(args.left, args.right, args.frames)
+        if not pairs:
+            print("Error: Could not read frames from", args.left, args.right)
+            exit(1)
+        print("{} recorded pairs at {}x{}".format(len(pairs), *size))
+
+    stereo = RoiStereo(calibration, scale=args.scale, num_disparities=args.disparities)
+    print("Disparity at {}x{}, {} disparities\n".format(stereo.size[0], stereo.size[1], args.disparities))
+    print("{:>8} {:>10} {:>10} {:>12}{}".format("area", "ms/frame", "kpixels", "us/kpixel",
+                                                "   depth (m)" if synthetic else ""))
+    for area in AREAS:
+        box = centered_box(size, area)
+        times, depths = [], []
+        for i in range(args.frames):
+            left, right = pairs[i % len(pairs)]
+            if synthetic:
+                left, right = place_object(left, right, box, shift, i)
+            detections = [{"bbox": box}]
+            start = time.perf_counter()
+            stereo.attach_depth(left, right, detections)
+            times.append(time.perf_counter() - start)
+            depths.append(detections[0]["depth_m"])
+        ms = np.median(times) * 1e3
+        extra = ""
+        if synthetic:
+            valid = [d for d in depths if d is not None]
+            extra = "   {:.3f}".format(np.median(valid)) if valid else "   -"
+        print("{:>7.0f}% {:>10.2f} {:>10.1f} {:>12.2f}{}".format(
+            area * 100, ms, stereo.pixels / 1e3, ms * 1e3 / (stereo.pixels / 1e3), extra))
+
+    times = []
+    for i in range(max(3, args.frames // 4)):
+        left, right = pairs[i % len(pairs)]
+        start = time.perf_counter()
+        stereo.full_frame_disparity(left, right)
+        times.append(time.perf_counter() - start)
+    print("{:>8} {:>10.2f} {:>10.1f}".format("full", np.median(times) * 1e3, stereo.size[0] * stereo.size[1] / 1e3))
+
+if __name__ == "__main__":
+    main()
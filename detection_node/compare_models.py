@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+# Compare a candidate detection model (by default the INT8 one from
+# quantize_model.py) against a reference (the FP32 model) on the same
+# frames: per-frame latency and how well the detections agree.
+#
+#   python3 compare_models.py                                # onnx vs onnx-int8
+#   python3 compare_models.py --reference caffe --candidate onnx --video drive.mp4 --frames 300
+#
+# Agreement treats the reference's detections as ground truth: a candidate
+# detection matches a reference one of the same class with IoU >= --iou
+# (greedy, highest confidence first). Reported: recall (reference
+# detections found), precision (candidate detections that match), mean IoU
+# and mean confidence difference of the matches. Models with different
+# label sets (Caffe VOC vs ONNX COCO) are matched by label name, VOC names
+# spelled the COCO way (model_manager.VOC_TO_COCO), and only the classes
+# both sets have are compared; the report says how many.
+import argparse
+import os
+import sys
+import time
+
+import cv2
+import numpy as np
+
+import model_manager
+from quantize_model import IMAGE_EXTENSIONS
+
+def load_frames(image_dir, video, frame_count):
+    frames = []
+    for name in sorted(os.listdir(image_dir)):
+        if name.lower().endswith(IMAGE_EXTENSIONS):
+            image = cv2.imread(os.path.join(image_dir, name))
+            if image is not None:
+                frames.append(image)
+    if video:
+        cap = cv2.VideoCapture(video)
+        while len(frames) < frame_count:
+            ret, frame = cap.read()
+            if not ret:
+                break
+            frames.append(frame)
+        cap.release()
+    return frames
+
+def iou(a, b):
+    x1, y1 = max(a[0], b[0]), max(a[1], b[1])
+    x2, y2 = min(a[2], b[2]), min(a[3], b[3])
+    inter = max(0, x2 - x1) * max(0, y2 - y1)
+    union = (a[2] - a[0]) * (a[3] - a[1]) + (b[2] - b[0]) * (b[3] - b[1]) - inter
+    return inter / union if union > 0 else 0.0
+
+def class_name(label):
+    return model_manager.VOC_TO_COCO.get(label, label)
+
+def shared_classes(reference_labels, candidate_labels):
+    # Class names both models detect, or None when the label sets are the same.
+    if list(reference_labels) == list(candidate_labels):
+        return None
+    unused = {"background", "N/A"}
+    return ({class_name(label) for label in reference_labels} & {class_name(label) for label in candidate_labels}) - unused
+
+def keep_classes(detections, classes):
+    if classes is None:
+        return detections
+    return [[d for d in frame if class_name(d["label"]) in classes] for frame in detections]
+
+def match(reference, candidate, threshold):
+    # [(reference detection, candidate detection, iou)] greedy matches.
+    matches = []
+    used = set()
+    for ref in sorted(reference, key=lambda d: -d["confidence"]):
+        best, best_iou = None, threshold
+        for i, cand in enumerate(candidate):
+            if i in used or class_name(cand["label"]) != class_name(ref["label"]):
+                continue
+            overlap = iou(ref["bbox"], cand["bbox"])
+            if overlap >= best_iou:
+                best, best_iou = i, overlap
+        if best is not None:
+            used.add(best)
+            matches.append((ref, candidate[best], best_iou))
+    return matches
+
+def time_model(model, frames, runs, threshold):
+    # (per-frame detections, per-frame latencies in seconds)
+    for frame in frames[:3]:
+        model.detect([frame], threshold)  # warm up (allocation, lazy init)
+    detections, latencies = [], []
+    for frame in frames:
+        times = []
+        for _ in range(runs):
+            start = time.perf_counter()
+            result = model.detect([frame], threshold)[0]
+            times.append(time.perf_counter() - start)
+        detections.append(result)
+        latencies.append(min(times))
+    return detections, np.array(latencies)
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--reference", default="onnx", help="Reference model name or path (FP32)")
+    parser.add_argument("--candidate", default="onnx-int8", help="Candidate model name or path (INT8)")
+    parser.add_argument("--engine", choices=model_manager.ENGINES, default="auto")
+    parser.add_argument("--threads", type=int, default=0, help="onnxruntime intra-op threads (0 = one per core)")
+    parser.add_argument("--images", default=os.path.join(os.path.dirname(os.path.abspath(__file__)), "images"))
+    parser.add_argument("--video", default="", help="Also use the first --frames frames of this video")
+    parser.add_argument("--frames", type=int, default=100)
+    parser.add_argument("--runs", type=int, default=5, help="Timed runs per frame (the fastest counts)")
+    parser.add_argument("--confidence", type=float, default=0.3)
+    parser.add_argument("--iou", type=float, default=0.5)
+    args = parser.parse_args()
+
+    frames = load_frames(args.images, args.video, args.frames)
+    if not frames:
+        print("Error: No frames to compare on")
+        sys.exit(1)
+
+    results = {}
+    for role, name in (("reference", args.reference), ("candidate", args.candidate)):
+        try:
+            model = model_manager.load_model(name, engine=args.engine, threads=args.threads)
+        except ValueError as e:
+            print("Error:", e)
+            sys.exit(1)
+        detections, latencies = time_model(model, frames, args.runs, args.confidence)
+        results[role] = (model, detections, latencies)
+        print("{:<9} {:<32} {:<11} median {:6.2f} ms  p90 {:6.2f} ms  {:6.1f} fps  {} detections".format(
+            role, model.name, model.engine, np.median(latencies) * 1e3, np.percentile(latencies, 90) * 1e3,
+            1.0 / np.median(latencies), sum(len(d) for d in detections)))
+
+    reference_model, reference, reference_latency = results["reference"]
+    candidate_model, candidate, candidate_latency = results["candidate"]
+    classes = shared_classes(reference_model.labels, candidate_model.labels)
+    reference, candidate = keep_classes(reference, classes), keep_classes(candidate, classes)
+    matches = [m for ref, cand in zip(reference, candidate) for m in match(ref, cand, args.iou)]
+    reference_count = sum(len(d) for d in reference)
+    candidate_count = sum(len(d) for d in candidate)
+    print("\nSpeedup: {:.2f}x (median latency)".format(np.median(reference_latency) / np.median(candidate_latency)))
+    print("Agreement over {} frames (IoU >= {}, confidence > {}):".format(len(frames), args.iou, args.confidence))
+    if classes is not None:
+        print("  label sets differ: only the {} classes both models detect are compared".format(len(classes)))
+    print("  recall    {:.3f}  ({} of {} reference detections)".format(
+        len(matches) / reference_count if reference_count else 1.0, len(matches), reference_count))
+    print("  precision {:.3f}  ({} of {} candidate detections)".format(
+        len(matches) / candidate_count if candidate_count else 1.0, len(matches), candidate_count))
+    if matches:
+        print("  mean IoU {:.3f}, mean |confidence difference| {:.3f}".format(
+            np.mean([m[2] for m in matches]), np.mean([abs(m[0]["confidence"] - m[1]["confidence"]) for m in matches])))
+
+if __name__ == "__main__":
+    main()
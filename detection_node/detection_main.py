@@ -1,5 +1,7 @@
 #!/usr/bin/env python3
+import argparse
 import cv2
+import os
 import sys
 import zmq
 import json
@@ -7,25 +9,61 @@ import base64
 import time
 import numpy as np
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from common import transport
+from common.adaptive_quality import AdaptiveQuality
+from common.capture import MODES as CAPTURE_MODES, open_capture
+from common.metrics import Metrics
+from common.shm_ring import FrameRingWriter
+import detector
+import model_manager
+import stereo
+
 def main():
-    if len(sys.argv) < 2:
-        print("Usage: {} <input_source> [output_video]".format(sys.argv[0]))
-        sys.exit(1)
+    parser = argparse.ArgumentParser()
+    parser.add_argument("input_source",
+                        help="'camera' or '0' for /dev/video0 (/dev/video1, the left camera, with --right), "
+                             "'test' for a GStreamer test source, otherwise a video file")
+    parser.add_argument("output_video", nargs="?", default="", help="Optional annotated output video")
+    parser.add_argument("--capture", choices=CAPTURE_MODES, default="queue",
+                        help="queue: every frame, in order; drop/latest: only the newest frame, "
+                             "for the lowest latency when inference is slower than the camera (see common/capture.py)")
+    parser.add_argument("--frame-transport", choices=["zmq", "shm"], default="zmq",
+                        help="zmq: base64 JPEG inside the JSON message; "
+                             "shm: JPEG in a shared memory ring, only a slot notification over ZMQ (same host only)")
+    parser.add_argument("--shm-slots", type=int, default=8, help="Number of frame slots in the shared memory ring")
+    parser.add_argument("--model", default="caffe",
+                        help="caffe, onnx, onnx-int8 or a .onnx/.caffemodel path (see model_manager.py)")
+    parser.add_argument("--engine", choices=model_manager.ENGINES, default="auto",
+                        help="ONNX inference engine (auto: onnxruntime if installed, else OpenCV DNN)")
+    parser.add_argument("--backend", choices=sorted(detector.BACKENDS), default="cuda",
+                        help="OpenCV DNN backend")
+    parser.add_argument("--adaptive", action="store_true",
+                        help="Adapt JPEG quality, scale and publish rate to the encoder time and bridge feedback "
+                             "(see common/adaptive_quality.py)")
+    parser.add_argument("--quality", type=int, default=80, help="JPEG quality (starting quality with --adaptive)")
+    parser.add_argument("--image-fps", type=float, default=0,
+                        help="Imagery rate on the detection stream (default: every frame); "
+                             "detections always go out at the inference rate on detection_meta")
+    parser.add_argument("--image-scale", type=float, default=1.0, help="Imagery scale (0.5 = half resolution)")
+    parser.add_argument("--right", default="",
+                        help="Right camera ('camera' for /dev/video3, or a video file): adds depth_m per detection "
+                             "from ROI stereo (see stereo.py)")
+    parser.add_argument("--stereo-calibration", default=stereo.DEFAULT_PATH,
+                        help="Stereo calibration from stereo_calibrate.py")
+    parser.add_argument("--stereo-scale", type=float, default=0.5, help="Resolution the disparity is computed at")
+    parser.add_argument("--num-disparities", type=int, default=64,
+                        help="Disparity search range in downscaled pixels (multiple of 16; sets the nearest depth)")
+    args = parser.parse_args()
 
-    input_source = sys.argv[1]
-    save_to_file = (len(sys.argv) >= 3)
-    output_video = sys.argv[2] if save_to_file else ""
-
-    # Open input source
-    if input_source.lower() in ["camera", "0"]:
-        # Use a GStreamer pipeline to force MJPG at 1280x960 at 30 fps
-        pipeline = ("v4l2src device=/dev/video0 ! image/jpeg,framerate=30/1,width=1280,height=960 ! "
-                    "jpegparse ! jpegdec ! videoconvert ! appsink")
-        cap = cv2.VideoCapture(pipeline, cv2.CAP_GSTREAMER)
-        print("Using live camera feed from /dev/video0.")
-    else:
-        cap = cv2.VideoCapture(input_source)
-        print("Using video file:", input_source)
+    input_source = args.input_source
+    save_to_file = bool(args.output_video)
+    output_video = args.output_video
+
+    # Open input source (camera: MJPG at 1280x960 at 30 fps through GStreamer).
+    # With --right it is the left camera of the calibrated pair.
+    cap = open_capture(input_source, args.capture, device="/dev/video1" if args.right else "/dev/video0")
+    print("Using", cap.description)
     
     if not cap.isOpened():
         print("Error: Could not open input source:", input_source)
@@ -38,6 +76,27 @@ def main():
     if fps <= 0:
         fps = 30.0  # default FPS
 
+    # Optional right camera for depth. Both cameras are grabbed before either
+    # frame is decoded, so the pair is as close in time as the drivers allow.
+    right_cap = None
+    roi_stereo = None
+    if args.right:
+        right_cap = open_capture(args.right, args.capture, device="/dev/video3")
+        if not right_cap.isOpened():
+            print("Error: Could not open right input source:", args.right)
+            sys.exit(1)
+        try:
+            calibration = stereo.load_stereo_calibration(args.stereo_calibration)
+        except (OSError, ValueError, KeyError) as e:
+            print("Error: Could not load stereo calibration:", e)
+            sys.exit(1)
+        if calibration.image_size != (frame_width, frame_height):
+            print("Error: Stereo calibration is for {}x{}, frames are {}x{}".format(
+                calibration.image_size[0], calibration.image_size[1], frame_width, frame_height))
+            sys.exit(1)
+        roi_stereo = stereo.RoiStereo(calibration, scale=args.stereo_scale, num_disparities=args.num_disparities)
+        print("Stereo depth from {} at {}x{}".format(args.right, roi_stereo.size[0], roi_stereo.size[1]))
+
     if save_to_file:
         fourcc = cv2.VideoWriter_fourcc(*'MJPG')
         writer = cv2.VideoWriter(output_video, fourcc, fps, (frame_width, frame_height))
@@ -46,119 +105,172 @@ def main():
             sys.exit(1)
         print("Saving output to:", output_video)
 
-    # Set up ZeroMQ publisher on TCP port 5555
-    context = zmq.Context()
-    publisher = context.socket(zmq.PUB)
-    publisher.bind("tcp://*:5555")
-    print("ZeroMQ publisher bound to tcp://*:5555")
-    
-    # Load the ONNX model
-    # onnx_model = "model_zoo/ssd_mobilenet_v1_10.onnx"
-    # net = cv2.dnn.readNetFromONNX(onnx_model)
-    # if net.empty():
-    #     print("Error: Could not load the network from the ONNX model file:", onnx_model)
-    #     sys.exit(1)
-    # Load the Caffe model
-    prototxt_path = "model_zoo/MobileNetSSD_deploy.prototxt"
-    model_path = "model_zoo/MobileNetSSD_deploy.caffemodel"
-    net = cv2.dnn.readNetFromCaffe(prototxt_path, model_path)
+    # Set up ZeroMQ publisher (tcp://*:5555 by default, see common/transport.json)
+    context = transport.make_context()
+    publisher = transport.publisher(context, "detection")
+    print("ZeroMQ publisher bound to", transport.endpoint("detection", bind=True))
+    meta_publisher = transport.publisher(context, "detection_meta")
+    print("Detection metadata on", transport.endpoint("detection_meta", bind=True))
+    metrics = Metrics("detection", context)
+
+    frame_ring = None
+    if args.frame_transport == "shm":
+        # A JPEG is far smaller than the raw frame, so half a raw frame per slot is plenty.
+        frame_ring = FrameRingWriter(slot_count=args.shm_slots, slot_size=frame_width * frame_height * 3 // 2)
+        print("Publishing frames through shared memory ring:", frame_ring.name)
     
-    if net.empty():
-        print("Error: Could not load the network from the Caffe model file:", model_path)
+    # Load the model (Caffe MobileNetSSD by default, see model_manager.py)
+    try:
+        model = model_manager.load_model(args.model, engine=args.engine, backend=args.backend)
+    except ValueError as e:
+        print("Error:", e)
         sys.exit(1)
+    print("Model {} on {}".format(model.name, model.engine))
 
-    net.setPreferableBackend(cv2.dnn.DNN_BACKEND_CUDA)
-    net.setPreferableTarget(cv2.dnn.DNN_TARGET_CUDA_FP16)
-    
-    # Define class labels.
-    labels = ["background", "aeroplane", "bicycle", "bird", "boat",
-              "bottle", "bus", "car", "cat", "chair", "cow", "diningtable",
-              "dog", "horse", "motorbike", "person", "pottedplant",
-              "sheep", "sofa", "train", "tvmonitor"]
+    # Imagery rate, scale and JPEG quality: fixed by the arguments, or
+    # adapted within them with --adaptive. Bounding boxes stay in full frame
+    # coordinates; only the JPEG is scaled.
+    image_fps = min(args.image_fps, fps) if args.image_fps > 0 else fps
+    feedback = None
+    if args.adaptive:
+        controller = AdaptiveQuality(fps=(min(5.0, image_fps), image_fps), start_quality=args.quality,
+                                     scales=(args.image_scale, args.image_scale * 0.75, args.image_scale * 0.5))
+        feedback = transport.subscriber(context, "feedback")
+        print("Adaptive quality: feedback from", transport.endpoint("feedback"))
+    else:
+        controller = AdaptiveQuality(quality=(args.quality, args.quality), scales=(args.image_scale,),
+                                     fps=(image_fps, image_fps), start_quality=args.quality)
+    print("Imagery at up to {:.1f} fps, scale {}".format(image_fps, args.image_scale))
+
+    def publish_image(frame, frame_id, capture_ns, start):
+        encoding = controller.settings()
+        # Encode the processed frame to JPEG.
+        if encoding["scale"] != 1.0:
+            frame = cv2.resize(frame, None, fx=encoding["scale"], fy=encoding["scale"], interpolation=cv2.INTER_AREA)
+        ret, buffer = cv2.imencode('.jpg', frame, [int(cv2.IMWRITE_JPEG_QUALITY), encoding["quality"]])
+        if not ret:
+            print("Error encoding frame to JPEG.")
+            metrics.count("dropped")
+            return
+        encoded = time.perf_counter()
+        metrics.observe("encode", encoded - start)
+        controller.observe_encode(encoded - start)
+        metrics.gauge("jpeg_quality", encoding["quality"])
+        metrics.gauge("jpeg_scale", encoding["scale"])
+        metrics.gauge("image_fps", encoding["fps"])
+
+        # timestamp (capture, wall ns) lets the bridge measure its lag;
+        # encoding holds the settings of this frame. The detections drawn on
+        # it are in the detection_meta message with the same frame id.
+        message = {
+            "frame": frame_id,
+            "timestamp": capture_ns,
+            "encoding": encoding,
+        }
+
+        # With the shared memory ring only a slot notification goes over ZMQ;
+        # frames that do not fit in a slot fall back to base64.
+        notification = frame_ring.write(buffer) if frame_ring is not None else None
+        if notification is not None:
+            message["shm"] = notification
+        else:
+            if frame_ring is not None:
+                metrics.count("shm_fallback")
+            message["image"] = base64.b64encode(buffer).decode('utf-8')
+        message_json = json.dumps(message)
+        
+        # Publish the JSON message via ZeroMQ.
+        publisher.send_string(message_json)
+        metrics.observe("publish", time.perf_counter() - encoded)
+        metrics.count("images")
+        metrics.gauge("message_bytes", len(message_json))
 
     confidence_threshold = 0.2
     frame_count = 0
 
     while True:
-        ret, frame = cap.read()
+        start = time.perf_counter()
+        if right_cap is not None:
+            ret = cap.grab() and right_cap.grab()
+            if ret:
+                ret, frame = cap.retrieve()
+                ret_right, right_frame = right_cap.retrieve()
+                ret = ret and ret_right and right_frame is not None
+        else:
+            ret, frame = cap.read()
         if not ret or frame is None:
             print("End of input or error reading frame.")
             break
+        captured = time.perf_counter()
+        # Wall clock of the grab, so the bridge's lag includes any wait after it
+        capture_ns = cap.frame_ns
+        metrics.observe("capture", captured - start)
+        # How old the frame is when inference starts (see common/capture.py)
+        frame_age = cap.age()
+        metrics.observe("frame_age", frame_age)
+        metrics.set_count("skipped_frames", cap.skipped)
 
         frame_count += 1
 
-        # Create blob; note many ONNX SSD models expect a 300x300 input.
-        blob = cv2.dnn.blobFromImage(frame, 0.007843, (300, 300), (127.5, 127.5, 127.5), swapRB=False, crop=False)
-        # If your model requires a specific input node name, set it here (e.g., "input")
-        net.setInput(blob)
-        detections = net.forward()
-
-        # The detections shape is typically [1, 1, N, 7]. Reshape to [N, 7]
-        detectionMat = detections.reshape(detections.shape[2], detections.shape[3])
-        detections_list = []
-
-        # Loop through each detection.
-        for i in range(detectionMat.shape[0]):
-            confidence = float(detectionMat[i, 2])
-            if confidence > confidence_threshold:
-                class_id = int(detectionMat[i, 1])
-                x_left_bottom = int(detectionMat[i, 3] * frame.shape[1])
-                y_left_bottom = int(detectionMat[i, 4] * frame.shape[0])
-                x_right_top   = int(detectionMat[i, 5] * frame.shape[1])
-                y_right_top   = int(detectionMat[i, 6] * frame.shape[0])
-                
-                # Draw bounding box on the frame.
-                cv2.rectangle(frame, (x_left_bottom, y_left_bottom), (x_right_top, y_right_top), (0, 255, 0), 2)
-                
-                # Prepare label text.
-                label_text = "{}: {:.2f}".format(labels[class_id] if class_id < len(labels) else "Unknown", confidence)
-                (label_width, label_height), baseline = cv2.getTextSize(label_text, cv2.FONT_HERSHEY_SIMPLEX, 0.5, 1)
-                y_left_bottom = max(y_left_bottom, label_height)
-                cv2.rectangle(frame, (x_left_bottom, y_left_bottom - label_height),
-                              (x_left_bottom + label_width, y_left_bottom + baseline), (255, 255, 255), cv2.FILLED)
-                cv2.putText(frame, label_text, (x_left_bottom, y_left_bottom),
-                            cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 0, 0), 1)
-                
-                # Add detection info to our list.
-                detection_info = {
-                    "class_id": class_id,
-                    "label": labels[class_id] if class_id < len(labels) else "Unknown",
-                    "confidence": confidence,
-                    "bbox": [x_left_bottom, y_left_bottom, x_right_top, y_right_top]
-                }
-                detections_list.append(detection_info)
-        
-        # Encode the processed frame to JPEG.
-        ret, buffer = cv2.imencode('.jpg', frame, [int(cv2.IMWRITE_JPEG_QUALITY), 80])
-        if not ret:
-            print("Error encoding frame to JPEG.")
-            continue
-        
-        # Base64-encode the JPEG data.
-        image_base64 = base64.b64encode(buffer).decode('utf-8')
-        
-        # Build a combined JSON message.
-        message = {
+        detections_list = model.detect([frame], confidence_threshold)[0]
+        inferred = time.perf_counter()
+        metrics.observe("inference", inferred - captured)
+
+        if roi_stereo is not None:
+            roi_stereo.attach_depth(frame, right_frame, detections_list)
+            metrics.observe("stereo", time.perf_counter() - inferred)
+            metrics.gauge("stereo_pixels", roi_stereo.pixels)
+            inferred = time.perf_counter()
+
+        # Metadata goes out for every inferred frame; imagery follows at its
+        # own rate and carries the same frame id.
+        meta = {
             "frame": frame_count,
+            "timestamp": capture_ns,
+            "frame_size": [frame.shape[1], frame.shape[0]],
             "detections": detections_list,
-            "image": image_base64
         }
-        message_json = json.dumps(message)
-        
-        # Publish the JSON message via ZeroMQ.
-        publisher.send_string(message_json)
-        print("Processed frame: {}".format(frame_count), end="\r", flush=True)
-        
+        meta_json = json.dumps(meta)
+        meta_publisher.send_string(meta_json)
+        metrics.count("frames")
+        metrics.count("detections", len(detections_list))
+        metrics.gauge("meta_bytes", len(meta_json))
+
+        if feedback is not None:
+            try:
+                controller.feedback(json.loads(feedback.recv(zmq.NOBLOCK)))
+            except zmq.Again:
+                pass
+            if controller.update():
+                print("\nAdaptive quality:", controller.settings())
+        image_due = controller.due()
+
+        if image_due or save_to_file:
+            # Draw the bounding boxes and labels on the frame.
+            detector.annotate(frame, detections_list)
+        postprocessed = time.perf_counter()
+        metrics.observe("postprocess", postprocessed - inferred)
+
         # Optionally, if saving is enabled, write the frame to the output video.
         if save_to_file:
             writer.write(frame)
+
+        if image_due:
+            publish_image(frame, frame_count, capture_ns, postprocessed)
+        metrics.observe("frame", time.perf_counter() - start)
+        metrics.maybe_publish()
+        print("Processed frame: {} (age {:.1f} ms)".format(frame_count, frame_age * 1e3), end="\r", flush=True)
         
         # Optionally, insert a small delay if needed:
         # time.sleep(0.03)
 
     cap.release()
+    if right_cap is not None:
+        right_cap.release()
     if save_to_file:
         writer.release()
+    if frame_ring is not None:
+        frame_ring.close()
     print("\nProcessing complete.")
 
 if __name__ == "__main__":
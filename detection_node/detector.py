@@ -0,0 +1,80 @@
+import os
+
+import cv2
+import numpy as np
+
+# The MobileNet-SSD (Caffe) detector: loading the net on a backend, batched
+# forwards and drawing the results. model_manager.py wraps it alongside the
+# ONNX models.
+
+MODEL_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "model_zoo")
+PROTOTXT = os.path.join(MODEL_DIR, "MobileNetSSD_deploy.prototxt")
+CAFFEMODEL = os.path.join(MODEL_DIR, "MobileNetSSD_deploy.caffemodel")
+
+LABELS = ["background", "aeroplane", "bicycle", "bird", "boat",
+          "bottle", "bus", "car", "cat", "chair", "cow", "diningtable",
+          "dog", "horse", "motorbike", "person", "pottedplant",
+          "sheep", "sofa", "train", "tvmonitor"]
+
+# Network input: 300x300, (pixel - 127.5) * 0.007843
+INPUT_SIZE = (300, 300)
+SCALE = 0.007843
+MEAN = (127.5, 127.5, 127.5)
+
+BACKENDS = {
+    "cuda": (cv2.dnn.DNN_BACKEND_CUDA, cv2.dnn.DNN_TARGET_CUDA_FP16),
+    "cpu": (cv2.dnn.DNN_BACKEND_OPENCV, cv2.dnn.DNN_TARGET_CPU),
+}
+
+def load_net(backend="cuda", prototxt=PROTOTXT, model=CAFFEMODEL):
+    # None if the model files cannot be loaded.
+    net = cv2.dnn.readNetFromCaffe(prototxt, model)
+    if net.empty():
+        return None
+    dnn_backend, dnn_target = BACKENDS[backend]
+    net.setPreferableBackend(dnn_backend)
+    net.setPreferableTarget(dnn_target)
+    return net
+
+def label(class_id, labels=LABELS):
+    return labels[class_id] if 0 <= class_id < len(labels) else "Unknown"
+
+def detect(net, frames, confidence_threshold=0.2):
+    # One forward for a list of same-sized BGR frames; returns one list of
+    # detection dicts per frame.
+    blob = cv2.dnn.blobFromImages(frames, SCALE, INPUT_SIZE, MEAN, swapRB=False, crop=False)
+    net.setInput(blob)
+    return parse_ssd(net.forward(), frames, confidence_threshold)
+
+def parse_ssd(output, frames, confidence_threshold, labels=LABELS):
+    # SSD DetectionOutput rows are [image index, class, confidence, x1, y1,
+    # x2, y2 (normalized)].
+    rows = output.reshape(-1, 7)
+    rows = rows[(rows[:, 2] > confidence_threshold) & (rows[:, 0] >= 0)]
+    results = [[] for _ in frames]
+    for row in rows:
+        image = int(row[0])
+        height, width = frames[image].shape[:2]
+        class_id = int(row[1])
+        box = np.clip(row[3:7], 0.0, 1.0) * (width, height, width, height)
+        results[image].append({
+            "class_id": class_id,
+            "label": label(class_id, labels),
+            "confidence": float(row[2]),
+            "bbox": [int(v) for v in box],
+        })
+    return results
+
+def annotate(frame, detections):
+    # Boxes and "label: confidence [depth]" tags, drawn in place.
+    for detection in detections:
+        x1, y1, x2, y2 = detection["bbox"]
+        cv2.rectangle(frame, (x1, y1), (x2, y2), (0, 255, 0), 2)
+        text = "{}: {:.2f}".format(detection["label"], detection["confidence"])
+        if detection.get("depth_m") is not None:
+            text += " {:.1f}m".format(detection["depth_m"])
+        (text_width, text_height), baseline = cv2.getTextSize(text, cv2.FONT_HERSHEY_SIMPLEX, 0.5, 1)
+        y1 = max(y1, text_height)
+        cv2.rectangle(frame, (x1, y1 - text_height), (x1 + text_width, y1 + baseline), (255, 255, 255), cv2.FILLED)
+        cv2.putText(frame, text, (x1, y1), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 0, 0), 1)
+    return frame
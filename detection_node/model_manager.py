@@ -0,0 +1,192 @@
+import os
+
+import cv2
+import numpy as np
+
+import detector
+
+try:
+    import onnxruntime
+except ImportError:
+    onnxruntime = None
+
+# Loads a detection model by name or path and runs it through OpenCV DNN or
+# onnxruntime (CPU). Every model has the same interface:
+#
+#   model = load_model("onnx-int8")           # or "caffe", "onnx", a path
+#   detections = model.detect(frames, 0.2)    # one list of dicts per frame
+#
+# Detections look like detection_main.py's messages: class_id, label,
+# confidence, bbox [x1, y1, x2, y2] in pixels.
+#
+# ONNX layouts:
+#   ssd    float NCHW input normalized like the Caffe model, one SSD
+#          DetectionOutput [.., 7] output (a converted MobileNetSSD)
+#   tf_od  uint8 NHWC RGB input and TF Object Detection API outputs
+#          (detection_boxes/classes/scores/num_detections), COCO ids, e.g.
+#          ssd_mobilenet_v1_10.onnx from the ONNX model zoo
+#          (validated/vision/object_detection_segmentation/ssd-mobilenetv1)
+#
+# quantize_model.py makes the INT8 variant (<name>.int8.onnx) and
+# compare_models.py reports its latency and agreement with FP32. INT8 models
+# are QDQ graphs; onnxruntime runs them with integer kernels, OpenCV DNN
+# only supports some of them, so "auto" prefers onnxruntime for ONNX.
+
+MODEL_DIR = detector.MODEL_DIR
+
+# TF Object Detection API (COCO) class ids; "N/A" ids are unused.
+COCO_LABELS = [
+    "background", "person", "bicycle", "car", "motorcycle", "airplane", "bus", "train", "truck", "boat",
+    "traffic light", "fire hydrant", "N/A", "stop sign", "parking meter", "bench", "bird", "cat", "dog",
+    "horse", "sheep", "cow", "elephant", "bear", "zebra", "giraffe", "N/A", "backpack", "umbrella", "N/A",
+    "N/A", "handbag", "tie", "suitcase", "frisbee", "skis", "snowboard", "sports ball", "kite",
+    "baseball bat", "baseball glove", "skateboard", "surfboard", "tennis racket", "bottle", "N/A",
+    "wine glass", "cup", "fork", "knife", "spoon", "bowl", "banana", "apple", "sandwich", "orange",
+    "broccoli", "carrot", "hot dog", "pizza", "donut", "cake", "chair", "couch", "potted plant", "bed",
+    "N/A", "dining table", "N/A", "N/A", "toilet", "N/A", "tv", "laptop", "mouse", "remote", "keyboard",
+    "cell phone", "microwave", "oven", "toaster", "sink", "refrigerator", "N/A", "book", "clock", "vase",
+    "scissors", "teddy bear", "hair drier", "toothbrush",
+]
+
+# MobileNetSSD (VOC) label -> the COCO spelling of the same class. With it
+# every VOC class has a COCO counterpart.
+VOC_TO_COCO = {
+    "aeroplane": "airplane", "diningtable": "dining table", "motorbike": "motorcycle",
+    "pottedplant": "potted plant", "sofa": "couch", "tvmonitor": "tv",
+}
+
+MODELS = {
+    "caffe": {"format": "caffe", "prototxt": detector.PROTOTXT, "path": detector.CAFFEMODEL},
+    "onnx": {"format": "onnx", "path": os.path.join(MODEL_DIR, "ssd_mobilenet_v1_10.onnx"), "layout": "tf_od"},
+    "onnx-int8": {"format": "onnx", "path": os.path.join(MODEL_DIR, "ssd_mobilenet_v1_10.int8.onnx"),
+                  "layout": "tf_od"},
+}
+
+ENGINES = ("auto", "opencv", "onnxruntime")
+
+def int8_path(path):
+    return os.path.splitext(path)[0] + ".int8.onnx"
+
+class CaffeModel:
+    def __init__(self, name, prototxt, path, backend):
+        self.name = name
+        self.path = path
+        self.engine = "opencv"
+        self.labels = detector.LABELS
+        self.net = detector.load_net(backend, prototxt, path)
+        if self.net is None:
+            raise ValueError("Could not load the network from the Caffe model file: " + path)
+
+    def detect(self, frames, confidence_threshold=0.2):
+        return detector.detect(self.net, frames, confidence_threshold)
+
+class OnnxModel:
+    def __init__(self, name, path, layout, engine, backend, threads=0):
+        self.name = name
+        self.path = path
+        self.layout = layout
+        self.labels = COCO_LABELS if layout == "tf_od" else detector.LABELS
+        if engine == "auto":
+            engine = "onnxruntime" if onnxruntime is not None else "opencv"
+        self.engine = engine
+        if engine == "onnxruntime":
+            if onnxruntime is None:
+                raise ValueError("onnxruntime is not installed (pip install onnxruntime)")
+            options = onnxruntime.SessionOptions()
+            if threads:
+                options.intra_op_num_threads = threads
+            self.session = onnxruntime.InferenceSession(path, options, providers=["CPUExecutionProvider"])
+            self.input_name = self.session.get_inputs()[0].name
+            self.output_names = [output.name for output in self.session.get_outputs()]
+        else:
+            if layout != "ssd":
+                raise ValueError("The {} layout needs onnxruntime; OpenCV DNN only runs ssd-layout ONNX models"
+                                 .format(layout))
+            self.net = cv2.dnn.readNetFromONNX(path)
+            if self.net.empty():
+                raise ValueError("Could not load the network from the ONNX model file: " + path)
+            dnn_backend, dnn_target = detector.BACKENDS[backend]
+            self.net.setPreferableBackend(dnn_backend)
+            self.net.setPreferableTarget(dnn_target)
+            self.input_name = ""
+
+    def preprocess(self, frames):
+        # The network input for a list of same-sized BGR frames.
+        if self.layout == "tf_od":
+            # The graph resizes to 300x300 itself; doing it here first keeps
+            # the tensor (and its copy into the session) small.
+            return np.stack([cv2.cvtColor(cv2.resize(frame, detector.INPUT_SIZE), cv2.COLOR_BGR2RGB)
+                             for frame in frames])
+        return cv2.dnn.blobFromImages(frames, detector.SCALE, detector.INPUT_SIZE, detector.MEAN,
+                                      swapRB=False, crop=False)
+
+    def forward(self, batch):
+        if self.engine == "onnxruntime":
+            return self.session.run(None, {self.input_name: batch})
+        self.net.setInput(batch)
+        return [self.net.forward()]
+
+    def detect(self, frames, confidence_threshold=0.2):
+        outputs = self.forward(self.preprocess(frames))
+        if self.layout == "ssd":
+            return detector.parse_ssd(outputs[0], frames, confidence_threshold, self.labels)
+        return self.parse_tf_od(outputs, frames, confidence_threshold)
+
+    def parse_tf_od(self, outputs, frames, confidence_threshold):
+        named = dict(zip(self.output_names, outputs))
+        def output(key):
+            return next(value for name, value in named.items() if key in name)
+        boxes, classes = output("detection_boxes"), output("detection_classes")
+        scores, counts = output("detection_scores"), output("num_detections")
+        results = []
+        for image, frame in enumerate(frames):
+            height, width = frame.shape[:2]
+            count = int(counts[image])
+            keep = np.nonzero(scores[image, :count] > confidence_threshold)[0]
+            frame_results = []
+            for i in keep:
+                # [ymin, xmin, ymax, xmax], normalized
+                y1, x1, y2, x2 = np.clip(boxes[image, i], 0.0, 1.0) * (height, width, height, width)
+                class_id = int(classes[image, i])
+                frame_results.append({
+                    "class_id": class_id,
+                    "label": detector.label(class_id, self.labels),
+                    "confidence": float(scores[image, i]),
+                    "bbox": [int(x1), int(y1), int(x2), int(y2)],
+                })
+            results.append(frame_results)
+        return results
+
+def resolve(name_or_path):
+    # Registry entry for a model name or a file path (.onnx, .caffemodel).
+    if name_or_path in MODELS:
+        return name_or_path, dict(MODELS[name_or_path])
+    path = name_or_path
+    name = os.path.basename(path)
+    if path.endswith(".caffemodel"):
+        return name, {"format": "caffe", "prototxt": os.path.splitext(path)[0] + ".prototxt", "path": path}
+    if path.endswith(".onnx"):
+        return name, {"format": "onnx", "path": path, "layout": None}
+    raise ValueError("Unknown model {!r}: use one of {} or a .onnx/.caffemodel path".format(
+        name_or_path, ", ".join(MODELS)))
+
+def guess_layout(path):
+    # uint8 input -> TF Object Detection API export, else SSD-style.
+    if onnxruntime is None:
+        return "ssd"
+    session = onnxruntime.InferenceSession(path, providers=["CPUExecutionProvider"])
+    return "tf_od" if session.get_inputs()[0].type == "tensor(uint8)" else "ssd"
+
+def load_model(name_or_path, engine="auto", backend="cpu", threads=0):
+    # Raises ValueError if the model cannot be loaded. threads limits
+    # onnxruntime's intra-op threads (0 = its default, one per core).
+    name, entry = resolve(name_or_path)
+    if not os.path.exists(entry["path"]):
+        hint = " (make it with quantize_model.py)" if entry["path"].endswith(".int8.onnx") else ""
+        raise ValueError("Model file not found: " + entry["path"] + hint)
+    if entry["format"] == "caffe":
+        if engine == "onnxruntime":
+            raise ValueError("Caffe models only run through OpenCV DNN")
+        return CaffeModel(name, entry["prototxt"], entry["path"], backend)
+    layout = entry["layout"] or guess_layout(entry["path"])
+    return OnnxModel(name, entry["path"], layout, engine, backend, threads)
@@ -0,0 +1,314 @@
+#!/usr/bin/env python3
+# Offline detection over recorded videos. Each video is split into frame
+# ranges that a pool of worker processes handles in parallel, each worker
+# with its own net and batched forwards (blobFromImages, several frames per
+# forward). Detections go to a results file; annotated video is optional
+# and stitched back together in frame order.
+#
+#   python3 offline_batch.py recording.mp4 --output detections.jsonl
+#   python3 offline_batch.py recordings/ --output detections.npz --annotate annotated/
+#   python3 offline_batch.py recording.mp4 --workers 1,2,4 --limit 600   # scaling check
+#
+# Results:
+#   .jsonl  one line per frame, in order: {"video", "frame", "detections": [...]}
+#   .npz    columnar, one row per detection: video (index into "videos"),
+#           frame, class_id, confidence, bbox (N, 4)
+#
+# --model picks any model model_manager.py knows (the INT8 ONNX one is the
+# fastest on CPU). Each worker runs OpenCV and onnxruntime single-threaded,
+# so throughput scales with processes up to the number of cores (minus
+# decode overhead). With --backend cuda the workers share one GPU; one or
+# two workers is usually all it takes to keep it busy. Workers are spawned,
+# not forked, so no CUDA or onnxruntime state is inherited.
+import argparse
+import glob
+import json
+import multiprocessing
+import os
+import shutil
+import sys
+import time
+
+import cv2
+import numpy as np
+
+import detector
+import model_manager
+
+VIDEO_EXTENSIONS = (".mp4", ".avi", ".mkv", ".mov", ".webm", ".mjpeg")
+
+# Set in each worker by init_worker
+worker_model = None
+worker_options = None
+
+def find_videos(inputs):
+    videos = []
+    for path in inputs:
+        if os.path.isdir(path):
+            videos += sorted(p for p in glob.glob(os.path.join(path, "*")) if p.lower().endswith(VIDEO_EXTENSIONS))
+        else:
+            videos.append(path)
+    return videos
+
+def probe(path):
+    # (frame count, fps, width, height); the count is 0 if the container
+    # does not say.
+    cap = cv2.VideoCapture(path)
+    if not cap.isOpened():
+        return None
+    count = max(0, int(cap.get(cv2.CAP_PROP_FRAME_COUNT)))
+    fps = cap.get(cv2.CAP_PROP_FPS)
+    info = count, fps if fps > 0 else 30.0, int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)), int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+    cap.release()
+    return info
+
+def expected_frames(count, limit):
+    # Frames a video should yield: its probed count (0 if unknown), capped
+    # at the limit.
+    if not limit:
+        return count
+    return min(count, limit) if count else limit
+
+def make_tasks(videos, chunk, limit):
+    # (video index, path, start, end) frame ranges; end None = until EOF.
+    # The frame count is only an estimate in many containers, so the last
+    # range of a video runs to the real end of file (or to the limit).
+    tasks = []
+    for index, (path, (count, _, _, _)) in enumerate(videos):
+        count = expected_frames(count, limit)
+        starts = list(range(0, count, chunk)) or [0]
+        for start, next_start in zip(starts, starts[1:] + [limit or None]):
+            tasks.append((index, path, start, next_start))
+    return tasks
+
+def segment_path(segment_dir, index, start):
+    return os.path.join(segment_dir, "{:04d}_{:09d}.avi".format(index, start))
+
+def open_at(path, start):
+    # Seek to `start`. Some containers seek to the nearest keyframe only;
+    # then decode from the beginning and skip frames instead.
+    cap = cv2.VideoCapture(path)
+    if start == 0:
+        return cap
+    cap.set(cv2.CAP_PROP_POS_FRAMES, start)
+    if int(cap.get(cv2.CAP_PROP_POS_FRAMES)) == start:
+        return cap
+    cap.release()
+    cap = cv2.VideoCapture(path)
+    for _ in range(start):
+        if not cap.grab():
+            break
+    return cap
+
+def init_worker(model, engine, backend, options):
+    global worker_model, worker_options
+    # Parallelism comes from the processes; threads inside each would only
+    # compete for the same cores.
+    cv2.setNumThreads(1)
+    worker_model = model_manager.load_model(model, engine=engine, backend=backend, threads=1)
+    worker_options = options
+
+def process_range(task):
+    # Returns (task, per-frame detection lists, seconds spent).
+    index, path, start, end = task
+    batch_size, threshold, segment_dir, fps = worker_options
+    began = time.perf_counter()
+    cap = open_at(path, start)
+    writer = None
+    results = []
+    frame_number = start
+    done = False
+    while not done:
+        frames = []
+        while len(frames) < batch_size and (end is None or frame_number + len(frames) < end):
+            ret, frame = cap.read()
+            if not ret:
+                done = True
+                break
+            frames.append(frame)
+        if not frames:
+            break
+        if end is not None and frame_number + len(frames) >= end:
+            done = True
+        detections = worker_model.detect(frames, threshold)
+        results += detections
+        frame_number += len(frames)
+
+        if segment_dir is not None:
+            if writer is None:
+                height, width = frames[0].shape[:2]
+                writer = cv2.VideoWriter(segment_path(segment_dir, index, start), cv2.VideoWriter_fourcc(*"MJPG"),
+                                         fps[index], (width, height))
+            for frame, frame_detections in zip(frames, detections):
+                writer.write(detector.annotate(frame, frame_detections))
+    cap.release()
+    if writer is not None:
+        writer.release()
+    return task, results, time.perf_counter() - began
+
+class ResultWriter:
+    # Writes results in (video, frame) order as ranges complete out of order.
+    def __init__(self, path, videos, labels):
+        self.path = path
+        self.videos = videos
+        self.labels = labels
+        self.columnar = path.endswith(".npz")
+        self.file = None if self.columnar else open(path, "w")
+        self.columns = {"video": [], "frame": [], "class_id": [], "confidence": [], "bbox": []}
+        self.pending = {}
+        self.order = []
+        self.next = 0
+
+    def expect(self, tasks):
+        self.order = [(index, start) for index, _, start, _ in tasks]
+
+    def add(self, task, results):
+        index, _, start, _ = task
+        self.pending[(index, start)] = results
+        while self.next < len(self.order) and self.order[self.next] in self.pending:
+            index, start = self.order[self.next]
+            self.write(index, start, self.pending.pop((index, start)))
+            self.next += 1
+
+    def write(self, index, start, results):
+        for offset, detections in enumerate(results):
+            frame = start + offset
+            if self.file is not None:
+                self.file.write(json.dumps({"video": self.videos[index], "frame": frame, "detections": detections},
+                                           separators=(",", ":")) + "\n")
+                continue
+            for detection in detections:
+                self.columns["video"].append(index)
+                self.columns["frame"].append(frame)
+                self.columns["class_id"].append(detection["class_id"])
+                self.columns["confidence"].append(detection["confidence"])
+                self.columns["bbox"].append(detection["bbox"])
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            return
+        np.savez_compressed(self.path, videos=np.array(self.videos),
+                            video=np.array(self.columns["video"], dtype=np.int32),
+                            frame=np.array(self.columns["frame"], dtype=np.int64),
+                            class_id=np.array(self.columns["class_id"], dtype=np.int16),
+                            confidence=np.array(self.columns["confidence"], dtype=np.float32),
+                            bbox=np.array(self.columns["bbox"], dtype=np.int32).reshape(-1, 4),
+                            labels=np.array(self.labels))
+
+def stitch(videos, tasks, segment_dir, annotate_dir, info):
+    # Concatenate each video's segments in frame order.
+    for index, path in enumerate(videos):
+        _, fps, width, height = info[index]
+        name = os.path.splitext(os.path.basename(path))[0] + "_annotated.avi"
+        output = os.path.join(annotate_dir, name)
+        writer = None
+        for task_index, _, start, _ in tasks:
+            if task_index != index or not os.path.exists(segment_path(segment_dir, index, start)):
+                continue
+            segment = cv2.VideoCapture(segment_path(segment_dir, index, start))
+            while True:
+                ret, frame = segment.read()
+                if not ret:
+                    break
+                if writer is None:
+                    writer = cv2.VideoWriter(output, cv2.VideoWriter_fourcc(*"MJPG"), fps,
+                                             (frame.shape[1], frame.shape[0]))
+                writer.write(frame)
+            segment.release()
+        if writer is not None:
+            writer.release()
+            print("Annotated video:", output)
+
+def run(videos, info, workers, args, labels, segment_dir=None, results_path=None):
+    # Returns (frames, seconds, tasks).
+    tasks = make_tasks(list(zip(videos, info)), args.chunk, args.limit)
+    known = sum(expected_frames(count, args.limit) for count, _, _, _ in info)
+    results = ResultWriter(results_path, videos, labels) if results_path else None
+    if results is not None:
+        results.expect(tasks)
+
+    options = (args.batch, args.confidence, segment_dir, [fps for _, fps, _, _ in info])
+    frames = 0
+    busy = 0.0
+    start = time.monotonic()
+    context = multiprocessing.get_context("spawn")
+    with context.Pool(workers, initializer=init_worker,
+                      initargs=(args.model, args.engine, args.backend, options)) as pool:
+        for task, task_results, seconds in pool.imap_unordered(process_range, tasks):
+            frames += len(task_results)
+            busy += seconds
+            if results is not None:
+                results.add(task, task_results)
+            elapsed = time.monotonic() - start
+            rate = frames / elapsed if elapsed > 0 else 0.0
+            eta = " ETA {:.0f} s".format((known - frames) / rate) if known and rate > 0 and frames < known else ""
+            total = "/{}".format(known) if known else ""
+            print("{} workers: {}{} frames, {:.1f} fps, {:.0f} % busy{}    ".format(
+                workers, frames, total, rate, 100.0 * busy / (elapsed * workers) if elapsed > 0 else 0.0, eta),
+                end="\r", flush=True)
+    elapsed = time.monotonic() - start
+    print()
+    if results is not None:
+        results.close()
+    return frames, elapsed, tasks
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("inputs", nargs="+", help="Video files or directories of videos")
+    parser.add_argument("--output", default="detections.jsonl", help="Results file (.jsonl, or .npz for columnar)")
+    parser.add_argument("--annotate", default="", help="Directory for annotated videos (stitched in frame order)")
+    parser.add_argument("--workers", default=str(len(os.sched_getaffinity(0))),
+                        help="Worker processes (default: one per core); a comma separated list compares them")
+    parser.add_argument("--model", default="caffe", help="caffe, onnx, onnx-int8 or a model path (see model_manager.py)")
+    parser.add_argument("--engine", choices=model_manager.ENGINES, default="auto", help="ONNX inference engine")
+    parser.add_argument("--backend", choices=sorted(detector.BACKENDS), default="cpu", help="OpenCV DNN backend")
+    parser.add_argument("--batch", type=int, default=8, help="Frames per forward")
+    parser.add_argument("--chunk", type=int, default=256, help="Frames per task")
+    parser.add_argument("--confidence", type=float, default=0.2, help="Confidence threshold")
+    parser.add_argument("--limit", type=int, default=0, help="Only the first N frames of each video")
+    args = parser.parse_args()
+
+    videos = find_videos(args.inputs)
+    if not videos:
+        print("Error: No videos found in", args.inputs)
+        sys.exit(1)
+    info = []
+    for path in videos:
+        video_info = probe(path)
+        if video_info is None:
+            print("Error: Could not open video:", path)
+            sys.exit(1)
+        info.append(video_info)
+        print("{}: {} frames at {:.1f} fps, {}x{}".format(path, video_info[0] or "unknown", *video_info[1:]))
+    # Fail early on missing model files; the workers load their own copies
+    try:
+        labels = model_manager.load_model(args.model, engine=args.engine, backend="cpu", threads=1).labels
+    except ValueError as e:
+        print("Error:", e)
+        sys.exit(1)
+
+    worker_counts = [int(w) for w in args.workers.split(",")]
+    if len(worker_counts) > 1:
+        # Scaling check: no output files, just throughput per worker count
+        baseline = None
+        for workers in worker_counts:
+            frames, elapsed, _ = run(videos, info, workers, args, labels)
+            fps = frames / elapsed
+            baseline = baseline or fps / workers
+            print("{:>3} workers: {:.1f} fps ({:.2f}x of linear)".format(workers, fps, fps / (baseline * workers)))
+        return
+
+    segment_dir = None
+    if args.annotate:
+        segment_dir = os.path.join(args.annotate, ".segments")
+        os.makedirs(segment_dir, exist_ok=True)
+    frames, elapsed, tasks = run(videos, info, worker_counts[0], args, labels, segment_dir, args.output)
+    print("Processed {} frames from {} videos in {:.1f} s ({:.1f} fps), results in {}".format(
+        frames, len(videos), elapsed, frames / elapsed if elapsed > 0 else 0.0, args.output))
+    if segment_dir is not None:
+        stitch(videos, tasks, segment_dir, args.annotate, info)
+        shutil.rmtree(segment_dir)
+
+if __name__ == "__main__":
+    main()
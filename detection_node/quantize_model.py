@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+# Make an INT8 variant of an FP32 ONNX detection model with onnxruntime's
+# static quantization, calibrated on sample images (and optionally frames
+# from a recording). Weights become per-channel int8 and activations uint8
+# with ranges measured on the calibration set; the result is a QDQ model
+# that model_manager.py loads like the FP32 one.
+#
+#   python3 quantize_model.py                       # model_zoo/ssd_mobilenet_v1_10.onnx -> .int8.onnx
+#   python3 quantize_model.py --images images --video drive.mp4 --frames 200
+#   python3 compare_models.py                       # then check latency and agreement
+#
+# Only convolutions and matrix products are quantized by default: they are
+# where the time goes, while the box decoding and NMS at the end of SSD
+# graphs are cheap and sensitive to rounding.
+import argparse
+import glob
+import os
+import sys
+
+import cv2
+
+import model_manager
+
+try:
+    from onnxruntime.quantization import (CalibrationDataReader, CalibrationMethod, QuantFormat, QuantType,
+                                          quantize_static)
+except ImportError:
+    CalibrationDataReader = None
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp")
+
+def calibration_frames(image_dir, video, frame_count):
+    frames = []
+    for path in sorted(glob.glob(os.path.join(image_dir, "*"))):
+        if path.lower().endswith(IMAGE_EXTENSIONS):
+            image = cv2.imread(path)
+            if image is not None:
+                frames.append(image)
+    if video:
+        cap = cv2.VideoCapture(video)
+        total = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        step = max(1, total // frame_count) if total > 0 else 1
+        index = 0
+        sampled = 0
+        # Spread the samples over the whole recording
+        while sampled < frame_count and cap.grab():
+            if index % step == 0:
+                ret, frame = cap.retrieve()
+                if ret:
+                    frames.append(frame)
+                    sampled += 1
+            index += 1
+        cap.release()
+    # Mirrored copies double a small image set at no cost in realism
+    return frames + [cv2.flip(frame, 1) for frame in frames]
+
+def make_reader(model, frames):
+    class FrameReader(CalibrationDataReader):
+        def __init__(self):
+            self.feeds = iter({model.input_name: model.preprocess([frame])} for frame in frames)
+
+        def get_next(self):
+            return next(self.feeds, None)
+    return FrameReader()
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("model", nargs="?", default="onnx", help="FP32 ONNX model name or path")
+    parser.add_argument("--output", default="", help="INT8 model path (default: <model>.int8.onnx)")
+    parser.add_argument("--images", default=os.path.join(os.path.dirname(os.path.abspath(__file__)), "images"),
+                        help="Directory of calibration images")
+    parser.add_argument("--video", default="", help="Also calibrate on frames sampled from this video")
+    parser.add_argument("--frames", type=int, default=100, help="Frames to sample from --video")
+    parser.add_argument("--method", choices=["minmax", "entropy", "percentile"], default="minmax",
+                        help="Activation range estimation (entropy/percentile clip outliers, slower)")
+    parser.add_argument("--ops", default="Conv,MatMul", help="Operator types to quantize")
+    parser.add_argument("--per-tensor", action="store_true", help="One weight scale per tensor instead of per channel")
+    args = parser.parse_args()
+
+    if CalibrationDataReader is None:
+        print("Error: onnxruntime is not installed (pip install onnxruntime)")
+        sys.exit(1)
+    try:
+        model = model_manager.load_model(args.model, engine="onnxruntime")
+    except ValueError as e:
+        print("Error:", e)
+        sys.exit(1)
+    if model.path.endswith(".int8.onnx"):
+        print("Error: {} is already quantized".format(model.path))
+        sys.exit(1)
+    output = args.output or model_manager.int8_path(model.path)
+
+    frames = calibration_frames(args.images, args.video, args.frames)
+    if not frames:
+        print("Error: No calibration images in", args.images)
+        sys.exit(1)
+    print("Calibrating {} ({} layout) on {} frames".format(model.path, model.layout, len(frames)))
+
+    methods = {"minmax": CalibrationMethod.MinMax, "entropy": CalibrationMethod.Entropy,
+               "percentile": CalibrationMethod.Percentile}
+    quantize_static(model.path, output, make_reader(model, frames),
+                    quant_format=QuantFormat.QDQ,
+                    op_types_to_quantize=[op for op in args.ops.split(",") if op],
+                    per_channel=not args.per_tensor,
+                    activation_type=QuantType.QUInt8,
+                    weight_type=QuantType.QInt8,
+                    calibrate_method=methods[args.method])
+
+    size, quantized_size = os.path.getsize(model.path), os.path.getsize(output)
+    print("Wrote {} ({:.1f} MB, FP32 {:.1f} MB, {:.1f}x smaller)".format(
+        output, quantized_size / 1e6, size / 1e6, size / quantized_size))
+
+if __name__ == "__main__":
+    main()
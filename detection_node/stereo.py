@@ -0,0 +1,160 @@
+import json
+import os
+
+import cv2
+import numpy as np
+
+# Depth per detection from the left/right camera pair (left /dev/video1,
+# right /dev/video3, as in detection_left.py/detection_right.py).
+#
+# Disparity is computed only where it is needed: each detection box is
+# mapped into the rectified, downscaled left image, and StereoSGBM runs on
+# that strip of the pair (widened to the left by the disparity range, which
+# SGBM needs to search). Rectification and downscaling happen in one remap
+# of just those strips, straight from the full size frames, with maps
+# computed once at start. So the per-frame cost follows the box area,
+# not the frame size (see bench_stereo.py).
+#
+#   calibration = load_stereo_calibration("stereo_calibration.json")  # stereo_calibrate.py
+#   stereo = RoiStereo(calibration, scale=0.5)
+#   stereo.attach_depth(left, right, detections)   # adds "depth_m" per detection
+#
+# Calibration file (units of T are the depth units, metres):
+#   {"version": 1, "image_size": [w, h], "K1", "D1", "K2", "D2", "R", "T", "rms"}
+
+DEFAULT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "stereo_calibration.json")
+VERSION = 1
+
+class StereoCalibration:
+    def __init__(self, image_size, K1, D1, K2, D2, R, T, rms=None):
+        self.image_size = tuple(int(v) for v in image_size)
+        self.K1 = np.asarray(K1, dtype=np.float64).reshape(3, 3)
+        self.D1 = np.asarray(D1, dtype=np.float64).ravel()
+        self.K2 = np.asarray(K2, dtype=np.float64).reshape(3, 3)
+        self.D2 = np.asarray(D2, dtype=np.float64).ravel()
+        self.R = np.asarray(R, dtype=np.float64).reshape(3, 3)
+        self.T = np.asarray(T, dtype=np.float64).reshape(3, 1)
+        self.rms = rms
+
+    def to_dict(self):
+        return {
+            "version": VERSION,
+            "image_size": list(self.image_size),
+            "K1": self.K1.tolist(), "D1": self.D1.tolist(),
+            "K2": self.K2.tolist(), "D2": self.D2.tolist(),
+            "R": self.R.tolist(), "T": self.T.ravel().tolist(),
+            "rms": self.rms,
+        }
+
+def load_stereo_calibration(path=DEFAULT_PATH):
+    with open(path) as f:
+        data = json.load(f)
+    if data.get("version") != VERSION:
+        raise ValueError("Unsupported stereo calibration version in {}: {}".format(path, data.get("version")))
+    return StereoCalibration(data["image_size"], data["K1"], data["D1"], data["K2"], data["D2"],
+                             data["R"], data["T"], data.get("rms"))
+
+def save_stereo_calibration(calibration, path=DEFAULT_PATH):
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(calibration.to_dict(), f, indent=2)
+    os.replace(tmp, path)
+
+def ideal_calibration(image_size, focal, baseline):
+    # A distortion-free, perfectly aligned pair (benchmarks, synthetic tests).
+    width, height = image_size
+    K = [[focal, 0, (width - 1) / 2], [0, focal, (height - 1) / 2], [0, 0, 1]]
+    return StereoCalibration(image_size, K, np.zeros(5), K, np.zeros(5), np.eye(3), [-baseline, 0, 0])
+
+class RoiStereo:
+    def __init__(self, calibration, scale=0.5, num_disparities=64, block_size=5, margin=4, core=0.5):
+        # scale: resolution the disparity is computed at. num_disparities
+        # (multiple of 16) is in downscaled pixels and sets the nearest
+        # depth: focal * scale * baseline / num_disparities. core: share of
+        # each box (centered) whose depths count, to keep background out.
+        cal = calibration
+        R1, R2, P1, P2, _, _, _ = cv2.stereoRectify(cal.K1, cal.D1, cal.K2, cal.D2, cal.image_size, cal.R, cal.T,
+                                                     flags=cv2.CALIB_ZERO_DISPARITY, alpha=0)
+        scaling = np.diag([scale, scale, 1.0])
+        P1s, P2s = scaling @ P1, scaling @ P2
+        self.size = (int(round(cal.image_size[0] * scale)), int(round(cal.image_size[1] * scale)))
+        # Full size source -> rectified downscaled target in one remap
+        self.left_maps = cv2.initUndistortRectifyMap(cal.K1, cal.D1, R1, P1s[:, :3], self.size, cv2.CV_16SC2)
+        self.right_maps = cv2.initUndistortRectifyMap(cal.K2, cal.D2, R2, P2s[:, :3], self.size, cv2.CV_16SC2)
+        self.K1, self.D1, self.R1, self.P1s = cal.K1, cal.D1, R1, P1s
+        # depth = focal * baseline / disparity, both in downscaled pixels
+        self.focal = P1s[0, 0]
+        self.baseline = abs(P2[0, 3] / P2[0, 0])
+        self.num_disparities = num_disparities
+        self.margin = margin
+        self.core = core
+        self.matcher = cv2.StereoSGBM_create(minDisparity=0, numDisparities=num_disparities, blockSize=block_size,
+                                             P1=8 * block_size ** 2, P2=32 * block_size ** 2,
+                                             uniquenessRatio=10, speckleWindowSize=0,
+                                             mode=cv2.STEREO_SGBM_MODE_SGBM_3WAY)
+        # Rectified strips are written into these full size buffers, so no
+        # per-box allocation for the color and gray images.
+        width, height = self.size
+        self.color = [np.empty((height, width, 3), np.uint8), np.empty((height, width, 3), np.uint8)]
+        self.gray = [np.empty((height, width), np.uint8), np.empty((height, width), np.uint8)]
+        self.pixels = 0  # Rectified pixels matched in the last call
+
+    def rectified_box(self, bbox):
+        # Detection box (full size left image) -> (x0, y0, x1, y1) in the
+        # rectified downscaled image, with a margin, clipped.
+        x1, y1, x2, y2 = bbox
+        corners = np.array([[[x1, y1]], [[x2, y1]], [[x1, y2]], [[x2, y2]]], dtype=np.float64)
+        points = cv2.undistortPoints(corners, self.K1, self.D1, R=self.R1, P=self.P1s).reshape(-1, 2)
+        width, height = self.size
+        x0 = max(0, int(np.floor(points[:, 0].min())) - self.margin)
+        y0 = max(0, int(np.floor(points[:, 1].min())) - self.margin)
+        x1 = min(width, int(np.ceil(points[:, 0].max())) + self.margin)
+        y1 = min(height, int(np.ceil(points[:, 1].max())) + self.margin)
+        return x0, y0, x1, y1
+
+    def _rectify(self, side, frame, x0, y0, x1, y1):
+        maps = self.left_maps if side == 0 else self.right_maps
+        color = self.color[side][y0:y1, x0:x1]
+        cv2.remap(frame, maps[0][y0:y1, x0:x1], maps[1][y0:y1, x0:x1], cv2.INTER_LINEAR, dst=color)
+        gray = self.gray[side][y0:y1, x0:x1]
+        cv2.cvtColor(color, cv2.COLOR_BGR2GRAY, dst=gray)
+        return gray
+
+    def box_depth(self, left, right, bbox):
+        # (median depth or None, share of valid disparities) for one box.
+        x0, y0, x1, y1 = self.rectified_box(bbox)
+        if x1 - x0 < 2 or y1 - y0 < 2:
+            return None, 0.0
+        # SGBM searches d pixels to the left in the right image, so the
+        # strip starts num_disparities before the box
+        start = max(0, x0 - self.num_disparities)
+        left_strip = self._rectify(0, left, start, y0, x1, y1)
+        right_strip = self._rectify(1, right, start, y0, x1, y1)
+        self.pixels += (x1 - start) * (y1 - y0)
+        disparity = self.matcher.compute(left_strip, right_strip)
+
+        # Central part of the box, in strip coordinates
+        inset_x = int((x1 - x0) * (1 - self.core) / 2)
+        inset_y = int((y1 - y0) * (1 - self.core) / 2)
+        core = disparity[inset_y:(y1 - y0) - inset_y, (x0 - start) + inset_x:(x1 - start) - inset_x]
+        valid = core[core > 0]
+        if core.size == 0 or valid.size == 0:
+            return None, 0.0
+        # SGBM disparities are fixed point with 4 fractional bits
+        depth = self.focal * self.baseline * 16.0 / float(np.median(valid))
+        return depth, valid.size / core.size
+
+    def attach_depth(self, left, right, detections, min_valid=0.2):
+        # Adds "depth_m" (None when too few pixels matched) to each detection.
+        self.pixels = 0
+        for detection in detections:
+            depth, valid = self.box_depth(left, right, detection["bbox"])
+            detection["depth_m"] = round(float(depth), 3) if depth is not None and valid >= min_valid else None
+        return detections
+
+    def full_frame_disparity(self, left, right):
+        # Whole-frame disparity at the same scale, for comparison.
+        width, height = self.size
+        left_gray = self._rectify(0, left, 0, 0, width, height)
+        right_gray = self._rectify(1, right, 0, 0, width, height)
+        return self.matcher.compute(left_gray, right_gray)
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+# Calibrate the left/right camera pair from chessboard image pairs and write
+# the file stereo.py loads.
+#
+#   python3 stereo_calibrate.py pairs/left pairs/right --board 9x6 --square 0.025
+#
+# Pairs are matched by sorted file name; both cameras must see the whole
+# board. Each camera is calibrated on its own first, then the pair with
+# the intrinsics fixed. --square sets the depth units (metres).
+import argparse
+import glob
+import os
+import sys
+
+import cv2
+import numpy as np
+
+from stereo import DEFAULT_PATH, StereoCalibration, save_stereo_calibration
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp")
+SUBPIX_CRITERIA = (cv2.TERM_CRITERIA_EPS + cv2.TERM_CRITERIA_MAX_ITER, 30, 0.001)
+
+def images(directory):
+    return sorted(p for p in glob.glob(os.path.join(directory, "*")) if p.lower().endswith(IMAGE_EXTENSIONS))
+
+def find_corners(path, board):
+    image = cv2.imread(path, cv2.IMREAD_GRAYSCALE)
+    if image is None:
+        return None, None
+    found, corners = cv2.findChessboardCorners(image, board,
+                                               cv2.CALIB_CB_ADAPTIVE_THRESH + cv2.CALIB_CB_NORMALIZE_IMAGE)
+    if not found:
+        return image.shape[::-1], None
+    return image.shape[::-1], cv2.cornerSubPix(image, corners, (11, 11), (-1, -1), SUBPIX_CRITERIA)
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("left_dir")
+    parser.add_argument("right_dir")
+    parser.add_argument("--board", default="9x6", help="Inner corners per row x column")
+    parser.add_argument("--square", type=float, default=0.025, help="Square size in metres")
+    parser.add_argument("--output", default=DEFAULT_PATH)
+    args = parser.parse_args()
+
+    board = tuple(int(v) for v in args.board.split("x"))
+    template = np.zeros((board[0] * board[1], 3), np.float32)
+    template[:, :2] = np.mgrid[0:board[0], 0:board[1]].T.reshape(-1, 2) * args.square
+
+    left_paths, right_paths = images(args.left_dir), images(args.right_dir)
+    if not left_paths or len(left_paths) != len(right_paths):
+        print("Error: Need the same number of images in {} and {} (found {} and {})".format(
+            args.left_dir, args.right_dir, len(left_paths), len(right_paths)))
+        sys.exit(1)
+
+    object_points, left_points, right_points = [], [], []
+    size = None
+    for left_path, right_path in zip(left_paths, right_paths):
+        left_size, left_corners = find_corners(left_path, board)
+        right_size, right_corners = find_corners(right_path, board)
+        if left_corners is None or right_corners is None:
+            print("  {}: board not found in both images, skipped".format(os.path.basename(left_path)))
+            continue
+        if left_size != right_size or (size is not None and left_size != size):
+            print("Error: Image sizes differ ({})".format(os.path.basename(left_path)))
+            sys.exit(1)
+        size = left_size
+        object_points.append(template)
+        left_points.append(left_corners)
+        right_points.append(right_corners)
+    print("Board found in {} of {} pairs".format(len(object_points), len(left_paths)))
+    if len(object_points) < 8:
+        print("Error: At least 8 usable pairs are needed, at varied angles and distances")
+        sys.exit(1)
+
+    left_rms, K1, D1, _, _ = cv2.calibrateCamera(object_points, left_points, size, None, None)
+    right_rms, K2, D2, _, _ = cv2.calibrateCamera(object_points, right_points, size, None, None)
+    rms, K1, D1, K2, D2, R, T, _, _ = cv2.stereoCalibrate(object_points, left_points, right_points,
+                                                          K1, D1, K2, D2, size, flags=cv2.CALIB_FIX_INTRINSIC,
+                                                          criteria=SUBPIX_CRITERIA)
+    print("Reprojection error: left {:.3f} px, right {:.3f} px, stereo {:.3f} px".format(left_rms, right_rms, rms))
+    print("Baseline: {:.4f} m".format(float(np.linalg.norm(T))))
+
+    save_stereo_calibration(StereoCalibration(size, K1, D1, K2, D2, R, T, rms=round(rms, 4)), args.output)
+    print("Saved stereo calibration to", args.output)
+
+if __name__ == "__main__":
+    main()
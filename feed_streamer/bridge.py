@@ -5,28 +5,109 @@ import zmq
 import zmq.asyncio
 import asyncio
 import json
+import os
+import sys
+import time
+
+from detection_matcher import DetectionMatcher
+from stream_history import StreamHistory
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from common import shm_ring, transport
+from common.lidar_codec import DeltaDecoder
+from common.lidar_frame import decode_scan, scan_to_dict, scan_to_json
+from common.metrics import render_prometheus
 
 # Create ZeroMQ subscribers
-zmq_context = zmq.asyncio.Context()
+zmq_context = transport.make_context(use_asyncio=True)
 
 class ZMQSubscriber:
-    def __init__(self, address, name):
-        self.socket = zmq_context.socket(zmq.SUB)
-        self.socket.connect(address)
-        self.socket.setsockopt_string(zmq.SUBSCRIBE, "")
+    def __init__(self, stream, name, topic=b""):
+        # Endpoint, HWM and conflation come from common/transport.json
+        self.socket = transport.subscriber(zmq_context, stream, topic)
         self.name = name  # Added for debugging
 
 # WebSocket Clients
 clients = []
 
+# LiDAR resolution tier forwarded to the browser (lidar/full, lidar/1deg or lidar/5deg).
+LIDAR_TOPIC = b"lidar/1deg"
+
+# Keyframe/delta coded LiDAR stream (lidar.py --delta 1deg), forwarded as-is to
+# /ws/lidar clients, which decode it in the page. The bridge keeps a decoder so
+# a client joining between keyframes starts from the current state.
+LIDAR_DELTA_TOPIC = b"lidar/delta/1deg"
+lidar_clients = []
+lidar_decoder = DeltaDecoder()
+
+# Short per-stream history kept as raw bytes, bounded by age and byte budget.
+# Detection entries are the detection_meta messages (every inferred frame);
+# images are not stored.
+HISTORY_SECONDS = 30.0
+histories = {
+    "detection": StreamHistory("detection", HISTORY_SECONDS, max_bytes=512 * 1024),
+    "lidar": StreamHistory("lidar", HISTORY_SECONDS, max_bytes=4 * 1024 * 1024),
+    "imu": StreamHistory("imu", HISTORY_SECONDS, max_bytes=256 * 1024),
+}
+
+# Streams not stored as JSON are converted only when history is requested.
+history_renderers = {"lidar": scan_to_json}
+
+# Latest combined message, sent immediately to newly connected clients.
+latest_message = None
+
+# Feedback for the frame publishers' adaptive quality (common/adaptive_quality.py),
+# sent every FEEDBACK_INTERVAL seconds: lag of the newest detection frame
+# (capture to arrival here, so both hosts need synced clocks) and the share
+# of WebSocket sends dropped because a client had not taken the previous one.
+FEEDBACK_INTERVAL = 0.5
+
+# Latest metrics snapshot per node: {node: (received wall time, snapshot)}.
+# The bridge binds the metrics stream and every node connects to it.
+node_metrics = {}
+
 class MainHandler(tornado.web.RequestHandler):
     def get(self):
         self.write("ZeroMQ-WebSocket Bridge is running.")
 
+class HistoryHandler(tornado.web.RequestHandler):
+    # GET /history?seconds=10&streams=imu,lidar
+    # Returns {"imu": [[timestamp, message], ...], ...} for the last N seconds.
+    def get(self):
+        try:
+            seconds = float(self.get_argument("seconds", "10"))
+        except ValueError:
+            raise tornado.web.HTTPError(400, "seconds must be a number")
+        seconds = max(0.0, min(seconds, HISTORY_SECONDS))
+        names = self.get_argument("streams", ",".join(histories)).split(",")
+
+        now = time.time()
+        parts = []
+        for name in names:
+            history = histories.get(name.strip())
+            if history is None:
+                raise tornado.web.HTTPError(400, "unknown stream: " + name)
+            render = history_renderers.get(history.name)
+            parts.append(b'"' + history.name.encode() + b'":' + history.to_json(seconds, render=render, now=now))
+
+        self.set_header("Content-Type", "application/json")
+        self.write(b"{" + b",".join(parts) + b"}")
+
+class MetricsHandler(tornado.web.RequestHandler):
+    # GET /metrics: Prometheus text format for every node that reported.
+    def get(self):
+        self.set_header("Content-Type", "text/plain; version=0.0.4")
+        self.write(render_prometheus(node_metrics))
+
 class DetectionWebSocket(tornado.websocket.WebSocketHandler):
     def open(self):
         print("WebSocket client connected.")
+        # Future of the last write; a client still sending it skips new messages
+        self.pending = None
         clients.append(self)
+        # Late joiners get the current state right away.
+        if latest_message is not None:
+            self.write_message(latest_message)
 
     def on_close(self):
         print("WebSocket client disconnected.")
@@ -36,56 +117,149 @@ class DetectionWebSocket(tornado.websocket.WebSocketHandler):
     def check_origin(self, origin):
         return True
 
+    def ready(self):
+        return self.pending is None or self.pending.done()
+
+class LidarDeltaWebSocket(tornado.websocket.WebSocketHandler):
+    def open(self):
+        lidar_clients.append(self)
+        keyframe = lidar_decoder.keyframe()
+        if keyframe is not None:
+            self.write_message(keyframe, binary=True)
+
+    def on_close(self):
+        if self in lidar_clients:
+            lidar_clients.remove(self)
+
+    def check_origin(self, origin):
+        return True
+
 async def zmq_bridge_loop():
-    detection_subscriber = ZMQSubscriber("tcp://localhost:5555", "Detection")
-    lidar_subscriber = ZMQSubscriber("tcp://localhost:5556", "LiDAR")
-    imu_subscriber = ZMQSubscriber("tcp://localhost:5557", "IMU")
+    global latest_message
+
+    detection_subscriber = ZMQSubscriber("detection", "Detection")
+    # Detections of every frame; images on the detection stream come at their
+    # own rate and get the detections of their frame id attached.
+    meta_subscriber = ZMQSubscriber("detection_meta", "Detection metadata")
+    matcher = DetectionMatcher()
+    lidar_subscriber = ZMQSubscriber("lidar", "LiDAR", LIDAR_TOPIC)
+    lidar_subscriber.socket.setsockopt(zmq.SUBSCRIBE, LIDAR_DELTA_TOPIC)
+    imu_subscriber = ZMQSubscriber("imu", "IMU")
+    metrics_subscriber = ZMQSubscriber("metrics", "Metrics")
+    feedback_publisher = transport.publisher(zmq_context, "feedback")
+    next_feedback = time.monotonic() + FEEDBACK_INTERVAL
+    lag = None
+    lag_max = 0.0
+    sent = dropped = 0
 
     poller = zmq.asyncio.Poller()
     poller.register(detection_subscriber.socket, zmq.POLLIN)
+    poller.register(meta_subscriber.socket, zmq.POLLIN)
     poller.register(lidar_subscriber.socket, zmq.POLLIN)
     poller.register(imu_subscriber.socket, zmq.POLLIN)
+    poller.register(metrics_subscriber.socket, zmq.POLLIN)
 
     # Initialize empty data structures so each stream can start independently
     detection_data = {"detections": [], "image": None}
-    lidar_data = {"points": [], "scan_frequency": 0, "timestamp": 0}
+    lidar_data = {"angles": [], "ranges": [], "scan_frequency": 0, "timestamp": 0}
     imu_data = {"roll": 0, "pitch": 0, "yaw": 0}  # Default IMU values
 
     while True:
         try:
             # Poll for new messages (timeout prevents blocking)
             events = await poller.poll(timeout=100)  # 100ms timeout
+            # Metadata first, so an image arriving with its frame's metadata finds it
+            events.sort(key=lambda item: item[0] != meta_subscriber.socket)
 
             for socket, event in events:
                 if socket == detection_subscriber.socket and event == zmq.POLLIN:
                     detection_msg = await detection_subscriber.socket.recv()
                     detection_data = json.loads(detection_msg.decode('utf-8'))
+                    if "timestamp" in detection_data:
+                        lag = time.time() - detection_data["timestamp"] * 1e-9
+                        lag_max = max(lag_max, lag)
+                    if "detections" in detection_data:
+                        # A publisher without detection_meta (zmq_publisher.py)
+                        metadata = {k: v for k, v in detection_data.items() if k not in ("image", "shm")}
+                        histories["detection"].append(json.dumps(metadata, separators=(",", ":")).encode())
+                    matcher.attach(detection_data)
+                    # Frames sent through the shared memory ring are fetched here.
+                    shm_ring.resolve_image(detection_data)
                     #print("[Bridge] Received Detection Data")
 
+                if socket == meta_subscriber.socket and event == zmq.POLLIN:
+                    meta_msg = await meta_subscriber.socket.recv()
+                    histories["detection"].append(meta_msg)
+                    matcher.add_meta(json.loads(meta_msg))
+
                 if socket == lidar_subscriber.socket and event == zmq.POLLIN:
-                    lidar_msg = await lidar_subscriber.socket.recv()
-                    lidar_data = json.loads(lidar_msg.decode('utf-8'))
+                    topic, lidar_msg = await lidar_subscriber.socket.recv_multipart()
+                    if topic == LIDAR_DELTA_TOPIC:
+                        # Forward coded frames untouched; only track state for late joiners.
+                        if lidar_decoder.decode(lidar_msg) is not None:
+                            for client in list(lidar_clients):
+                                try:
+                                    client.write_message(lidar_msg, binary=True)
+                                except tornado.websocket.WebSocketClosedError:
+                                    # Closed mid-send; on_close may not have run yet
+                                    if client in lidar_clients:
+                                        lidar_clients.remove(client)
+                                except Exception as e:
+                                    print("[Bridge] Error sending LiDAR WebSocket message:", e)
+                        continue
+                    histories["lidar"].append(lidar_msg)
+                    # Binary scan frame -> compact angle/range lists for the browser
+                    lidar_data = scan_to_dict(decode_scan(lidar_msg))
                     #print("[Bridge] Received LiDAR Data")
 
                 if socket == imu_subscriber.socket and event == zmq.POLLIN:
                     imu_msg = await imu_subscriber.socket.recv()
+                    histories["imu"].append(imu_msg)
                     imu_data = json.loads(imu_msg.decode('utf-8'))
                     #print("[Bridge] Received IMU Data")
 
+                if socket == metrics_subscriber.socket and event == zmq.POLLIN:
+                    _, metrics_msg = await metrics_subscriber.socket.recv_multipart()
+                    snapshot = json.loads(metrics_msg)
+                    node_metrics[snapshot["node"]] = (time.time(), snapshot)
+
             # Always send the latest available data, even if one stream hasn't started
+            # "detection" is the newest image with its frame's detections,
+            # "detection_meta" the newest detections, which may be newer.
             combined_msg = {
                 "detection": detection_data,
+                "detection_meta": matcher.latest,
                 "lidar": lidar_data,
                 "imu": imu_data
             }
 
+            latest_message = json.dumps(combined_msg)
+
             # Send data to WebSocket clients
             for client in clients:
+                if not client.ready():
+                    dropped += 1
+                    continue
                 try:
-                    client.write_message(json.dumps(combined_msg))
+                    client.pending = client.write_message(latest_message)
+                    sent += 1
                 except Exception as e:
                     print("[Bridge] Error sending WebSocket message:", e)
 
+            now = time.monotonic()
+            if now >= next_feedback:
+                attempts = sent + dropped
+                await feedback_publisher.send_json({
+                    "time": time.time_ns(),
+                    "lag": None if lag is None else round(lag, 4),
+                    "lag_max": round(lag_max, 4),
+                    "drop_rate": round(dropped / attempts, 4) if attempts else None,
+                    "clients": len(clients),
+                })
+                next_feedback = now + FEEDBACK_INTERVAL
+                lag, lag_max = None, 0.0
+                sent = dropped = 0
+
         except Exception as e:
             print("[Bridge] Error in bridge loop:", e)
 
@@ -95,6 +269,9 @@ def make_app():
     return tornado.web.Application([
         (r"/", MainHandler),
         (r"/ws", DetectionWebSocket),
+        (r"/ws/lidar", LidarDeltaWebSocket),
+        (r"/history", HistoryHandler),
+        (r"/metrics", MetricsHandler),
     ])
 
 if __name__ == "__main__":
@@ -5,19 +5,27 @@ import zmq
 import zmq.asyncio
 import asyncio
 import json
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from common import shm_ring, transport
+from common.lidar_frame import decode_scan, scan_to_dict
+from detection_matcher import DetectionMatcher
 
 # Create ZeroMQ subscribers
-zmq_context = zmq.asyncio.Context()
+zmq_context = transport.make_context(use_asyncio=True)
 
 class ZMQSubscriber:
-    def __init__(self, address):
-        self.socket = zmq_context.socket(zmq.SUB)
-        self.socket.connect(address)
-        self.socket.setsockopt_string(zmq.SUBSCRIBE, "")
+    def __init__(self, stream, topic=b""):
+        self.socket = transport.subscriber(zmq_context, stream, topic)
 
 # WebSocket Clients
 clients = []
 
+# LiDAR resolution tier forwarded to the browser (lidar/full, lidar/1deg or lidar/5deg).
+LIDAR_TOPIC = b"lidar/1deg"
+
 class MainHandler(tornado.web.RequestHandler):
     def get(self):
         self.write("ZeroMQ-WebSocket Bridge is running.")
@@ -36,31 +44,41 @@ class DetectionWebSocket(tornado.websocket.WebSocketHandler):
         return True
 
 async def zmq_bridge_loop():
-    detection_subscriber = ZMQSubscriber("tcp://localhost:5555")  # Detection system
-    lidar_subscriber = ZMQSubscriber("tcp://localhost:5556")  # LiDAR system
+    detection_subscriber = ZMQSubscriber("detection")  # Detection system
+    lidar_subscriber = ZMQSubscriber("lidar", LIDAR_TOPIC)  # LiDAR system
+    meta_subscriber = ZMQSubscriber("detection_meta")  # Detections of every frame
+    matcher = DetectionMatcher()
 
     poller = zmq.asyncio.Poller()
     poller.register(detection_subscriber.socket, zmq.POLLIN)
     poller.register(lidar_subscriber.socket, zmq.POLLIN)
+    poller.register(meta_subscriber.socket, zmq.POLLIN)
 
     # Initialize empty data structures so either stream can start independently
     detection_data = {"detections": [], "image": None}
-    lidar_data = {"points": [], "scan_frequency": 0, "timestamp": 0}
+    lidar_data = {"angles": [], "ranges": [], "scan_frequency": 0, "timestamp": 0}
 
     while True:
         try:
             # Poll for new messages (timeout prevents blocking)
             events = await poller.poll(timeout=100)  # 100ms timeout
+            # Metadata first, so an image arriving with its frame's metadata finds it
+            events.sort(key=lambda item: item[0] != meta_subscriber.socket)
 
             for socket, event in events:
                 if socket == detection_subscriber.socket and event == zmq.POLLIN:
                     detection_msg = await detection_subscriber.socket.recv()
                     detection_data = json.loads(detection_msg.decode('utf-8'))  # Update detection data
+                    matcher.attach(detection_data)  # Detections of the image's frame
+                    shm_ring.resolve_image(detection_data)  # Fetch frames sent through shared memory
                     #print("Received Detection Data")
 
+                if socket == meta_subscriber.socket and event == zmq.POLLIN:
+                    matcher.add_meta(json.loads(await meta_subscriber.socket.recv()))
+
                 if socket == lidar_subscriber.socket and event == zmq.POLLIN:
-                    lidar_msg = await lidar_subscriber.socket.recv()
-                    lidar_data = json.loads(lidar_msg.decode('utf-8'))  # Update LiDAR data
+                    topic, lidar_msg = await lidar_subscriber.socket.recv_multipart()
+                    lidar_data = scan_to_dict(decode_scan(lidar_msg))  # Update LiDAR data from the binary scan frame
                     #print("Received LiDAR Data")
 
             # Always send the latest available data, even if one stream hasn't started
@@ -1,21 +1,35 @@
+import argparse
 import tornado.ioloop
 import tornado.web
 import tornado.websocket
 import zmq
 import zmq.asyncio
 import asyncio
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from common import shm_ring, transport
+from detection_matcher import DetectionMatcher
 
 # Create an asyncio-compatible ZeroMQ context.
-zmq_context = zmq.asyncio.Context()
+zmq_context = transport.make_context(use_asyncio=True)
 
 class ZMQSubscriber:
-    def __init__(self, context, address="tcp://localhost:5555"):
-        self.socket = context.socket(zmq.SUB)
-        self.socket.connect(address)
-        self.socket.setsockopt_string(zmq.SUBSCRIBE, "")
+    def __init__(self, context, stream="detection"):
+        self.socket = transport.subscriber(context, stream)
     
-    async def recv(self):
+    async def recv(self, matcher=None):
         msg = await self.socket.recv()
+        if matcher is not None or b'"shm"' in msg:
+            message = json.loads(msg)
+            if matcher is not None:
+                # Detections of the image's frame from detection_meta
+                matcher.attach(message)
+            # Frame sent through the shared memory ring; fill in the base64 image.
+            shm_ring.resolve_image(message)
+            return json.dumps(message)
         return msg.decode('utf-8')  # JSON string
 
 clients = []
@@ -37,17 +51,40 @@ class DetectionWebSocket(tornado.websocket.WebSocketHandler):
     def check_origin(self, origin):
         return True
 
+def forward(msg):
+    for client in clients:
+        try:
+            client.write_message(msg)
+        except Exception as e:
+            print("Error sending message:", e)
+
+async def metadata_loop():
+    # Detections of every inferred frame, no images: a few hundred bytes
+    # per message at the full inference rate.
+    subscriber = ZMQSubscriber(zmq_context, "detection_meta")
+    while True:
+        try:
+            forward((await subscriber.socket.recv()).decode('utf-8'))
+        except Exception as e:
+            print("Error receiving from ZeroMQ:", e)
+
 async def zmq_bridge_loop():
     subscriber = ZMQSubscriber(zmq_context)
+    meta_subscriber = ZMQSubscriber(zmq_context, "detection_meta")
+    matcher = DetectionMatcher()
+    poller = zmq.asyncio.Poller()
+    poller.register(subscriber.socket, zmq.POLLIN)
+    poller.register(meta_subscriber.socket, zmq.POLLIN)
     while True:
         try:
-            msg = await subscriber.recv()
-            #print("Received from ZeroMQ:", msg)
-            for client in clients:
-                try:
-                    client.write_message(msg)
-                except Exception as e:
-                    print("Error sending message:", e)
+            events = dict(await poller.poll())
+            # Metadata first: it was published before the image of its frame
+            if meta_subscriber.socket in events:
+                matcher.add_meta(json.loads(await meta_subscriber.socket.recv()))
+            if subscriber.socket in events:
+                msg = await subscriber.recv(matcher)
+                #print("Received from ZeroMQ:", msg)
+                forward(msg)
         except Exception as e:
             print("Error receiving from ZeroMQ:", e)
         await asyncio.sleep(0.001)
@@ -59,8 +96,13 @@ def make_app():
     ])
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--metadata-only", action="store_true",
+                        help="Forward only the detection metadata (detection_meta stream), no images")
+    args = parser.parse_args()
+
     app = make_app()
     app.listen(8080)
     print("WebSocket server started on port 8080.")
-    asyncio.ensure_future(zmq_bridge_loop())
+    asyncio.ensure_future(metadata_loop() if args.metadata_only else zmq_bridge_loop())
     tornado.ioloop.IOLoop.current().start()
@@ -0,0 +1,35 @@
+from collections import OrderedDict
+
+# Re-associates detection imagery (detection stream) with its metadata
+# (detection_meta stream) by frame id. The detection node publishes the
+# metadata of every frame before encoding the image, and images only for
+# some frames, so the metadata of the last `size` frames is kept until an
+# image asks for it.
+
+class DetectionMatcher:
+    def __init__(self, size=64):
+        self.size = size
+        self.meta = OrderedDict()
+        self.latest = None
+        self.matched = 0
+        self.unmatched = 0
+
+    def add_meta(self, message):
+        self.meta[message["frame"]] = message
+        self.latest = message
+        while len(self.meta) > self.size:
+            self.meta.popitem(last=False)
+
+    def attach(self, image_message):
+        # Adds "detections" for the image's frame ([] if its metadata was not
+        # seen). Images that carry their own detections (zmq_publisher.py,
+        # older detection nodes) are left as they are.
+        if "detections" in image_message:
+            return True
+        meta = self.meta.get(image_message.get("frame"))
+        image_message["detections"] = meta["detections"] if meta is not None else []
+        if meta is None:
+            self.unmatched += 1
+            return False
+        self.matched += 1
+        return True
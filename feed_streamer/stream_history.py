@@ -0,0 +1,78 @@
+import time
+from collections import deque
+
+# Rough per-entry bookkeeping cost (tuple + float + bytes object headers) so the
+# byte budget tracks real memory use and not just payload sizes.
+ENTRY_OVERHEAD = 120
+
+class StreamHistory:
+    # Bounded ring of the raw messages received on one stream.
+    # Entries are kept as (timestamp, bytes) and never re-parsed; the ring is
+    # trimmed both by age (max_seconds) and by total size (max_bytes).
+    def __init__(self, name, max_seconds=30.0, max_bytes=1024 * 1024):
+        self.name = name
+        self.max_seconds = max_seconds
+        self.max_bytes = max_bytes
+        self.entries = deque()
+        self.total_bytes = 0
+        self.dropped = 0  # Messages evicted early because of the byte budget
+
+    def append(self, payload, timestamp=None):
+        if timestamp is None:
+            timestamp = time.time()
+        size = len(payload) + ENTRY_OVERHEAD
+        if size > self.max_bytes:
+            # A single message larger than the whole budget is never stored.
+            self.dropped += 1
+            return
+        self.entries.append((timestamp, payload))
+        self.total_bytes += size
+        self._trim(timestamp)
+
+    def _trim(self, now):
+        oldest_allowed = now - self.max_seconds
+        while self.entries and (self.total_bytes > self.max_bytes or self.entries[0][0] < oldest_allowed):
+            t, payload = self.entries.popleft()
+            self.total_bytes -= len(payload) + ENTRY_OVERHEAD
+            if t >= oldest_allowed:
+                self.dropped += 1
+
+    def latest(self):
+        if not self.entries:
+            return None
+        return self.entries[-1]
+
+    def since(self, seconds, now=None):
+        # Walk backwards from the newest entry so short windows stay cheap.
+        if now is None:
+            now = time.time()
+        start = now - seconds
+        result = []
+        for entry in reversed(self.entries):
+            if entry[0] < start:
+                break
+            result.append(entry)
+        result.reverse()
+        return result
+
+    def to_json(self, seconds, render=None, now=None):
+        # Build a compact JSON array of [timestamp, message] pairs by splicing
+        # the stored bytes directly. `render` can convert a stored payload into
+        # JSON bytes for streams that are not stored as JSON.
+        parts = []
+        for t, payload in self.since(seconds, now):
+            if render is not None:
+                payload = render(payload)
+                if payload is None:
+                    continue
+            parts.append(b"[%.3f," % t + payload + b"]")
+        return b"[" + b",".join(parts) + b"]"
+
+    def stats(self):
+        return {
+            "messages": len(self.entries),
+            "bytes": self.total_bytes,
+            "max_bytes": self.max_bytes,
+            "max_seconds": self.max_seconds,
+            "dropped": self.dropped,
+        }
@@ -1,41 +1,89 @@
+import argparse
 import cv2
+import os
+import sys
 import zmq
 import base64
 import json
 import time
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from common import transport
+from common.adaptive_quality import AdaptiveQuality
+from common.capture import MODES as CAPTURE_MODES, open_capture
+from common.metrics import Metrics
+
 def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("source", nargs="?", default="camera",
+                        help="'camera' for /dev/video0 (default), 'test' for a GStreamer test source, or a video file")
+    parser.add_argument("--capture", choices=CAPTURE_MODES, default="queue",
+                        help="queue: every frame, in order; drop/latest: only the newest frame (see common/capture.py)")
+    parser.add_argument("--adaptive", action="store_true",
+                        help="Adapt JPEG quality, scale and frame rate to the encoder time and bridge feedback")
+    parser.add_argument("--quality", type=int, default=95, help="JPEG quality (starting quality with --adaptive)")
+    args = parser.parse_args()
+
     # Set up ZeroMQ context and publisher.
-    context = zmq.Context()
-    publisher = context.socket(zmq.PUB)
-    publisher.bind("tcp://*:5555")
-    print("ZeroMQ publisher bound to tcp://*:5555")
+    context = transport.make_context()
+    publisher = transport.publisher(context, "detection")
+    print("ZeroMQ publisher bound to", transport.endpoint("detection", bind=True))
+    metrics = Metrics("camera", context)
     
-    # Open the default camera (usually /dev/video0)
-    pipeline = ("v4l2src device=/dev/video0 ! image/jpeg,framerate=30/1,width=1280,height=960 ! "
-            "jpegparse ! jpegdec ! videoconvert ! appsink")
-
-    cap = cv2.VideoCapture(pipeline, cv2.CAP_GSTREAMER)
+    # Open the default camera (usually /dev/video0; MJPG is set in the pipeline caps)
+    cap = open_capture(args.source, args.capture)
 
     if not cap.isOpened():
         print("Camera not opened")
         exit(1)
-    cap.set(cv2.CAP_PROP_FOURCC, cv2.VideoWriter_fourcc('M', 'J', 'P', 'G'))
+    print("Using", cap.description)
+
+    controller = None
+    if args.adaptive:
+        controller = AdaptiveQuality(start_quality=args.quality)
+        feedback = transport.subscriber(context, "feedback")
 
     frame_count = 0
     while True:
-        ret, frame = cap.read()
+        metrics.maybe_publish()
+        with metrics.timer("capture"):
+            ret, frame = cap.read()
         if not ret:
             print("Error: Could not read frame.")
             break
         
         frame_count += 1
+        capture_ns = cap.frame_ns
+        metrics.observe("frame_age", cap.age())
+        metrics.set_count("skipped_frames", cap.skipped)
+
+        if controller is not None:
+            try:
+                controller.feedback(json.loads(feedback.recv(zmq.NOBLOCK)))
+            except zmq.Again:
+                pass
+            controller.update()
+            if not controller.due():
+                metrics.count("dropped")
+                continue
+            encoding = controller.settings()
+        else:
+            encoding = {"quality": args.quality, "scale": 1.0, "fps": 30.0}
         
         #Encode the frame as JPEG.
-        ret, buffer = cv2.imencode('.jpg', frame)
+        start = time.perf_counter()
+        if encoding["scale"] != 1.0:
+            frame = cv2.resize(frame, None, fx=encoding["scale"], fy=encoding["scale"], interpolation=cv2.INTER_AREA)
+        ret, buffer = cv2.imencode('.jpg', frame, [int(cv2.IMWRITE_JPEG_QUALITY), encoding["quality"]])
         if not ret:
             print("Error: Could not encode frame.")
             continue
+        encoded = time.perf_counter()
+        metrics.observe("encode", encoded - start)
+        metrics.gauge("jpeg_quality", encoding["quality"])
+        metrics.gauge("jpeg_scale", encoding["scale"])
+        if controller is not None:
+            controller.observe_encode(encoded - start)
         
         # Base64 encode the JPEG data.
         image_base64 = base64.b64encode(buffer).decode('utf-8')
@@ -43,14 +91,19 @@ def main():
         # Create a JSON object with frame number, an empty detections list, and the image.
         message = {
             "frame": frame_count,
+            "timestamp": capture_ns,
             "detections": [],
+            "encoding": encoding,
             "image": image_base64
         }
         message_json = json.dumps(message)
         
         # Publish the JSON message.
-        publisher.send_string(message_json)
-        print(f"Published frame {frame_count}")
+        with metrics.timer("publish"):
+            publisher.send_string(message_json)
+        metrics.count("frames")
+        metrics.gauge("message_bytes", len(message_json))
+        print(f"Published frame {frame_count} {encoding} age {cap.age() * 1e3:.1f} ms")
         
         # Delay to control the frame rate (adjust as needed).
         #time.sleep(0.03)  # ~30 fps if processing is fast enough
@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+# Time the LiDAR projection (once per scan) and the per-frame box fusion for
+# different box counts and LiDAR tiers.
+#
+#   python3 fusion_node/bench_fusion.py [--repeat 2000]
+import argparse
+import os
+import sys
+import time
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from fusion import DEFAULT_EXTRINSIC, fuse
+from projection import CameraProjector
+
+TIERS = (("full", 833, False), ("1deg", 360, True), ("5deg", 72, True))
+
+def make_scan(n, grid):
+    if grid:
+        angles = (-np.pi + (np.arange(n) + 0.5) * (2.0 * np.pi / n)).astype(np.float32)
+    else:
+        angles = np.sort(np.random.uniform(-np.pi, np.pi, n)).astype(np.float32)
+    ranges = np.random.uniform(0.5, 6.0, n).astype(np.float32)
+    ranges[np.random.rand(n) < 0.03] = 0.0
+    return angles, ranges
+
+def make_detections(count, width):
+    detections = []
+    for _ in range(count):
+        x1 = np.random.randint(0, width - 40)
+        x2 = min(width - 1, x1 + np.random.randint(20, 400))
+        detections.append({"class_id": 15, "label": "person", "confidence": 0.9, "bbox": [x1, 100, x2, 500]})
+    return detections
+
+def timed(fn, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat * 1e6
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--extrinsic", default=DEFAULT_EXTRINSIC)
+    parser.add_argument("--repeat", type=int, default=2000)
+    args = parser.parse_args()
+
+    projector = CameraProjector.from_file(args.extrinsic)
+    print("{:<6} {:>6} {:>12} {:>14} {:>14}".format("tier", "boxes", "project us", "median us", "min us"))
+    for tier, points, grid in TIERS:
+        angles, ranges = make_scan(points, grid)
+        project_us = timed(lambda: projector.project(angles, ranges, grid=grid), args.repeat)
+        projected = projector.project(angles, ranges, grid=grid)
+        for boxes in (1, 5, 10, 20, 50):
+            detections = make_detections(boxes, projector.image_width)
+            median_us = timed(lambda: fuse(detections, projected, "median", 1), args.repeat)
+            min_us = timed(lambda: fuse(detections, projected, "min", 1), args.repeat)
+            print("{:<6} {:>6} {:>12.1f} {:>14.1f} {:>14.1f}".format(tier, boxes, project_us, median_us, min_us))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+# Attach a LiDAR range to every camera detection.
+#
+# Subscribes to the detection metadata stream (detections of every frame,
+# no images) and one LiDAR tier, projects the newest scan into the image
+# with the camera extrinsic (extrinsic.json, see projection.py) and
+# publishes the detections with "distance_m" added on the fusion stream
+# (tcp://*:5558 by default). Consumers that need images read the detection
+# stream and match on "frame".
+#
+#   python3 fusion.py [--lidar-tier 1deg] [--stat median] [--extrinsic extrinsic.json]
+import argparse
+import json
+import os
+import sys
+import time
+import numpy as np
+import zmq
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from common import transport
+from common.lidar_frame import decode_scan, scan_arrays
+from common.metrics import Metrics
+from projection import CameraProjector, box_ranges
+
+DEFAULT_EXTRINSIC = os.path.join(os.path.dirname(os.path.abspath(__file__)), "extrinsic.json")
+
+def fuse(detections, projected, stat, min_points):
+    # Adds "distance_m" (None without enough LiDAR points) to each detection in place.
+    if not detections:
+        return
+    boxes = np.array([[min(d["bbox"][0], d["bbox"][2]), max(d["bbox"][0], d["bbox"][2])] for d in detections],
+                     dtype=np.float32)
+    if projected is None:
+        ranges = np.full(len(detections), np.nan)
+    else:
+        ranges, _ = box_ranges(projected[0], projected[1], boxes, stat, min_points)
+    for detection, distance in zip(detections, ranges.tolist()):
+        detection["distance_m"] = None if distance != distance else round(distance, 3)
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--extrinsic", default=DEFAULT_EXTRINSIC, help="Camera-to-LiDAR extrinsic JSON")
+    parser.add_argument("--lidar-tier", default="1deg", help="LiDAR topic lidar/<tier> to fuse (full, 1deg, 5deg)")
+    parser.add_argument("--stat", choices=["median", "min"], default="median",
+                        help="Range taken over the LiDAR points inside a box")
+    parser.add_argument("--min-points", type=int, default=1, help="LiDAR points a box needs for a distance")
+    parser.add_argument("--max-age", type=float, default=0.5,
+                        help="Ignore LiDAR scans older than this many seconds (0 = never)")
+    args = parser.parse_args()
+
+    projector = CameraProjector.from_file(args.extrinsic)
+    grid = args.lidar_tier != "full"
+
+    context = transport.make_context()
+    detection_socket = transport.subscriber(context, "detection_meta")
+    lidar_socket = transport.subscriber(context, "lidar", b"lidar/" + args.lidar_tier.encode())
+    publisher = transport.publisher(context, "fusion")
+    print("Fusing detections with lidar/{}, publishing on {}".format(
+        args.lidar_tier, transport.endpoint("fusion", bind=True)))
+    metrics = Metrics("fusion", context)
+
+    poller = zmq.Poller()
+    poller.register(detection_socket, zmq.POLLIN)
+    poller.register(lidar_socket, zmq.POLLIN)
+
+    projected = None  # (columns, distances) of the newest scan
+    lidar_timestamp = 0
+    fused = 0
+    fuse_time = 0.0
+
+    try:
+        while True:
+            events = dict(poller.poll(100))
+            if lidar_socket in events:
+                topic, frame = lidar_socket.recv_multipart()
+                with metrics.timer("project"):
+                    scan = decode_scan(frame)
+                    angles, ranges = scan_arrays(scan)
+                    # Projected once per scan; every detection frame until the next
+                    # scan only runs the per-box reduction.
+                    projected = projector.project(angles, ranges, grid=grid)
+                lidar_timestamp = scan.timestamp
+                metrics.count("scans")
+
+            if detection_socket in events:
+                message = json.loads(detection_socket.recv())
+                stale = args.max_age > 0 and (time.time_ns() - lidar_timestamp) > args.max_age * 1e9
+                detections = message.get("detections", [])
+                start = time.perf_counter()
+                fuse(detections, None if stale else projected, args.stat, args.min_points)
+                elapsed = time.perf_counter() - start
+                fuse_time += elapsed
+                fused += 1
+                metrics.observe("fuse", elapsed)
+                metrics.count("frames")
+                metrics.gauge("detections", len(detections))
+                if stale:
+                    metrics.count("stale_scan")
+                with metrics.timer("publish"):
+                    publisher.send_string(json.dumps({
+                        "frame": message.get("frame"),
+                        "timestamp": message.get("timestamp"),
+                        "detections": detections,
+                        "lidar_timestamp": None if stale else lidar_timestamp,
+                    }))
+                if fused % 100 == 0:
+                    print("Fused frames: {} ({:.1f} us per frame)".format(fused, fuse_time / fused * 1e6),
+                          end="\r", flush=True)
+            metrics.maybe_publish()
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
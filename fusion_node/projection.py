@@ -0,0 +1,112 @@
+import json
+import math
+import numpy as np
+
+# LiDAR -> camera projection for attaching a range to each detection box.
+#
+# Frames (both seen from above, 2D):
+#   LiDAR   x forward, y left, angle counter-clockwise from x (set
+#           "lidar_clockwise" if the scanner reports clockwise angles)
+#   camera  x along the optical axis, y left; image column u grows to the right
+#
+# The extrinsic places the camera in the LiDAR frame: "yaw_deg" is the optical
+# axis angle and "translation_m" the camera position [x, y]. A pinhole model
+# built from the horizontal FOV maps a camera-frame bearing b to a column:
+#
+#   u = cx - fx * tan(b),   fx = (image_width / 2) / tan(hfov / 2)
+#
+# For the fixed binned grids (lidar/1deg, lidar/5deg) the trig of every bin
+# angle is precomputed once; with no translation the column of each bin does
+# not depend on range at all, so it is a pure lookup table.
+
+class CameraProjector:
+    def __init__(self, image_width, hfov_deg, yaw_deg=0.0, translation_m=(0.0, 0.0), cx=None,
+                 lidar_clockwise=False):
+        self.image_width = image_width
+        self.fx = (image_width / 2.0) / math.tan(math.radians(hfov_deg) / 2.0)
+        self.cx = image_width / 2.0 if cx is None else cx
+        self.yaw = math.radians(yaw_deg)
+        self.tx, self.ty = translation_m
+        self.sign = -1.0 if lidar_clockwise else 1.0
+        self.grids = {}  # bins -> (cos, sin, columns or None)
+
+    @classmethod
+    def from_file(cls, path):
+        with open(path, "r") as f:
+            extrinsic = json.load(f)
+        return cls(extrinsic["image_width"], extrinsic["hfov_deg"], extrinsic.get("yaw_deg", 0.0),
+                   tuple(extrinsic.get("translation_m", (0.0, 0.0))), extrinsic.get("cx"),
+                   extrinsic.get("lidar_clockwise", False))
+
+    def _trig(self, angles):
+        # cos/sin of the LiDAR angles rotated into the camera heading.
+        camera_angles = self.sign * np.asarray(angles, dtype=np.float64) - self.yaw
+        return np.cos(camera_angles).astype(np.float32), np.sin(camera_angles).astype(np.float32)
+
+    def _columns(self, x, y):
+        # Column per camera-frame point; NaN behind the camera or outside the image.
+        with np.errstate(divide="ignore", invalid="ignore"):
+            u = (self.cx - self.fx * y / x).astype(np.float32)
+        return np.where((x > 0) & (u >= 0) & (u < self.image_width), u, np.nan).astype(np.float32)
+
+    def _grid(self, bins):
+        if bins not in self.grids:
+            angles = -np.pi + (np.arange(bins) + 0.5) * (2.0 * np.pi / bins)
+            cos, sin = self._trig(angles)
+            columns = self._columns(cos, sin) if self.tx == 0.0 and self.ty == 0.0 else None
+            self.grids[bins] = (cos, sin, columns)
+        return self.grids[bins]
+
+    def project(self, angles, ranges, grid=False):
+        # Returns (columns, distances) per LiDAR point: the image column (NaN if
+        # the point is not in view or has no return) and the planar distance from
+        # the camera in metres. `grid` marks a fixed binned tier so the
+        # precomputed tables can be used.
+        ranges = np.asarray(ranges, dtype=np.float32)
+        if grid:
+            cos, sin, columns = self._grid(len(ranges))
+        else:
+            cos, sin = self._trig(angles)
+            columns = None
+        if columns is not None:
+            # Camera at the LiDAR origin: distance is the LiDAR range.
+            return np.where(ranges > 0, columns, np.nan), ranges
+        # Rotating the offset into the camera frame once is cheaper than
+        # rotating every point: p_cam = R(-yaw) p_lidar - R(-yaw) t.
+        c, s = math.cos(self.yaw), math.sin(self.yaw)
+        ox = c * self.tx + s * self.ty
+        oy = -s * self.tx + c * self.ty
+        x = ranges * cos - np.float32(ox)
+        y = ranges * sin - np.float32(oy)
+        columns = self._columns(x, y)
+        return np.where(ranges > 0, columns, np.nan), np.hypot(x, y)
+
+def box_ranges(columns, distances, boxes, stat="median", min_points=1):
+    # Robust range per box from the LiDAR points whose column falls inside the
+    # box's horizontal extent. boxes: (B, 2) array of [x_min, x_max] columns.
+    # Returns (ranges, counts); ranges are NaN for boxes with < min_points.
+    boxes = np.asarray(boxes, dtype=np.float32).reshape(-1, 2)
+    # Only points in view can fall in a box; this usually removes most of the scan.
+    in_view = np.flatnonzero(~np.isnan(columns))
+    columns = columns[in_view]
+    distances = distances[in_view]
+
+    # B x N membership, then one masked reduction per row.
+    inside = (columns[None, :] >= boxes[:, :1]) & (columns[None, :] <= boxes[:, 1:])
+    counts = np.count_nonzero(inside, axis=1)
+    if stat == "min":
+        ranges = np.where(inside, distances[None, :], np.inf).min(axis=1, initial=np.inf)
+    elif stat == "median":
+        # NaNs sort last, so each row's median sits around (count - 1) / 2.
+        ordered = np.sort(np.where(inside, distances[None, :], np.nan), axis=1)
+        if ordered.shape[1] == 0:
+            ranges = np.full(len(boxes), np.nan, dtype=np.float32)
+        else:
+            rows = np.arange(len(boxes))
+            low = ordered[rows, np.maximum(counts - 1, 0) // 2]
+            high = ordered[rows, np.minimum(counts // 2, ordered.shape[1] - 1)]
+            ranges = 0.5 * (low + high)
+    else:
+        raise ValueError("Unknown range statistic: {}".format(stat))
+    ranges = np.where(counts >= max(min_points, 1), ranges, np.nan)
+    return ranges.astype(np.float32), counts
@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+# Polled burst reads (imu.py default) against FIFO draining (imu.py --fifo)
+# on the simulated bus: delivered samples per second, I2C transactions per
+# sample, timestamp jitter and FIFO overflows.
+#
+#   python3 imu_node/bench_fifo.py
+#   python3 imu_node/bench_fifo.py --clock 400000 --sample-rate 1000
+#
+# "jitter" is the standard deviation of the spacing between consecutive
+# sample timestamps. Polled samples are stamped when read, so host scheduling
+# shows up in it; FIFO samples are stamped from the sample rate.
+import argparse
+import time
+import numpy as np
+
+import fake_smbus
+from mpu6050 import FifoReader, MPU6050
+
+def polled(bus, imu, cycle, duration):
+    stamps = []
+    end = time.monotonic() + duration
+    while time.monotonic() < end:
+        imu.read()
+        stamps.append(time.time_ns())
+        time.sleep(cycle)
+    return np.array(stamps, dtype=np.int64), 0
+
+def fifo(bus, imu, cycle, duration):
+    reader = FifoReader(imu, fake_smbus.i2c_msg).start()
+    stamps = []
+    end = time.monotonic() + duration
+    while time.monotonic() < end:
+        drained = reader.drain()
+        if drained is not None:
+            first, raw = drained
+            stamps.append(first + np.arange(len(raw), dtype=np.int64) * reader.period_ns)
+        time.sleep(cycle)
+    return np.concatenate(stamps), reader.overflows
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--clock", type=int, default=100000, help="Simulated I2C clock in Hz")
+    parser.add_argument("--sample-rate", type=float, default=500.0, help="MPU6050 sample rate in Hz")
+    parser.add_argument("--rate", type=float, default=20.0, help="Publish (poll / drain) rate in Hz")
+    parser.add_argument("--duration", type=float, default=3.0, help="Seconds per measurement")
+    args = parser.parse_args()
+
+    print("{:<8} {:>10} {:>14} {:>12} {:>10}".format("mode", "samples/s", "transactions", "jitter us", "overflows"))
+    for label, run in (("polled", polled), ("fifo", fifo)):
+        bus = fake_smbus.SMBus(1, clock_hz=args.clock)
+        imu = MPU6050(bus, sample_rate=args.sample_rate).configure()
+        start = bus.transactions
+        stamps, overflows = run(bus, imu, 1.0 / args.rate, args.duration)
+        transactions = (bus.transactions - start) / max(1, len(stamps))
+        jitter = np.diff(stamps).std() / 1e3 if len(stamps) > 2 else 0.0
+        print("{:<8} {:>10.0f} {:>14.3f} {:>12.1f} {:>10}".format(
+            label, len(stamps) / args.duration, transactions, jitter, overflows))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+# Achievable MPU6050 sample rate with the old byte-wise reads (six read_word
+# calls = 12 read_byte_data transactions) against one 14 byte burst read.
+#
+#   python3 imu_node/bench_i2c.py                # simulated bus at 100 and 400 kHz
+#   python3 imu_node/bench_i2c.py --real         # /dev/i2c-1 with smbus2
+#
+# "skew" is the time between the first and the last register read of one
+# sample: how far apart accel x and gyro z were taken.
+import argparse
+import time
+
+import fake_smbus
+from mpu6050 import ADDRESS, MPU6050
+
+def read_word(bus, reg):
+    high = bus.read_byte_data(ADDRESS, reg)
+    low = bus.read_byte_data(ADDRESS, reg + 1)
+    val = (high << 8) + low
+    if val >= 0x8000:
+        val = -((65535 - val) + 1)
+    return val
+
+def bytewise_sample(bus, imu):
+    # The read pattern imu.py used before the burst read (temperature not read).
+    accel = [read_word(bus, reg) / 16384.0 for reg in (0x3B, 0x3D, 0x3F)]
+    gyro = [read_word(bus, reg) / 131.0 for reg in (0x43, 0x45, 0x47)]
+    return accel, gyro
+
+def burst_sample(bus, imu):
+    return imu.read()
+
+def measure(bus, imu, read, duration):
+    count = 0
+    start = time.perf_counter()
+    end = start + duration
+    while time.perf_counter() < end:
+        read(bus, imu)
+        count += 1
+    elapsed = time.perf_counter() - start
+    return count / elapsed, elapsed / count
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--real", action="store_true", help="Use the MPU6050 on /dev/i2c-1")
+    parser.add_argument("--duration", type=float, default=1.0, help="Seconds per measurement")
+    parser.add_argument("--call-overhead", type=float, default=60.0,
+                        help="Simulated per-transaction overhead in microseconds")
+    args = parser.parse_args()
+
+    if args.real:
+        import smbus2
+        buses = [("i2c-1", smbus2.SMBus(1))]
+    else:
+        buses = [("sim {} kHz".format(clock // 1000),
+                  fake_smbus.SMBus(1, clock_hz=clock, call_overhead=args.call_overhead * 1e-6))
+                 for clock in (100000, 400000)]
+
+    print("{:<14} {:<10} {:>10} {:>12} {:>10}".format("bus", "read", "samples/s", "us/sample", "skew us"))
+    for name, bus in buses:
+        imu = MPU6050(bus).configure()
+        for label, read in (("bytewise", bytewise_sample), ("burst", burst_sample)):
+            rate, per_sample = measure(bus, imu, read, args.duration)
+            # Byte-wise: the 12 data reads span the whole sample; a burst is one
+            # transaction the chip serves from a single latched sample.
+            skew = per_sample * 11 / 12 if label == "bytewise" else 0.0
+            print("{:<14} {:<10} {:>10.0f} {:>12.1f} {:>10.1f}".format(name, label, rate, per_sample * 1e6, skew * 1e6))
+
+if __name__ == "__main__":
+    main()
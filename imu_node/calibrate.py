@@ -1,79 +1,93 @@
-import smbus2
+import argparse
 import time
-import math
-import json
 
-IMU_ADDR = 0x68
+import numpy as np
 
-def read_word(bus, reg):
-    high = bus.read_byte_data(IMU_ADDR, reg)
-    low  = bus.read_byte_data(IMU_ADDR, reg + 1)
-    val  = (high << 8) + low
-    if val >= 0x8000:
-        val = -((65535 - val) + 1)
-    return val
+from calibration import (DEFAULT_PATH, FACES, collect, estimate_six_position, estimate_still, is_still,
+                         load_calibration, save_calibration)
+from mpu6050 import ADDRESS, MPU6050
 
-def get_imu_data(bus):
-    # Read raw accelerometer
-    accel_x = read_word(bus, 0x3B) / 16384.0
-    accel_y = read_word(bus, 0x3D) / 16384.0
-    accel_z = read_word(bus, 0x3F) / 16384.0
+# Calibrate the MPU6050 from raw FIFO samples and write the versioned
+# calibration file imu.py loads (see calibration.py).
+#
+#   python3 calibrate.py                  # still capture: gyro bias + mounting tilt
+#   python3 calibrate.py --six-position   # also accel offset/scale, guided
+#   python3 calibrate.py --fake           # simulated IMU with known errors
+#
+# A still capture keeps the accel offset/scale of an earlier six-position
+# calibration, so the guided procedure only needs doing once per sensor.
 
-    # Read raw gyro
-    gyro_x  = read_word(bus, 0x43) / 131.0
-    gyro_y  = read_word(bus, 0x45) / 131.0
-    gyro_z  = read_word(bus, 0x47) / 131.0
+IMU_ADDR = ADDRESS
 
-    # Simple computations
-    roll  = math.atan2(accel_y, accel_z) * 180.0 / math.pi
-    pitch = math.atan2(-accel_x, math.sqrt(accel_y**2 + accel_z**2)) * 180.0 / math.pi
-    yaw   = gyro_z  # Quick, not integrated or corrected for drift
+# Errors given to the simulated IMU with --fake, to compare against
+FAKE_GYRO_BIAS = (0.8, -0.5, 1.2)
+FAKE_ACCEL_OFFSET = (0.03, -0.02, 0.05)
+FAKE_ACCEL_GAIN = (1.02, 0.98, 1.01)
 
-    return roll, pitch, yaw
+def capture(imu, seconds, i2c_msg):
+    accel, gyro = collect(imu, seconds, i2c_msg)
+    if not is_still(accel, gyro):
+        print("The IMU moved during the capture. Keep it still and try again.")
+        exit(1)
+    return accel, gyro
 
 if __name__ == "__main__":
-    bus = smbus2.SMBus(1)
-    # Wake up the MPU6050
-    bus.write_byte_data(IMU_ADDR, 0x6B, 0)
-
-    print("Measuring IMU orientation for calibration... Please keep the IMU still/level.")
-
-    duration = 2.0  # seconds
-    end_time = time.time() + duration
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--fake", action="store_true", help="Use the simulated MPU6050 in fake_smbus.py")
+    parser.add_argument("--six-position", action="store_true",
+                        help="Guided six-position procedure for accelerometer offset and scale")
+    parser.add_argument("--seconds", type=float, default=0.5, help="Capture length per position")
+    parser.add_argument("--sample-rate", type=float, default=500.0, help="FIFO sample rate in Hz")
+    parser.add_argument("--output", default=DEFAULT_PATH, help="Calibration file to write")
+    args = parser.parse_args()
 
-    roll_sum, pitch_sum, yaw_sum = 0.0, 0.0, 0.0
-    count = 0
+    if args.fake:
+        import fake_smbus as smbus2
+    else:
+        import smbus2
 
-    # Collect samples for 'duration' seconds
-    while time.time() < end_time:
-        roll, pitch, yaw = get_imu_data(bus)
-        roll_sum  += roll
-        pitch_sum += pitch
-        yaw_sum   += yaw
-        count += 1
-        time.sleep(0.05)  # 20 Hz
+    bus = smbus2.SMBus(1)
+    if args.fake:
+        bus.gyro_bias = FAKE_GYRO_BIAS
+        bus.accel_offset = FAKE_ACCEL_OFFSET
+        bus.accel_gain = FAKE_ACCEL_GAIN
+    # Same filter settings as imu.py, at the FIFO rate
+    imu = MPU6050(bus, IMU_ADDR, sample_rate=args.sample_rate).configure()
+    i2c_msg = getattr(smbus2, "i2c_msg", None)
 
-    # Compute average
-    if count > 0:
-        roll_offset  = roll_sum / count
-        pitch_offset = pitch_sum / count
-        yaw_offset   = yaw_sum / count
+    start = time.monotonic()
+    if args.six_position:
+        faces = []
+        for label, axis, sign in FACES:
+            if args.fake:
+                gravity = [0.0, 0.0, 0.0]
+                gravity[axis] = sign
+                bus.gravity = tuple(gravity)
+            else:
+                input("Place the IMU {} and press Enter... ".format(label))
+            faces.append(capture(imu, args.seconds, i2c_msg))
+            print("  {}: {} samples".format(label, len(faces[-1][0])))
+        if args.fake:
+            bus.gravity = (0.0, 0.0, 1.0)
+        calibration = estimate_six_position(faces)
     else:
-        roll_offset, pitch_offset, yaw_offset = 0, 0, 0
-
-    print("Calibration complete!")
-    print(f"Roll Offset:  {roll_offset:.3f}")
-    print(f"Pitch Offset: {pitch_offset:.3f}")
-    print(f"Yaw Offset:   {yaw_offset:.3f}")
+        print("Measuring for {:.1f} s... Please keep the IMU still in its normal position.".format(args.seconds))
+        previous, _ = load_calibration(args.output)
+        accel, gyro = capture(imu, args.seconds, i2c_msg)
+        calibration = estimate_still(accel, gyro, previous.accel_offset, previous.accel_scale)
+    calibration.sample_rate = imu.sample_rate
+    elapsed = time.monotonic() - start
 
-    # Write offsets to JSON file
-    offsets = {
-        "roll_offset":  roll_offset,
-        "pitch_offset": pitch_offset,
-        "yaw_offset":   yaw_offset
-    }
-    
-    with open("imu_offsets.json", "w") as f:
-        json.dump(offsets, f, indent=2)
+    print("Calibration complete in {:.2f} s ({} samples at {:.0f} Hz)".format(
+        elapsed, calibration.samples, imu.sample_rate))
+    print("Gyro bias (deg/s):  {}".format(np.array2string(calibration.gyro_bias, precision=3)))
+    print("Accel offset (g):   {}".format(np.array2string(calibration.accel_offset, precision=4)))
+    print("Accel scale:        {}".format(np.array2string(calibration.accel_scale, precision=4)))
+    print(f"Roll Offset:  {calibration.roll_offset:.3f}")
+    print(f"Pitch Offset: {calibration.pitch_offset:.3f}")
+    if args.fake:
+        print("Simulated errors: gyro bias {}, accel offset {}, accel gain {}".format(
+            FAKE_GYRO_BIAS, FAKE_ACCEL_OFFSET, FAKE_ACCEL_GAIN))
 
-    print("\nSaved offsets to imu_offsets.json")
+    save_calibration(calibration, args.output)
+    print("\nSaved calibration to", args.output)
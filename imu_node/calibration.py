@@ -0,0 +1,226 @@
+import datetime
+import json
+import math
+import os
+import time
+import numpy as np
+
+from mpu6050 import FifoReader
+
+# IMU calibration: estimation from raw FIFO samples, the versioned
+# calibration file, and the stillness detector imu.py uses to keep the gyro
+# bias current while it runs.
+#
+# The model is  gyro = raw_gyro - gyro_bias  (deg/s) and
+# accel = (raw_accel - accel_offset) / accel_scale  (g), per axis.
+# roll_offset / pitch_offset (deg) are the mounting tilt measured when the
+# sensor sits in its normal position and are subtracted from the output.
+#
+# A still capture (a fraction of a second of FIFO samples) gives the gyro
+# bias and the mounting tilt. The six-position procedure puts each axis up
+# and down once: per axis, the mean of the +1 g and -1 g readings is the
+# offset and half their difference the scale.
+#
+# File format (version 2):
+#   {"version": 2, "created": iso time, "method": "still" | "six_position",
+#    "sample_rate": Hz, "samples": n, "gyro_bias": [3], "accel_offset": [3],
+#    "accel_scale": [3], "roll_offset": deg, "pitch_offset": deg}
+# Version 1 files (imu_offsets.json: roll/pitch/yaw offsets only, where
+# yaw_offset was the gyro z reading at rest) still load.
+
+VERSION = 2
+DEFAULT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "imu_calibration.json")
+LEGACY_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "imu_offsets.json")
+
+# Six-position faces: the axis pointing up and its sign
+FACES = (("+Z up (normal mounting)", 2, 1.0), ("-Z up (upside down)", 2, -1.0),
+         ("+X up", 0, 1.0), ("-X up", 0, -1.0), ("+Y up", 1, 1.0), ("-Y up", 1, -1.0))
+
+# A capture is "still" when every axis stays within these (sample std dev)
+STILL_GYRO_STD = 0.3     # deg/s
+STILL_ACCEL_STD = 0.01   # g
+
+class Calibration:
+    def __init__(self, gyro_bias=(0.0, 0.0, 0.0), accel_offset=(0.0, 0.0, 0.0), accel_scale=(1.0, 1.0, 1.0),
+                 roll_offset=0.0, pitch_offset=0.0, method="none", sample_rate=0.0, samples=0, created=None):
+        self.gyro_bias = np.array(gyro_bias, dtype=np.float64)
+        self.accel_offset = np.array(accel_offset, dtype=np.float64)
+        self.accel_scale = np.array(accel_scale, dtype=np.float64)
+        self.roll_offset = roll_offset
+        self.pitch_offset = pitch_offset
+        self.method = method
+        self.sample_rate = sample_rate
+        self.samples = samples
+        self.created = created
+
+    def correct_accel(self, accel):
+        return (np.asarray(accel, dtype=np.float64) - self.accel_offset) / self.accel_scale
+
+    def correct_gyro(self, gyro):
+        return np.asarray(gyro, dtype=np.float64) - self.gyro_bias
+
+    def to_dict(self):
+        return {
+            "version": VERSION,
+            "created": self.created or datetime.datetime.now().isoformat(timespec="seconds"),
+            "method": self.method,
+            "sample_rate": self.sample_rate,
+            "samples": self.samples,
+            "gyro_bias": [round(float(v), 5) for v in self.gyro_bias],
+            "accel_offset": [round(float(v), 5) for v in self.accel_offset],
+            "accel_scale": [round(float(v), 5) for v in self.accel_scale],
+            "roll_offset": round(self.roll_offset, 4),
+            "pitch_offset": round(self.pitch_offset, 4),
+        }
+
+def load_calibration(path=None):
+    # Returns (calibration, path it came from); defaults when nothing exists.
+    paths = [path] if path else [DEFAULT_PATH, LEGACY_PATH, "imu_offsets.json"]
+    for candidate in paths:
+        if not os.path.exists(candidate):
+            continue
+        with open(candidate, "r") as f:
+            data = json.load(f)
+        version = data.get("version", 1)
+        if version == 1:
+            return Calibration(gyro_bias=(0.0, 0.0, data.get("yaw_offset", 0.0)),
+                               roll_offset=data.get("roll_offset", 0.0), pitch_offset=data.get("pitch_offset", 0.0),
+                               method="legacy"), candidate
+        if version != VERSION:
+            raise ValueError("{}: unsupported calibration version {}".format(candidate, version))
+        return Calibration(data["gyro_bias"], data["accel_offset"], data["accel_scale"], data["roll_offset"],
+                           data["pitch_offset"], data.get("method", "still"), data.get("sample_rate", 0.0),
+                           data.get("samples", 0), data.get("created")), candidate
+    return Calibration(), None
+
+def save_calibration(calibration, path=DEFAULT_PATH):
+    # Write then rename, so a running node never reads half a file.
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(calibration.to_dict(), f, indent=2)
+    os.replace(tmp, path)
+
+def collect(imu, seconds, i2c_msg=None):
+    # Raw samples from the FIFO for `seconds`: accel (N, 3) g, gyro (N, 3) deg/s.
+    fifo = FifoReader(imu, i2c_msg).start()
+    wanted = int(seconds * imu.sample_rate)
+    blocks = []
+    count = 0
+    while count < wanted:
+        time.sleep(0.02)
+        drained = fifo.drain()
+        if drained is not None:
+            blocks.append(drained[1])
+            count += len(drained[1])
+    accel, gyro = fifo.scale(np.concatenate(blocks)[:wanted])
+    return accel.astype(np.float64), gyro.astype(np.float64)
+
+def is_still(accel, gyro):
+    return bool((gyro.std(axis=0) < STILL_GYRO_STD).all() and (accel.std(axis=0) < STILL_ACCEL_STD).all())
+
+def tilt(accel):
+    # Mounting roll and pitch (deg) from a mean gravity vector.
+    ax, ay, az = accel
+    return math.degrees(math.atan2(ay, az)), math.degrees(math.atan2(-ax, math.hypot(ay, az)))
+
+def estimate_still(accel, gyro, accel_offset=(0.0, 0.0, 0.0), accel_scale=(1.0, 1.0, 1.0)):
+    # Gyro bias and mounting tilt from one still capture. The accel
+    # offset/scale are not observable from a single pose; pass the ones from
+    # an earlier six-position calibration to keep them.
+    calibration = Calibration(gyro.mean(axis=0), accel_offset, accel_scale, method="still", samples=len(gyro))
+    calibration.roll_offset, calibration.pitch_offset = tilt(calibration.correct_accel(accel.mean(axis=0)))
+    return calibration
+
+def estimate_six_position(faces):
+    # faces: (accel, gyro) captures in FACES order. Returns a Calibration.
+    means = np.array([accel.mean(axis=0) for accel, _ in faces])  # (6, 3)
+    up = np.zeros(3)    # +1 g reading per axis
+    down = np.zeros(3)  # -1 g reading per axis
+    for (_, axis, sign), mean in zip(FACES, means):
+        if sign > 0:
+            up[axis] = mean[axis]
+        else:
+            down[axis] = mean[axis]
+    offset = (up + down) / 2.0
+    scale = (up - down) / 2.0
+    gyro = np.concatenate([g for _, g in faces])
+    calibration = Calibration(gyro.mean(axis=0), offset, scale, method="six_position", samples=len(gyro))
+    calibration.roll_offset, calibration.pitch_offset = tilt(calibration.correct_accel(means[0]))
+    return calibration
+
+class StillnessDetector:
+    # Sliding window over the latest raw samples. When the whole window is
+    # still (low noise, |a| = 1 g, and a gyro mean close to the current bias
+    # so slow steady turns are not mistaken for bias) the window mean is a
+    # fresh gyro bias measurement. Fed with (N, 3) blocks so a FIFO drain is
+    # one call.
+    #
+    # A still mean further than max_bias_change from the bias (a stale
+    # calibration, or a bias that drifted as the IMU warmed up) is only
+    # taken once confirm_windows back-to-back still windows agree on it
+    # within `agreement`; check() then returns it with `jumped` set. Any
+    # motion in between starts the count over, so a turn would have to stay
+    # perfectly steady for that long to pass as bias.
+    def __init__(self, window, gyro_std=STILL_GYRO_STD, accel_std=STILL_ACCEL_STD,
+                 max_bias_change=1.0, accel_norm=0.05, confirm_windows=6, agreement=0.1, max_bias=20.0):
+        self.gyro = np.zeros((window, 3))
+        self.accel = np.zeros((window, 3))
+        self.gyro_std = gyro_std
+        self.accel_std = accel_std
+        self.max_bias_change = max_bias_change  # deg/s
+        self.accel_norm = accel_norm            # g
+        self.confirm_windows = confirm_windows
+        self.agreement = agreement              # deg/s
+        self.max_bias = max_bias                # deg/s, the MPU6050's rated zero-rate offset
+        self.candidate = None                   # mean of the agreeing far windows so far
+        self.agreeing = 0
+        self.jumped = False
+        self.clear()
+
+    def clear(self):
+        self.filled = 0
+        self.pos = 0
+
+    def push(self, gyro, accel):
+        gyro = np.atleast_2d(gyro)[-len(self.gyro):]
+        accel = np.atleast_2d(accel)[-len(self.gyro):]
+        n, size = len(gyro), len(self.gyro)
+        index = (self.pos + np.arange(n)) % size
+        self.gyro[index] = gyro
+        self.accel[index] = accel
+        self.pos = (self.pos + n) % size
+        self.filled = min(size, self.filled + n)
+
+    def check(self, bias):
+        # Mean gyro of a full still window (deg/s), or None.
+        self.jumped = False
+        if self.filled < len(self.gyro):
+            return None
+        mean = self.gyro.mean(axis=0)
+        norms = np.linalg.norm(self.accel, axis=1)
+        if not ((self.gyro.std(axis=0) < self.gyro_std).all() and (self.accel.std(axis=0) < self.accel_std).all()
+                and np.abs(norms - 1.0).max() < self.accel_norm):
+            self.candidate = None
+            self.agreeing = 0
+            return None
+        if np.abs(mean - bias).max() < self.max_bias_change:
+            self.candidate = None
+            self.agreeing = 0
+            return mean
+        # Far from the bias: count it towards a jump, on a fresh window.
+        self.clear()
+        if np.abs(mean).max() > self.max_bias:
+            return None
+        if self.candidate is None or np.abs(mean - self.candidate).max() > self.agreement:
+            self.candidate = mean
+            self.agreeing = 1
+        else:
+            self.agreeing += 1
+            self.candidate = self.candidate + (mean - self.candidate) / self.agreeing
+        if self.agreeing < self.confirm_windows:
+            return None
+        measured = self.candidate
+        self.candidate = None
+        self.agreeing = 0
+        self.jumped = True
+        return measured
@@ -0,0 +1,222 @@
+# Stand-in for smbus2 with a simulated MPU6050 at 0x68, so the IMU node can
+# run without the hardware:  python3 imu.py --fake
+#
+# The register file behaves like the chip: the data registers 0x3B..0x48 are
+# refreshed at the configured sample rate (1 kHz / (1 + SMPLRT_DIV) with the
+# DLPF on, 8 kHz gyro rate without), so byte-wise reads spread over time can
+# mix two samples while a block read gets one. Each transaction also takes
+# the time it would on the wire at `clock_hz` plus a fixed per-call overhead
+# (the ioctl round trip), which makes transaction counts show up in timings.
+#
+# The 1 KB FIFO is emulated too: with USER_CTRL.FIFO_EN set, every sample
+# appends the registers selected in FIFO_EN (0x23) in register order. A full
+# FIFO drops its oldest frame and sets FIFO_OFLOW in INT_STATUS (cleared on
+# read); FIFO_COUNTH/L report the fill level and FIFO_R_W pops bytes. i2c_msg
+# and i2c_rdwr cover the long FIFO reads smbus2 does as one transaction.
+import struct
+import time
+import numpy as np
+
+ADDRESS = 0x68
+FIFO_SIZE = 1024
+
+# FIFO_EN bit -> bytes of the 0x3B..0x48 block it queues, in FIFO order
+FIFO_SOURCES = ((0x08, slice(0, 6)),     # ACCEL
+                (0x80, slice(6, 8)),     # TEMP
+                (0x40, slice(8, 10)),    # XG
+                (0x20, slice(10, 12)),   # YG
+                (0x10, slice(12, 14)))   # ZG
+
+class i2c_msg:
+    def __init__(self, addr, flags, buf):
+        self.addr = addr
+        self.flags = flags
+        self.buf = bytearray(buf)
+        self.len = len(self.buf)
+
+    @staticmethod
+    def write(address, buf):
+        return i2c_msg(address, 0, buf)
+
+    @staticmethod
+    def read(address, length):
+        return i2c_msg(address, 1, bytes(length))
+
+    def __iter__(self):
+        return iter(self.buf)
+
+    def __len__(self):
+        return self.len
+
+class SMBus:
+    def __init__(self, bus=1, clock_hz=100000, call_overhead=60e-6, yaw_rate=0.0, noise=True):
+        self.bus = bus
+        self.clock_hz = clock_hz
+        self.call_overhead = call_overhead
+        self.yaw_rate = yaw_rate  # deg/s around z
+        self.noise = noise
+        # Sensor errors and pose, for exercising calibrate.py
+        self.gravity = (0.0, 0.0, 1.0)      # Gravity in the sensor frame (g); (0, 0, 1) is level
+        self.gyro_bias = (0.0, 0.0, 0.0)    # deg/s
+        self.accel_offset = (0.0, 0.0, 0.0) # g
+        self.accel_gain = (1.0, 1.0, 1.0)
+        self.registers = bytearray(128)
+        self.registers[0x75] = ADDRESS  # WHO_AM_I
+        self.registers[0x6B] = 0x40     # Sleep bit set after power-up
+        self.start = time.monotonic()
+        self.sample_index = None
+        self.fifo = bytearray()
+        self.fifo_index = None
+        self.transactions = 0
+
+    # --- timing ---------------------------------------------------------
+
+    def _transfer(self, bits):
+        # Busy-wait: sleep() is far too coarse for tens of microseconds.
+        self.transactions += 1
+        end = time.perf_counter() + self.call_overhead + bits / self.clock_hz
+        while time.perf_counter() < end:
+            pass
+
+    # --- simulated sensor -------------------------------------------------
+
+    def sample_rate(self):
+        dlpf = self.registers[0x1A] & 0x07
+        gyro_rate = 1000.0 if 0 < dlpf < 7 else 8000.0
+        return gyro_rate / (1 + self.registers[0x19])
+
+    def _refresh(self):
+        if self.registers[0x6B] & 0x40:
+            return  # Asleep: data registers stay frozen
+        index = int((time.monotonic() - self.start) * self.sample_rate())
+        if index == self.sample_index:
+            return
+        self._fill_fifo(index)
+        self.sample_index = index
+        self.registers[0x3B:0x49] = self.sample_block(index)
+
+    def _fill_fifo(self, index):
+        if not self.registers[0x6A] & 0x40 or not self.registers[0x23]:
+            self.fifo_index = None
+            return
+        if self.fifo_index is None:
+            self.fifo_index = index
+            return
+        frame = sum(source.stop - source.start for bit, source in FIFO_SOURCES if self.registers[0x23] & bit)
+        # Only the samples that can still be in the FIFO need generating.
+        first = max(self.fifo_index + 1, index - FIFO_SIZE // frame)
+        for i in range(first, index + 1):
+            block = self.sample_block(i)
+            for bit, source in FIFO_SOURCES:
+                if self.registers[0x23] & bit:
+                    self.fifo += block[source]
+        if len(self.fifo) > FIFO_SIZE:
+            # Full: the oldest frames are overwritten
+            self.registers[0x3A] |= 0x10  # FIFO_OFLOW_INT
+            excess = len(self.fifo) - FIFO_SIZE
+            del self.fifo[:(excess + frame - 1) // frame * frame]
+        self.fifo_index = index
+
+    def _register(self, register):
+        if register == 0x72:
+            return len(self.fifo) >> 8
+        if register == 0x73:
+            return len(self.fifo) & 0xFF
+        if register == 0x74:
+            if not self.fifo:
+                return 0xFF
+            value = self.fifo[0]
+            del self.fifo[0]
+            return value
+        value = self.registers[register]
+        if register == 0x3A:
+            self.registers[0x3A] = 0  # Interrupt status clears on read
+        return value
+
+    def _read_registers(self, register, length):
+        if register == 0x74:
+            # FIFO_R_W does not auto-increment: every byte comes from the FIFO
+            data = list(self.fifo[:length]) + [0xFF] * max(0, length - len(self.fifo))
+            del self.fifo[:length]
+            return data
+        if register <= 0x73 < register + length:
+            # FIFO_COUNTH/L read as one latched pair
+            self.registers[0x72:0x74] = len(self.fifo).to_bytes(2, "big")
+            return list(self.registers[register:register + length])
+        return [self._register(register + i) for i in range(length)]
+
+    def sample_block(self, index):
+        # Raw 14 byte block for sample `index`: at rest in the `gravity` pose
+        # except for a constant rotation about z, with sensor errors and noise.
+        accel_lsb = 16384.0 / (1 << ((self.registers[0x1C] >> 3) & 0x03))
+        gyro_lsb = 131.0 / (1 << ((self.registers[0x1B] >> 3) & 0x03))
+        rng = np.random.default_rng(index) if self.noise else None
+        accel = np.array(self.gravity) * self.accel_gain + self.accel_offset
+        gyro = np.array([0.0, 0.0, self.yaw_rate]) + self.gyro_bias
+        if rng is not None:
+            accel = accel + rng.normal(0.0, 0.004, 3)
+            gyro = gyro + rng.normal(0.0, 0.05, 3)
+        temperature = (25.0 - 36.53) * 340.0
+        values = np.concatenate((accel * accel_lsb, [temperature], gyro * gyro_lsb))
+        return struct.pack(">7h", *np.clip(np.rint(values), -32768, 32767).astype(int))
+
+    # --- smbus2 API -------------------------------------------------------
+
+    def write_byte_data(self, i2c_addr, register, value, force=None):
+        self._check(i2c_addr)
+        self._transfer(29)  # start, address, register, data, stop
+        if register == 0x6B and value & 0x80:
+            # DEVICE_RESET
+            self.registers = bytearray(128)
+            self.registers[0x75] = ADDRESS
+            self.registers[0x6B] = 0x40
+            return
+        if register == 0x6A and value & 0x04:
+            # FIFO_RESET: self-clearing
+            self.fifo = bytearray()
+            self.fifo_index = None
+            value &= ~0x04
+        self.registers[register] = value & 0xFF
+        if register in (0x6A, 0x23):
+            # The FIFO starts (or stops) collecting from the current sample
+            self._refresh()
+            self._fill_fifo(self.sample_index or 0)
+
+    def read_byte_data(self, i2c_addr, register, force=None):
+        self._check(i2c_addr)
+        self._refresh()
+        value = self._register(register)
+        self._transfer(39)  # start, address, register, restart, address, data, stop
+        return value
+
+    def read_i2c_block_data(self, i2c_addr, register, length, force=None):
+        self._check(i2c_addr)
+        if length > 32:
+            raise OSError(22, "Invalid argument")  # SMBus block reads are at most 32 bytes
+        self._refresh()
+        data = self._read_registers(register, length)
+        self._transfer(30 + 9 * length)
+        return data
+
+    def i2c_rdwr(self, *messages):
+        register = None
+        for message in messages:
+            self._check(message.addr)
+            if message.flags & 1:
+                # Data is latched (or popped from the FIFO) as the transfer starts
+                self._refresh()
+                message.buf[:] = bytes(self._read_registers(register, message.len))
+                self._transfer(20 + 9 * message.len)
+            else:
+                self._transfer(20 + 9 * message.len)
+                register = message.buf[0]
+                if message.len > 1:
+                    for offset, value in enumerate(message.buf[1:]):
+                        self.registers[register + offset] = value
+
+    def close(self):
+        pass
+
+    def _check(self, i2c_addr):
+        if i2c_addr != ADDRESS:
+            raise OSError(121, "Remote I/O error")  # Nothing acknowledges this address
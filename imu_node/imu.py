@@ -1,100 +1,179 @@
-import smbus2
+import argparse
 import time
 import math
-import json
 import os
-import zmq
-from collections import deque
+import sys
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from common import transport
+from common.imu_batch import encode_batch
+from common.metrics import Metrics
+from calibration import load_calibration
+from imu_processing import ImuProcessor
+from mpu6050 import ADDRESS, DLPF_BANDWIDTH, FIFO_FRAME, FIFO_SIZE, FifoReader, MPU6050
+
+parser = argparse.ArgumentParser()
+parser.add_argument("--fake", action="store_true", help="Use the simulated MPU6050 in fake_smbus.py")
+parser.add_argument("--fake-yaw-rate", type=float, default=0.0,
+                    help="Rotation of the simulated IMU in rad/s (with --fake)")
+parser.add_argument("--rate", type=float, default=20.0, help="Publish rate in Hz")
+parser.add_argument("--sample-rate", type=float, default=None,
+                    help="MPU6050 sample rate in Hz, also the filter rate (default 200, 500 with --fifo)")
+parser.add_argument("--fifo", action="store_true",
+                    help="Sample through the MPU6050 FIFO and also publish every sample on the imu_batch stream")
+parser.add_argument("--dlpf", type=int, default=3, choices=sorted(DLPF_BANDWIDTH),
+                    help="Digital low pass filter setting (3 = 44 Hz accel / 42 Hz gyro)")
+parser.add_argument("--kp", type=float, default=1.0,
+                    help="Orientation filter accel gain in rad/s (roll/pitch converge in about 1/kp s)")
+parser.add_argument("--ki", type=float, default=0.05, help="Orientation filter gyro bias gain")
+parser.add_argument("--calibration", default=None,
+                    help="Calibration file from calibrate.py (default: imu_calibration.json, else imu_offsets.json)")
+parser.add_argument("--no-online-bias", action="store_true",
+                    help="Do not refine the gyro bias while the IMU is still. Still windows (0.5 s) within "
+                         "1 deg/s of the bias are blended in; a bias off by more than that (stale calibration, "
+                         "warm-up drift) is replaced once 6 still windows in a row (3 s) agree within 0.1 deg/s")
+args = parser.parse_args()
+if args.sample_rate is None:
+    # 500 Hz of FIFO frames is ~55 kbit/s on the wire, which a 100 kHz bus
+    # sustains; 1 kHz needs the bus in 400 kHz fast mode (see mpu6050.py).
+    args.sample_rate = 500.0 if args.fifo else 200.0
+
+if args.fake:
+    import fake_smbus as smbus2
+else:
+    import smbus2
 
-IMU_ADDR = 0x68
+IMU_ADDR = ADDRESS
 bus = smbus2.SMBus(1)
-bus.write_byte_data(IMU_ADDR, 0x6B, 0)  # Wake up IMU
-
-def read_word(reg):
-    high = bus.read_byte_data(IMU_ADDR, reg)
-    low  = bus.read_byte_data(IMU_ADDR, reg + 1)
-    val  = (high << 8) + low
-    if val >= 0x8000:
-        val = -((65535 - val) + 1)
-    return val
-
-def get_imu_data():
-    # Read raw accelerometer
-    accel_x = read_word(0x3B) / 16384.0
-    accel_y = read_word(0x3D) / 16384.0
-    accel_z = read_word(0x3F) / 16384.0
-
-    # Read raw gyro
-    gyro_x  = read_word(0x43) / 131.0
-    gyro_y  = read_word(0x45) / 131.0
-    gyro_z  = read_word(0x47) / 131.0
-
-    # Simple computations
-    roll  = math.atan2(accel_y, accel_z) * 180.0 / math.pi
-    pitch = math.atan2(-accel_x, math.sqrt(accel_y**2 + accel_z**2)) * 180.0 / math.pi
-    yaw   = gyro_z  # Quick, unintegrated
-
-    return roll, pitch, yaw
-
-# ------------ LOAD OFFSETS -------------
-offset_file = "imu_offsets.json"
-if os.path.exists(offset_file):
-    with open(offset_file, "r") as f:
-        offsets = json.load(f)
-    ROLL_OFFSET  = offsets.get("roll_offset", 0.0)
-    PITCH_OFFSET = offsets.get("pitch_offset", 0.0)
-    YAW_OFFSET   = offsets.get("yaw_offset", 0.0)
-    print(f"Loaded calibration offsets from {offset_file}:")
-    print(f"  ROLL_OFFSET={ROLL_OFFSET}, PITCH_OFFSET={PITCH_OFFSET}, YAW_OFFSET={YAW_OFFSET}")
+if args.fake:
+    bus.yaw_rate = math.degrees(args.fake_yaw_rate)
+imu = MPU6050(bus, IMU_ADDR, dlpf=args.dlpf, sample_rate=args.sample_rate).configure()  # Wakes up the IMU
+print("MPU6050 at {:.0f} Hz, DLPF {} ({} Hz gyro bandwidth)".format(
+    imu.sample_rate, args.dlpf, DLPF_BANDWIDTH[args.dlpf][1]))
+
+# ------------ LOAD CALIBRATION -------------
+calibration, calibration_file = load_calibration(args.calibration)
+if calibration_file:
+    print("Loaded {} calibration from {}: gyro bias {} deg/s, roll/pitch offset {:.3f}/{:.3f}".format(
+        calibration.method, calibration_file, np.round(calibration.gyro_bias, 3),
+        calibration.roll_offset, calibration.pitch_offset))
 else:
-    ROLL_OFFSET  = 0.0
-    PITCH_OFFSET = 0.0
-    YAW_OFFSET   = 0.0
     print("No calibration file found. Using default (zero) offsets.")
-# ----------------------------------------
-
-# --- Set up moving average buffers ---
-ROLL_BUF_SIZE = 5   # Adjust as desired (larger => smoother but more lag)
-PITCH_BUF_SIZE = 5
-YAW_BUF_SIZE = 5
+# --------------------------------------------
 
-roll_buffer  = deque(maxlen=ROLL_BUF_SIZE)
-pitch_buffer = deque(maxlen=PITCH_BUF_SIZE)
-yaw_buffer   = deque(maxlen=YAW_BUF_SIZE)
+# Orientation filter with online gyro bias refinement (see imu_processing.py)
+processor = ImuProcessor(calibration, imu.sample_rate, kp=args.kp, ki=args.ki,
+                         online_bias=not args.no_online_bias)
 
 # Setup ZMQ
-context = zmq.Context()
-publisher = context.socket(zmq.PUB)
-publisher.bind("tcp://*:5557")
-
-print("MPU6050 IMU Publisher started on tcp://*:5557")
-
-while True:
-    roll_raw, pitch_raw, yaw_raw = get_imu_data()
+context = transport.make_context()
+publisher = transport.publisher(context, "imu")
+metrics = Metrics("imu", context)
 
-    # Subtract calibration offsets
-    roll_cal  = roll_raw  - ROLL_OFFSET
-    pitch_cal = pitch_raw - PITCH_OFFSET
-    yaw_cal   = yaw_raw   - YAW_OFFSET
+print("MPU6050 IMU Publisher started on", transport.endpoint("imu", bind=True))
 
-    # Add to rolling buffers
-    roll_buffer.append(roll_cal)
-    pitch_buffer.append(pitch_cal)
-    yaw_buffer.append(yaw_cal)
-
-    # Compute moving average
-    roll_avg  = sum(roll_buffer)  / len(roll_buffer)
-    pitch_avg = sum(pitch_buffer) / len(pitch_buffer)
-    yaw_avg   = sum(yaw_buffer)   / len(yaw_buffer)
-
-    # Publish smoothed data
-    imu_data = {
-        "roll":  roll_avg,
-        "pitch": pitch_avg,
-        "yaw":   yaw_avg
-    }
+def publish(sample_time, yaw_rate, gyro_z, extra=None):
+    imu_data = processor.message(sample_time, yaw_rate, gyro_z)
 
     publisher.send_json(imu_data)
-    print("Sent IMU Data:", imu_data)
-
-    time.sleep(0.05)  # Adjust rate as needed (20 Hz in this case)
+    metrics.count("published")
+    if extra:
+        print("Sent IMU Data:", imu_data, extra)
+    else:
+        print("Sent IMU Data:", imu_data)
+
+def run_fifo():
+    # The FIFO samples at a fixed rate regardless of host scheduling; each
+    # cycle drains it in one bulk read. Every sample goes out on imu_batch
+    # with its implied timestamp, and the usual imu message carries the
+    # filter state after the block, stamped with its newest sample.
+    fifo = FifoReader(imu, getattr(smbus2, "i2c_msg", None)).start()
+    batch_publisher = transport.publisher(context, "imu_batch")
+    capacity = FIFO_SIZE // FIFO_FRAME
+    if imu.sample_rate / args.rate > 0.8 * capacity:
+        print("Warning: {:.0f} samples per cycle at {:.0f} Hz / {:.0f} Hz come close to the FIFO's {}; "
+              "raise --rate".format(imu.sample_rate / args.rate, imu.sample_rate, args.rate, capacity))
+    print("FIFO batches on", transport.endpoint("imu_batch", bind=True))
+
+    seq = 0
+    gap = True
+    # Deadline-based pacing: the drain and filter time do not add to the period
+    period = 1.0 / args.rate
+    next_deadline = time.monotonic()
+    while True:
+        overflows = fifo.overflows
+        with metrics.timer("drain"):
+            drained = fifo.drain()
+        if fifo.overflows != overflows:
+            gap = True
+            print("FIFO overflow: reset ({} overflows, {} samples lost)".format(fifo.overflows, fifo.lost))
+        if drained is not None:
+            first, raw = drained
+            batch_publisher.send(encode_batch(raw, first, fifo.period_ns, imu.accel_scale, imu.gyro_scale,
+                                              seq, fifo.overflows, fifo.lost, gap))
+            seq += 1
+            gap = False
+
+            # The whole block goes through the filter in one vectorized update
+            filter_start = time.perf_counter()
+            accel, gyro = fifo.scale(raw)
+            rates = processor.process_block(accel, gyro, fifo.period_ns)
+            metrics.observe("filter", time.perf_counter() - filter_start)
+            metrics.gauge("batch_samples", len(raw))
+            newest = first + (len(raw) - 1) * fifo.period_ns
+            publish(newest, float(rates.mean()), float(rates[-1]),
+                    "batch {} samples, total {}, overflows {}, lost {}".format(
+                        len(raw), fifo.total, fifo.overflows, fifo.lost))
+
+        metrics.set_count("samples", fifo.total)
+        metrics.set_count("overflows", fifo.overflows)
+        metrics.set_count("lost", fifo.lost)
+        metrics.set_count("bias_updates", processor.bias_updates)
+        metrics.maybe_publish()
+        next_deadline += period
+        delay = next_deadline - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+        else:
+            next_deadline = time.monotonic()
+
+def run_polling():
+    # Filter every sample at the sample rate and publish the mean rate every
+    # 1/rate seconds. Both are paced against absolute deadlines, and publishing
+    # goes by elapsed time, so a slow read costs samples, not publish rate.
+    period = 1.0 / imu.sample_rate
+    publish_period = 1.0 / args.rate
+    last = next_sample = time.monotonic()
+    next_publish = last + publish_period
+    rate_sum = 0.0
+    count = 0
+    while True:
+        with metrics.timer("read"):
+            sample = imu.read()
+        now = time.monotonic()
+        gyro_z = processor.process_sample(sample, now - last)
+        last = now
+        rate_sum += gyro_z
+        count += 1
+        metrics.count("samples")
+        if now >= next_publish:
+            publish(time.time_ns(), rate_sum / count, gyro_z)
+            rate_sum = 0.0
+            count = 0
+            next_publish += publish_period
+            if next_publish <= now:
+                next_publish = now + publish_period
+            metrics.set_count("bias_updates", processor.bias_updates)
+            metrics.maybe_publish()
+        next_sample += period
+        delay = next_sample - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+        else:
+            next_sample = time.monotonic()
+
+if args.fifo:
+    run_fifo()
+else:
+    run_polling()
@@ -0,0 +1,73 @@
+import math
+import numpy as np
+
+from calibration import StillnessDetector
+from orientation import ComplementaryFilter
+
+# Orientation filter, online gyro bias refinement and the imu message,
+# shared by imu.py and the sensor runtime (sensor_runtime/drivers.py).
+#
+# The filter owns the gyro bias from the start: it begins at the calibrated
+# value and is refined whenever the IMU sits still for STILL_WINDOW seconds.
+# A bias off by more than 1 deg/s is replaced outright once several still
+# windows in a row agree on the new value (StillnessDetector).
+
+STILL_WINDOW = 0.5   # seconds
+BIAS_BLEND = 0.3     # Weight of each new still-window measurement
+
+class ImuProcessor:
+    def __init__(self, calibration, sample_rate, kp=1.0, ki=0.05, online_bias=True):
+        self.calibration = calibration
+        self.orientation = ComplementaryFilter(kp=kp, ki=ki, bias=np.radians(calibration.gyro_bias))
+        self.stillness = StillnessDetector(int(STILL_WINDOW * sample_rate))
+        self.online_bias = online_bias
+        self.bias_updates = 0
+
+    def refine_bias(self, gyro, accel):
+        # gyro (N, 3) deg/s raw, accel (N, 3) g corrected.
+        if not self.online_bias:
+            return
+        self.stillness.push(gyro, accel)
+        bias = np.degrees(self.orientation.bias)
+        measured = self.stillness.check(bias)
+        if measured is not None:
+            blend = 1.0 if self.stillness.jumped else BIAS_BLEND
+            self.orientation.bias = np.radians(bias + blend * (measured - bias))
+            self.stillness.clear()
+            self.bias_updates += 1
+            print("Still: gyro bias refined to {} deg/s ({} updates)".format(
+                np.round(np.degrees(self.orientation.bias), 3), self.bias_updates))
+
+    def process_block(self, accel, gyro, period_ns):
+        # A FIFO block (accel g, gyro deg/s, scaled) in one vectorized update.
+        # Returns the bias-corrected z rate of each sample in deg/s.
+        accel = self.calibration.correct_accel(accel)
+        self.refine_bias(gyro, accel)
+        gyro = np.radians(gyro)
+        self.orientation.update_batch(gyro, accel, period_ns * 1e-9)
+        return np.degrees(gyro[:, 2] - self.orientation.bias[2])
+
+    def process_sample(self, sample, dt):
+        # One mpu6050.Sample; returns its bias-corrected z rate in deg/s.
+        accel = self.calibration.correct_accel((sample.accel_x, sample.accel_y, sample.accel_z))
+        self.refine_bias((sample.gyro_x, sample.gyro_y, sample.gyro_z), accel)
+        gyro = (math.radians(sample.gyro_x), math.radians(sample.gyro_y), math.radians(sample.gyro_z))
+        self.orientation.update(gyro, accel, dt)
+        return math.degrees(gyro[2] - self.orientation.bias[2])
+
+    def message(self, sample_time, yaw_rate, gyro_z):
+        roll, pitch, yaw = self.orientation.angles()
+
+        # Filtered attitude in degrees with the mounting offsets removed, yaw
+        # integrated from the bias-corrected z rate. yaw_rate (deg/s) is the mean
+        # rate since the last message, gyro_z the latest sample, for consumers
+        # that integrate it (LiDAR de-skew); timestamp in ns.
+        return {
+            "timestamp": sample_time,
+            "roll":  roll  - self.calibration.roll_offset,
+            "pitch": pitch - self.calibration.pitch_offset,
+            "yaw":   yaw,
+            "yaw_rate": yaw_rate,
+            "gyro_z": gyro_z,
+            "quaternion": [round(float(v), 6) for v in self.orientation.q]
+        }
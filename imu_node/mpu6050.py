@@ -0,0 +1,190 @@
+import struct
+import time
+from collections import namedtuple
+import numpy as np
+
+# MPU6050 access with one burst read per sample.
+#
+# ACCEL_XOUT_H (0x3B) .. GYRO_ZOUT_L (0x48) is one contiguous 14 byte block:
+# accel x/y/z, temperature, gyro x/y/z as big-endian int16. Reading it with a
+# single read_i2c_block_data is one I2C transaction instead of twelve
+# read_byte_data calls, and all seven values come from the same sample (the
+# chip latches the block during a burst read).
+#
+# The I2C bus clock is set on the host, not through SMBus. On a Raspberry Pi
+# use 400 kHz fast mode in /boot/config.txt:  dtparam=i2c_arm_baudrate=400000
+
+ADDRESS = 0x68
+
+SMPLRT_DIV = 0x19
+CONFIG = 0x1A
+GYRO_CONFIG = 0x1B
+ACCEL_CONFIG = 0x1C
+FIFO_EN = 0x23
+INT_ENABLE = 0x38
+INT_STATUS = 0x3A
+ACCEL_XOUT_H = 0x3B
+USER_CTRL = 0x6A
+PWR_MGMT_1 = 0x6B
+FIFO_COUNTH = 0x72
+FIFO_R_W = 0x74
+WHO_AM_I = 0x75
+
+FIFO_EN_ACCEL_GYRO = 0x78    # XG, YG, ZG and ACCEL into the FIFO (no temperature)
+USER_CTRL_FIFO_EN = 0x40
+USER_CTRL_FIFO_RESET = 0x04
+INT_FIFO_OFLOW = 0x10
+FIFO_SIZE = 1024
+FIFO_FRAME = 12              # accel x/y/z, gyro x/y/z as big-endian int16
+SMBUS_BLOCK_MAX = 32         # Longest SMBus block read; longer reads use i2c_rdwr
+
+BLOCK_SIZE = 14
+BLOCK = struct.Struct(">7h")
+
+# Full scale setting -> LSB per unit.
+GYRO_SCALE = {250: 131.0, 500: 65.5, 1000: 32.8, 2000: 16.4}        # LSB per deg/s
+ACCEL_SCALE = {2: 16384.0, 4: 8192.0, 8: 4096.0, 16: 2048.0}         # LSB per g
+
+# DLPF_CFG -> (accel bandwidth Hz, gyro bandwidth Hz). With the DLPF on the
+# gyro output rate is 1 kHz, so the sample rate is 1000 / (1 + SMPLRT_DIV);
+# DLPF_CFG 0 (and 7) bypass it and the gyro runs at 8 kHz.
+DLPF_BANDWIDTH = {0: (260, 256), 1: (184, 188), 2: (94, 98), 3: (44, 42), 4: (21, 20), 5: (10, 10), 6: (5, 5)}
+
+Sample = namedtuple("Sample", ["accel_x", "accel_y", "accel_z", "temperature",
+                               "gyro_x", "gyro_y", "gyro_z"])
+
+def gyro_output_rate(dlpf):
+    return 8000.0 if dlpf in (0, 7) else 1000.0
+
+def decode_block(block, accel_scale=ACCEL_SCALE[2], gyro_scale=GYRO_SCALE[250]):
+    ax, ay, az, temp, gx, gy, gz = BLOCK.unpack(bytes(block))
+    return Sample(ax / accel_scale, ay / accel_scale, az / accel_scale, temp / 340.0 + 36.53,
+                  gx / gyro_scale, gy / gyro_scale, gz / gyro_scale)
+
+class MPU6050:
+    def __init__(self, bus, address=ADDRESS, dlpf=3, sample_rate=200, gyro_range=250, accel_range=2):
+        if dlpf not in DLPF_BANDWIDTH:
+            raise ValueError("DLPF setting must be 0..6")
+        if gyro_range not in GYRO_SCALE or accel_range not in ACCEL_SCALE:
+            raise ValueError("Unsupported full scale range")
+        self.bus = bus
+        self.address = address
+        self.dlpf = dlpf
+        base = gyro_output_rate(dlpf)
+        self.divider = max(0, min(255, int(round(base / sample_rate)) - 1))
+        self.sample_rate = base / (1 + self.divider)
+        self.gyro_range = gyro_range
+        self.accel_range = accel_range
+        self.gyro_scale = GYRO_SCALE[gyro_range]
+        self.accel_scale = ACCEL_SCALE[accel_range]
+
+    def configure(self):
+        # Wake up with the gyro X PLL as clock source (more stable than the
+        # internal oscillator), then filter, sample rate and ranges.
+        self.bus.write_byte_data(self.address, PWR_MGMT_1, 0x01)
+        self.bus.write_byte_data(self.address, CONFIG, self.dlpf)
+        self.bus.write_byte_data(self.address, SMPLRT_DIV, self.divider)
+        self.bus.write_byte_data(self.address, GYRO_CONFIG, {250: 0, 500: 1, 1000: 2, 2000: 3}[self.gyro_range] << 3)
+        self.bus.write_byte_data(self.address, ACCEL_CONFIG, {2: 0, 4: 1, 8: 2, 16: 3}[self.accel_range] << 3)
+        return self
+
+    def read_block(self):
+        return self.bus.read_i2c_block_data(self.address, ACCEL_XOUT_H, BLOCK_SIZE)
+
+    def read(self):
+        # One coherent sample: accel in g, temperature in C, gyro in deg/s.
+        return decode_block(self.read_block(), self.accel_scale, self.gyro_scale)
+
+class FifoReader:
+    # High-rate sampling through the 1 KB FIFO: the chip queues accel + gyro
+    # frames at the configured sample rate and the host drains them in bulk.
+    # Sample k of the current run is stamped anchor + k / sample_rate; the
+    # anchor is the FIFO reset time and is re-derived from the read time when
+    # the chip clock has drifted so far that the stamps no longer fit it.
+    #
+    # `i2c_msg` (smbus2.i2c_msg) lets one i2c_rdwr transaction read the whole
+    # FIFO; without it reads are split into SMBus block reads. Each sample is
+    # 12 bytes, ~108 bits on the wire: 500 Hz fits a 100 kHz bus, 1 kHz needs
+    # 400 kHz fast mode or the FIFO fills faster than it can be drained.
+    def __init__(self, imu, i2c_msg=None):
+        self.imu = imu
+        self.i2c_msg = i2c_msg
+        self.period_ns = int(round(1e9 / imu.sample_rate))
+        self.anchor = 0
+        self.samples = 0       # Samples read since the last FIFO reset
+        self.total = 0         # Samples read overall
+        self.overflows = 0
+        self.lost = 0          # Samples known to be lost to overflows
+        self.reanchors = 0
+        self.reads = 0
+
+    def start(self):
+        bus, address = self.imu.bus, self.imu.address
+        bus.write_byte_data(address, FIFO_EN, FIFO_EN_ACCEL_GYRO)
+        bus.write_byte_data(address, INT_ENABLE, INT_FIFO_OFLOW)
+        self.reset()
+        return self
+
+    def reset(self):
+        bus, address = self.imu.bus, self.imu.address
+        bus.write_byte_data(address, USER_CTRL, USER_CTRL_FIFO_RESET)
+        bus.write_byte_data(address, USER_CTRL, USER_CTRL_FIFO_EN)
+        bus.read_byte_data(address, INT_STATUS)  # Clear a stale overflow flag
+        self.anchor = time.time_ns()
+        self.samples = 0
+
+    def count(self):
+        high, low = self.imu.bus.read_i2c_block_data(self.imu.address, FIFO_COUNTH, 2)
+        return (high << 8) | low
+
+    def _read(self, length):
+        bus, address = self.imu.bus, self.imu.address
+        if self.i2c_msg is not None:
+            write = self.i2c_msg.write(address, [FIFO_R_W])
+            read = self.i2c_msg.read(address, length)
+            bus.i2c_rdwr(write, read)
+            return bytes(list(read))
+        chunk = SMBUS_BLOCK_MAX - SMBUS_BLOCK_MAX % FIFO_FRAME
+        data = bytearray()
+        while len(data) < length:
+            data += bytes(bus.read_i2c_block_data(address, FIFO_R_W, min(chunk, length - len(data))))
+        return bytes(data)
+
+    def drain(self):
+        # Returns (first_timestamp_ns, raw) with raw an (N, 6) int16 array of
+        # accel x/y/z and gyro x/y/z, or None when the FIFO is empty.
+        count = self.count()
+        status = self.imu.bus.read_byte_data(self.imu.address, INT_STATUS)
+        if status & INT_FIFO_OFLOW or count >= FIFO_SIZE:
+            # Overwritten data may not be frame aligned any more: start over.
+            self.overflows += 1
+            self.lost += max(1, count // FIFO_FRAME)
+            self.reset()
+            return None
+        frames = count // FIFO_FRAME
+        if frames == 0:
+            return None
+        data = self._read(frames * FIFO_FRAME)
+        read_time = time.time_ns()
+        self.reads += 1
+        raw = np.frombuffer(data, dtype=">i2").reshape(frames, 6).astype(np.int16)
+
+        first = self.anchor + self.samples * self.period_ns
+        newest = first + (frames - 1) * self.period_ns
+        # The newest sample was taken before the read and at most one FIFO
+        # depth earlier; outside that window the chip and host clocks drifted.
+        max_lag = (FIFO_SIZE // FIFO_FRAME + 1) * self.period_ns
+        if newest > read_time or read_time - newest > max_lag:
+            self.reanchors += 1
+            newest = read_time - self.period_ns // 2
+            first = newest - (frames - 1) * self.period_ns
+            self.anchor = first - self.samples * self.period_ns
+        self.samples += frames
+        self.total += frames
+        return first, raw
+
+    def scale(self, raw):
+        # float32 accel (g) and gyro (deg/s) from raw FIFO frames.
+        accel = raw[:, :3].astype(np.float32) * np.float32(1.0 / self.imu.accel_scale)
+        gyro = raw[:, 3:].astype(np.float32) * np.float32(1.0 / self.imu.gyro_scale)
+        return accel, gyro
@@ -0,0 +1,159 @@
+import math
+import numpy as np
+
+# Gyro + accelerometer orientation filter (Mahony's complementary filter on
+# the rotation group).
+#
+# The gyro rate, minus the current bias estimate, is integrated into a unit
+# quaternion (w, x, y, z) rotating body to world. The accelerometer pulls
+# the estimated gravity direction towards the measured one. The correction
+# has a proportional part (kp, rad/s per unit error: a crossover time of
+# about 1 / kp seconds) and an integral part (ki) that converges to the gyro
+# bias. Samples whose accel magnitude is far from 1 g (the sensor is
+# accelerating) get no correction. Only roll, pitch and the x/y bias are
+# observable from gravity; yaw is the integrated z rate and drifts with the
+# z bias (start it from the calibrated offset).
+#
+# update() takes one sample. update_batch() takes a FIFO block: the rotation
+# of every sample is built with NumPy and chained with a parallel prefix
+# product (log2 N vectorized passes instead of N Python steps), and the
+# accel correction is averaged over the block and spread evenly across it.
+# With blocks much shorter than 1 / kp both paths agree closely (see
+# replay.py).
+
+ACCEL_GATE = 0.15  # Ignore accel when | |a| - 1 g | exceeds this (g)
+
+def _hamilton(a, b):
+    aw, ax, ay, az = a
+    bw, bx, by, bz = b
+    return (aw * bw - ax * bx - ay * by - az * bz,
+            aw * bx + ax * bw + ay * bz - az * by,
+            aw * by - ax * bz + ay * bw + az * bx,
+            aw * bz + ax * by - ay * bx + az * bw)
+
+# The Hamilton product and the body-frame gravity direction as constant
+# tensors: one small matmul each instead of a dozen ufunc calls, which is
+# what dominates on FIFO-sized arrays.
+_PRODUCT = np.array([[_hamilton(a, b) for b in np.eye(4)] for a in np.eye(4)]).reshape(4, 16)
+_GRAVITY = np.zeros((4, 4, 3))
+_GRAVITY[[1, 3, 0, 2], [3, 1, 2, 0], 0] = (1.0, 1.0, -1.0, -1.0)   # 2 (x z - w y)
+_GRAVITY[[0, 1, 2, 3], [1, 0, 3, 2], 1] = 1.0                      # 2 (w x + y z)
+_GRAVITY[[0, 1, 2, 3], [0, 1, 2, 3], 2] = (1.0, -1.0, -1.0, 1.0)   # w^2 - x^2 - y^2 + z^2
+_GRAVITY = _GRAVITY.reshape(4, 12)
+
+def quat_multiply(a, b):
+    # Hamilton product of (..., 4) arrays (broadcasting).
+    a = np.asarray(a, dtype=np.float64)
+    b = np.asarray(b, dtype=np.float64)
+    left = (a @ _PRODUCT).reshape(a.shape[:-1] + (4, 4))
+    return (b[..., None, :] @ left)[..., 0, :]
+
+def quat_from_rotation(vectors):
+    # Quaternions for rotation vectors (..., 3) in radians.
+    vectors = np.asarray(vectors, dtype=np.float64)
+    angle = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    # sin(angle / 2) / angle, with its limit 1/2 for tiny angles
+    scale = np.where(angle > 1e-12, np.sin(0.5 * angle) / np.maximum(angle, 1e-12), 0.5)
+    return np.concatenate((np.cos(0.5 * angle), vectors * scale), axis=-1)
+
+def prefix_products(q):
+    # out[i] = q[0] * q[1] * ... * q[i] (Hillis-Steele scan).
+    out = np.array(q, dtype=np.float64)
+    shift = 1
+    while shift < len(out):
+        out[shift:] = quat_multiply(out[:-shift], out[shift:])
+        shift *= 2
+    return out
+
+def gravity_body(q):
+    # World "up" expressed in the body frame, for (N, 4) quaternions.
+    forms = (q @ _GRAVITY).reshape(len(q), 4, 3)
+    return (forms * q[:, :, None]).sum(axis=1)
+
+def euler(q):
+    # (roll, pitch, yaw) in degrees, ZYX convention.
+    w, x, y, z = q
+    roll = math.atan2(2.0 * (w * x + y * z), 1.0 - 2.0 * (x * x + y * y))
+    pitch = math.asin(max(-1.0, min(1.0, 2.0 * (w * y - z * x))))
+    yaw = math.atan2(2.0 * (w * z + x * y), 1.0 - 2.0 * (y * y + z * z))
+    return math.degrees(roll), math.degrees(pitch), math.degrees(yaw)
+
+class ComplementaryFilter:
+    def __init__(self, kp=1.0, ki=0.05, bias=(0.0, 0.0, 0.0)):
+        self.kp = kp
+        self.ki = ki
+        self.bias = np.array(bias, dtype=np.float64)  # rad/s
+        self.q = np.array([1.0, 0.0, 0.0, 0.0])
+        self.initialized = False
+
+    def reset(self, accel):
+        # Level the estimate on a measured gravity vector, yaw 0.
+        ax, ay, az = accel
+        roll = math.atan2(ay, az)
+        pitch = math.atan2(-ax, math.hypot(ay, az))
+        cr, sr = math.cos(roll / 2), math.sin(roll / 2)
+        cp, sp = math.cos(pitch / 2), math.sin(pitch / 2)
+        self.q = np.array([cr * cp, sr * cp, cr * sp, -sr * sp])
+        self.initialized = True
+
+    def update(self, gyro, accel, dt):
+        # gyro in rad/s, accel in any unit with 1 g = 1 (only its direction
+        # and gating use it). Plain floats: this runs once per sample.
+        if not self.initialized:
+            self.reset(accel)
+        w, x, y, z = self.q
+        gx, gy, gz = gyro[0] - self.bias[0], gyro[1] - self.bias[1], gyro[2] - self.bias[2]
+        ax, ay, az = accel
+        norm = math.sqrt(ax * ax + ay * ay + az * az)
+        if abs(norm - 1.0) < ACCEL_GATE:
+            ax, ay, az = ax / norm, ay / norm, az / norm
+            vx = 2.0 * (x * z - w * y)
+            vy = 2.0 * (w * x + y * z)
+            vz = w * w - x * x - y * y + z * z
+            ex, ey, ez = ay * vz - az * vy, az * vx - ax * vz, ax * vy - ay * vx
+            self.bias[0] -= self.ki * ex * dt
+            self.bias[1] -= self.ki * ey * dt
+            self.bias[2] -= self.ki * ez * dt
+            gx, gy, gz = gx + self.kp * ex, gy + self.kp * ey, gz + self.kp * ez
+        half = 0.5 * dt
+        w, x, y, z = (w - half * (x * gx + y * gy + z * gz),
+                      x + half * (w * gx + y * gz - z * gy),
+                      y + half * (w * gy - x * gz + z * gx),
+                      z + half * (w * gz + x * gy - y * gx))
+        norm = math.sqrt(w * w + x * x + y * y + z * z)
+        self.q = np.array([w / norm, x / norm, y / norm, z / norm])
+        return self.q
+
+    def update_batch(self, gyro, accel, dt):
+        # gyro (N, 3) rad/s and accel (N, 3) g at a fixed spacing dt.
+        # Returns the (N, 4) orientation after each sample.
+        gyro = np.asarray(gyro, dtype=np.float64)
+        accel = np.asarray(accel, dtype=np.float64)
+        n = len(gyro)
+        if n == 0:
+            return np.empty((0, 4))
+        if not self.initialized:
+            self.reset(accel[0])
+
+        # Gyro-only propagation of every sample
+        steps = quat_from_rotation((gyro - self.bias) * dt)
+        q = quat_multiply(self.q, prefix_products(steps))
+
+        # Average gravity error over the samples that pass the accel gate
+        norms = np.linalg.norm(accel, axis=1)
+        valid = np.abs(norms - 1.0) < ACCEL_GATE
+        if valid.any():
+            measured = accel[valid] / norms[valid, None]
+            v = gravity_body(q[valid])
+            error = (measured[:, [1, 2, 0]] * v[:, [2, 0, 1]] - measured[:, [2, 0, 1]] * v[:, [1, 2, 0]]).mean(axis=0)
+            # The correction ramps up over the block like it would sample by sample
+            ramp = np.arange(1, n + 1)[:, None] * (self.kp * error * dt)
+            q = quat_multiply(q, quat_from_rotation(ramp))
+            self.bias -= self.ki * error * (n * dt)
+
+        q /= np.linalg.norm(q, axis=1, keepdims=True)
+        self.q = q[-1].copy()
+        return q
+
+    def angles(self):
+        return euler(self.q)
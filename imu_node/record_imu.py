@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+# Record the imu_batch stream (imu.py --fifo) to a .npz file for replay.py.
+#
+#   python3 imu_node/record_imu.py turn.npz --seconds 30
+#
+# The file holds timestamps (int64 ns), accel (N, 3, g) and gyro (N, 3,
+# deg/s) as float32, and the sample indices where a FIFO overflow left a
+# gap before the sample. samples/fake_turn.npz was recorded this way from
+# the simulated IMU (see replay.py).
+import argparse
+import os
+import sys
+import time
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from common import transport
+from common.imu_batch import decode_batch
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("output", help="Path of the .npz file to write")
+    parser.add_argument("--seconds", type=float, default=10.0, help="How long to record")
+    args = parser.parse_args()
+
+    context = transport.make_context()
+    socket = transport.subscriber(context, "imu_batch")
+    print("Recording", transport.endpoint("imu_batch"), "for", args.seconds, "s")
+
+    timestamps, accel, gyro, gaps = [], [], [], []
+    count = 0
+    end = time.monotonic() + args.seconds
+    while time.monotonic() < end:
+        if not socket.poll(100):
+            continue
+        batch = decode_batch(socket.recv())
+        if batch.gap and count:
+            gaps.append(count)
+        timestamps.append(batch.timestamps)
+        accel.append(batch.accel)
+        gyro.append(batch.gyro)
+        count += len(batch.timestamps)
+        print("Recorded {} samples".format(count), end="\r")
+
+    if not count:
+        print("No imu_batch data received; is imu.py running with --fifo?")
+        exit(1)
+    np.savez_compressed(args.output, timestamps=np.concatenate(timestamps), accel=np.concatenate(accel),
+                        gyro=np.concatenate(gyro), gaps=np.array(gaps, dtype=np.int64))
+    print("\nSaved {} samples ({} gaps) to {}".format(count, len(gaps), args.output))
+
+if __name__ == "__main__":
+    main()
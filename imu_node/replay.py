@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+# Run the orientation filter over a recording from record_imu.py, sample by
+# sample and in FIFO-sized blocks, and compare the two paths.
+#
+#   python3 imu_node/replay.py turn.npz
+#   python3 imu_node/replay.py turn.npz --block 50 --expected-yaw 90
+#   python3 imu_node/replay.py imu_node/samples/fake_turn.npz --expected-yaw 116
+#
+# Reports the time per sample of each path, the largest orientation
+# difference between them (checked at every block end), and the final
+# attitude and gyro bias. --expected-yaw checks the integrated yaw change
+# against a known rotation (e.g. the robot turned a measured 90 degrees).
+# Exits with status 1 when the paths differ by more than --max-difference
+# or the yaw change is off by more than --yaw-tolerance.
+#
+# samples/fake_turn.npz is 4.05 s of record_imu.py against
+# imu.py --fake --fifo --fake-yaw-rate 0.5 (500 Hz, with the simulated
+# noise), so its yaw change is 0.5 rad/s * 4.05 s = 116.0 degrees.
+import argparse
+import math
+import sys
+import time
+import numpy as np
+
+from orientation import ComplementaryFilter, euler
+
+def blocks(count, size, gaps):
+    # (start, stop) ranges of at most `size` samples that never span a gap.
+    edges = sorted(set([0, count] + [int(g) for g in gaps]))
+    for start, stop in zip(edges[:-1], edges[1:]):
+        for first in range(start, stop, size):
+            yield first, min(first + size, stop)
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("recording", help=".npz file written by record_imu.py")
+    parser.add_argument("--block", type=int, default=0, help="Samples per batch update (default: 50 ms worth)")
+    parser.add_argument("--kp", type=float, default=1.0)
+    parser.add_argument("--ki", type=float, default=0.05)
+    parser.add_argument("--expected-yaw", type=float, default=None, help="Known yaw change over the recording (deg)")
+    parser.add_argument("--yaw-tolerance", type=float, default=1.0, help="Allowed yaw change error (deg)")
+    parser.add_argument("--max-difference", type=float, default=0.05,
+                        help="Allowed sample/batch orientation difference (deg)")
+    args = parser.parse_args()
+
+    data = np.load(args.recording)
+    timestamps, accel, gyro = data["timestamps"], data["accel"].astype(np.float64), np.radians(data["gyro"])
+    gaps = data["gaps"] if "gaps" in data else []
+    count = len(timestamps)
+    dt = float(np.median(np.diff(timestamps))) * 1e-9
+    block = args.block or max(1, int(round(0.05 / dt)))
+    print("{} samples at {:.0f} Hz, {:.1f} s, {} gaps, blocks of {}".format(
+        count, 1.0 / dt, count * dt, len(gaps), block))
+
+    spans = list(blocks(count, block, gaps))
+    ends = set(stop - 1 for _, stop in spans)
+
+    single = ComplementaryFilter(args.kp, args.ki)
+    reference = {}
+    start = time.perf_counter()
+    previous = timestamps[0] - int(dt * 1e9)
+    for i in range(count):
+        single.update(gyro[i], accel[i], (timestamps[i] - previous) * 1e-9)
+        previous = timestamps[i]
+        if i in ends:
+            reference[i] = single.q.copy()
+    single_time = time.perf_counter() - start
+
+    batch = ComplementaryFilter(args.kp, args.ki)
+    worst = 0.0
+    start = time.perf_counter()
+    for first, stop in spans:
+        q = batch.update_batch(gyro[first:stop], accel[first:stop], dt)
+        dot = min(1.0, abs(float(np.dot(q[-1], reference[stop - 1]))))
+        worst = max(worst, math.degrees(2.0 * math.acos(dot)))
+    batch_time = time.perf_counter() - start
+
+    print("{:<10} {:>12} {:>8} {:>8} {:>8} {:>22}".format("path", "us/sample", "roll", "pitch", "yaw", "bias deg/s"))
+    for label, f, elapsed in (("sample", single, single_time), ("batch", batch, batch_time)):
+        roll, pitch, yaw = euler(f.q)
+        print("{:<10} {:>12.2f} {:>8.2f} {:>8.2f} {:>8.2f} {:>22}".format(
+            label, elapsed / count * 1e6, roll, pitch, yaw, np.array2string(np.degrees(f.bias), precision=3)))
+    print("Largest sample/batch difference: {:.4f} deg".format(worst))
+    failed = worst > args.max_difference
+    if failed:
+        print("FAIL: the batch path differs by more than {} deg".format(args.max_difference))
+
+    if args.expected_yaw is not None:
+        # Unwrapped yaw change from the per-sample path, re-run to track it.
+        f = ComplementaryFilter(args.kp, args.ki)
+        total, last_yaw = 0.0, None
+        previous = timestamps[0] - int(dt * 1e9)
+        for i in range(count):
+            f.update(gyro[i], accel[i], (timestamps[i] - previous) * 1e-9)
+            previous = timestamps[i]
+            yaw = euler(f.q)[2]
+            if last_yaw is not None:
+                total += (yaw - last_yaw + 180.0) % 360.0 - 180.0
+            last_yaw = yaw
+        print("Yaw change {:.2f} deg, expected {:.2f} deg, error {:.2f} deg".format(
+            total, args.expected_yaw, total - args.expected_yaw))
+        if abs(total - args.expected_yaw) > args.yaw_tolerance:
+            print("FAIL: yaw change is off by more than {} deg".format(args.yaw_tolerance))
+            failed = True
+    if failed:
+        sys.exit(1)
+    print("OK")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,208 @@
+import os
+import sys
+import threading
+import time
+from collections import deque
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from common.lidar_frame import encode_scan, points_to_arrays
+
+# Scan acquisition and publishing on separate threads.
+#
+# The acquisition thread only calls doProcessSimple and converts the scan to
+# arrays, so a slow send can never delay reading the next revolution. Scans go
+# through a bounded ring; the publish thread drains it according to the policy:
+#
+#   "all"    - publish every scan in order (scans are only dropped if the ring
+#              overflows, i.e. publishing is stalled for `capacity` scans);
+#              on stop, the scans still in the ring are sent before exiting
+#   "latest" - publish the newest scan at a fixed rate; older unsent scans are
+#              superseded
+#
+# Each published scan goes through the ScanReducer and is sent once per
+# resolution tier as a [topic, frame] multipart message. Tiers listed in
+# `delta` are additionally sent through a keyframe/delta encoder
+# (common/lidar_codec.py) on their own topic. With a deskewer, the tiers are
+# also sent IMU motion-compensated (deskew.py) on lidar/deskewed/<tier>.
+#
+# read_scan() and ScanSender are the two halves without the threads; the
+# sensor runtime (sensor_runtime/drivers.py) schedules them itself.
+
+def deskewed_topic(topic):
+    # lidar/<tier> -> lidar/deskewed/<tier>
+    return b"lidar/deskewed/" + topic[len(b"lidar/"):]
+
+class ScanCounters:
+    def __init__(self):
+        self.acquired = 0
+        self.published = 0
+        self.dropped = 0     # Evicted from a full ring before being published
+        self.superseded = 0  # Skipped by the "latest" policy
+        self.failed = 0      # doProcessSimple returned False
+
+    def as_dict(self):
+        return {
+            "acquired": self.acquired,
+            "published": self.published,
+            "dropped": self.dropped,
+            "superseded": self.superseded,
+            "failed": self.failed,
+        }
+
+class ScanRing:
+    def __init__(self, capacity, counters):
+        self.scans = deque()
+        self.capacity = capacity
+        self.counters = counters
+        self.cond = threading.Condition()
+
+    def push(self, scan):
+        with self.cond:
+            if len(self.scans) >= self.capacity:
+                self.scans.popleft()
+                self.counters.dropped += 1
+            self.scans.append(scan)
+            self.cond.notify()
+
+    def pop_all(self, timeout):
+        with self.cond:
+            if not self.scans:
+                self.cond.wait(timeout)
+            scans = list(self.scans)
+            self.scans.clear()
+        return scans
+
+    def pop_latest(self):
+        with self.cond:
+            if not self.scans:
+                return None
+            scan = self.scans.pop()
+            self.counters.superseded += len(self.scans)
+            self.scans.clear()
+        return scan
+
+    def __len__(self):
+        return len(self.scans)
+
+def read_scan(laser, scan, counters):
+    # One revolution as (stamp, frequency, angles, ranges); None if
+    # doProcessSimple failed. Blocks for up to a revolution.
+    if not laser.doProcessSimple(scan):
+        counters.failed += 1
+        return None
+    scan_time = scan.config.scan_time
+    if scan_time == 0.0:
+        scan_time = 1
+    angles, ranges = points_to_arrays(scan.points)
+    counters.acquired += 1
+    return (scan.stamp, 1.0 / scan_time, angles, ranges)
+
+class ScanAcquirer(threading.Thread):
+    MAX_CONSECUTIVE_FAILURES = 5
+
+    def __init__(self, laser, scan, ring, counters, is_ok, stop_event):
+        super().__init__(name="lidar-acquire", daemon=True)
+        self.laser = laser
+        self.scan = scan
+        self.ring = ring
+        self.counters = counters
+        self.is_ok = is_ok
+        self.stop_event = stop_event
+
+    def run(self):
+        failures = 0
+        while not self.stop_event.is_set() and self.is_ok():
+            scan = read_scan(self.laser, self.scan, self.counters)
+            if scan is None:
+                failures += 1
+                if failures >= self.MAX_CONSECUTIVE_FAILURES:
+                    print("\nLiDAR stopped delivering scans.")
+                    break
+                continue
+            failures = 0
+            self.ring.push(scan)
+        self.stop_event.set()
+
+class ScanSender:
+    # Reduces one scan into its tiers and sends them; all calls must come
+    # from the thread that owns the socket behind `send`.
+    def __init__(self, send, counters, reducer, quantize=False, raw_topics=None, delta=None, deskew=None,
+                 metrics=None):
+        self.send = send
+        self.reducer = reducer
+        self.raw_topics = raw_topics
+        self.delta = delta or {}  # tier topic -> (delta topic, DeltaEncoder)
+        # (Deskewer, ScanReducer): motion-compensated copies of the raw tiers.
+        # A reducer of its own keeps its temporal filter state apart.
+        self.deskew = deskew
+        self.counters = counters
+        self.quantize = quantize
+        self.metrics = metrics  # common.metrics.Metrics: per-scan publish and deskew time
+
+    def publish(self, scan):
+        start = time.perf_counter()
+        stamp, frequency, angles, ranges = scan
+        for topic, tier_angles, tier_ranges in self.reducer.reduce(angles, ranges):
+            if self.raw_topics is None or topic in self.raw_topics:
+                self.send(topic, encode_scan(tier_angles, tier_ranges, stamp, frequency, quantize=self.quantize))
+            if topic in self.delta:
+                delta_topic, encoder = self.delta[topic]
+                self.send(delta_topic, encoder.encode(tier_ranges, stamp))
+        if self.deskew is not None:
+            deskew_start = time.perf_counter()
+            deskewer, reducer = self.deskew
+            corrected = deskewer(stamp, frequency, angles)
+            if corrected is not None:
+                for topic, tier_angles, tier_ranges in reducer.reduce(corrected, ranges):
+                    if self.raw_topics is None or topic in self.raw_topics:
+                        self.send(deskewed_topic(topic),
+                                  encode_scan(tier_angles, tier_ranges, stamp, frequency, quantize=self.quantize))
+            if self.metrics is not None:
+                self.metrics.observe("deskew", time.perf_counter() - deskew_start)
+        self.counters.published += 1
+        if self.metrics is not None:
+            self.metrics.observe("publish", time.perf_counter() - start)
+
+class ScanPublisher(threading.Thread):
+    # All ZMQ sends happen on this thread (sockets are not thread-safe).
+    def __init__(self, send, ring, counters, stop_event, reducer, policy="all", rate=10.0, quantize=False,
+                 raw_topics=None, delta=None, deskew=None, metrics=None, acquirer=None):
+        super().__init__(name="lidar-publish", daemon=True)
+        if policy not in ("all", "latest"):
+            raise ValueError("Unknown publish policy: {}".format(policy))
+        self.sender = ScanSender(send, counters, reducer, quantize=quantize, raw_topics=raw_topics,
+                                 delta=delta, deskew=deskew, metrics=metrics)
+        self.publish = self.sender.publish
+        self.ring = ring
+        self.stop_event = stop_event
+        self.policy = policy
+        self.period = 1.0 / rate
+        self.acquirer = acquirer  # drained after it stops, so its last scan is sent too
+
+    def run(self):
+        if self.policy == "all":
+            while not self.stop_event.is_set():
+                for scan in self.ring.pop_all(timeout=0.5):
+                    self.publish(scan)
+            self.drain()
+            return
+
+        # Deadline-based pacing so the rate does not drift with send time.
+        next_deadline = time.monotonic()
+        while not self.stop_event.is_set():
+            scan = self.ring.pop_latest()
+            if scan is not None:
+                self.publish(scan)
+            next_deadline += self.period
+            delay = next_deadline - time.monotonic()
+            if delay > 0:
+                self.stop_event.wait(delay)
+            else:
+                next_deadline = time.monotonic()
+
+    def drain(self, timeout=2.0):
+        # Wait out the acquirer's read in flight, then send what is left.
+        if self.acquirer is not None:
+            self.acquirer.join(timeout)
+        for scan in self.ring.pop_all(timeout=0):
+            self.publish(scan)
@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+# De-skew cost and effect on simulated sweeps of a turning sensor.
+#
+# Each sweep is smeared like fake_ydlidar.py (heading advances during the
+# revolution). The 1deg profile of the raw and the de-skewed sweep is compared
+# with an unsmeared sweep taken at the reference heading (end of the sweep).
+# The IMU history is sampled at --imu-hz: 500 Hz is what lidar.py --deskew
+# gets from imu_batch (imu.py --fifo, the supervisor default); 20 Hz is the
+# decimated imu stream it falls back to without the FIFO.
+#
+#   python3 lidar_node/bench_deskew.py [--imu-hz 500] [--repeat 500]
+import argparse
+import time
+import numpy as np
+
+from deskew import Deskewer, ImuHistory
+from fake_ydlidar import room_ranges
+from scan_reduce import bin_min
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--points", type=int, default=833, help="Points per sweep (5 kHz sample rate at 6 Hz)")
+    parser.add_argument("--frequency", type=float, default=6.0, help="Scan frequency in Hz")
+    parser.add_argument("--imu-hz", type=float, default=500.0,
+                        help="IMU history rate (500 = imu_batch, 20 = the decimated imu stream)")
+    parser.add_argument("--gyro-noise", type=float, default=0.01, help="Gyro noise in rad/s")
+    parser.add_argument("--repeat", type=int, default=500)
+    args = parser.parse_args()
+
+    period = 1.0 / args.frequency
+    angles = np.linspace(-np.pi, np.pi, args.points, endpoint=False).astype(np.float32)
+    stamp = 10 ** 9
+    print("{} points per sweep at {} Hz, IMU at {} Hz".format(args.points, args.frequency, args.imu_hz))
+    print("{:>10} {:>14} {:>16} {:>12}".format("yaw rad/s", "raw err mm", "deskewed err mm", "deskew us"))
+    for yaw_rate in (0.0, 0.5, 1.0, 2.0):
+        history = ImuHistory()
+        imu_times = np.arange(stamp - 2e8, stamp + period * 1e9 + 1, 1e9 / args.imu_hz).astype(np.int64)
+        for t in imu_times:
+            history.append(int(t), yaw_rate + np.random.normal(0.0, args.gyro_noise))
+
+        headings = yaw_rate * period * np.arange(args.points) / args.points
+        raw = room_ranges(angles, headings).astype(np.float32)
+        reference = bin_min(angles, room_ranges(angles, yaw_rate * period).astype(np.float32), 1.0)
+
+        deskewer = Deskewer(history)
+        start = time.perf_counter()
+        for _ in range(args.repeat):
+            corrected = deskewer(stamp, args.frequency, angles)
+        deskew_us = (time.perf_counter() - start) / args.repeat * 1e6
+
+        raw_err = np.median(np.abs(bin_min(angles, raw, 1.0) - reference)) * 1e3
+        fixed_err = np.median(np.abs(bin_min(corrected, raw, 1.0) - reference)) * 1e3
+        print("{:>10.1f} {:>14.1f} {:>16.1f} {:>12.1f}".format(yaw_rate, raw_err, fixed_err, deskew_us))
+
+if __name__ == "__main__":
+    main()
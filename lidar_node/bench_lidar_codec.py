@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+# Compare LiDAR scan encodings on replayed 1deg/5deg grids: bytes per scan and
+# encode/decode time for the plain frames (common/lidar_frame.py) and the
+# keyframe/delta codec (common/lidar_codec.py).
+#
+#   python3 lidar_node/bench_lidar_codec.py [--tier 1deg] [--scans 600] [--yaw-rate 0.3]
+#
+# "static" replays a robot standing still (only sensor noise changes between
+# scans); "moving" rotates it at --yaw-rate rad/s at 6 Hz.
+import argparse
+import os
+import sys
+import time
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from common import lidar_codec
+from common.lidar_codec import DeltaDecoder, DeltaEncoder
+from common.lidar_frame import decode_scan, encode_scan
+from fake_ydlidar import room_ranges
+from scan_reduce import TIERS, bin_centers, bin_min
+
+SCAN_FREQUENCY = 6.0
+
+def replay(tier, scans, points, yaw_rate):
+    angles = np.linspace(-np.pi, np.pi, points, endpoint=False).astype(np.float32)
+    heading = 0.0
+    out = []
+    for _ in range(scans):
+        ranges = (room_ranges(angles, heading) + np.random.normal(0.0, 0.01, points)).astype(np.float32)
+        ranges[np.random.rand(points) < 0.03] = 0.0
+        keep = ranges > 0
+        out.append(bin_min(angles[keep], ranges[keep], TIERS[tier]))
+        heading += yaw_rate / SCAN_FREQUENCY
+    return out
+
+def time_frames(encode, decode, grids):
+    start = time.perf_counter()
+    frames = [encode(ranges) for ranges in grids]
+    encode_us = (time.perf_counter() - start) / len(grids) * 1e6
+    start = time.perf_counter()
+    for frame in frames:
+        decode(frame)
+    decode_us = (time.perf_counter() - start) / len(grids) * 1e6
+    return sum(len(f) for f in frames) / len(frames), encode_us, decode_us
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--tier", default="1deg", choices=[t for t in TIERS if TIERS[t]])
+    parser.add_argument("--scans", type=int, default=600)
+    parser.add_argument("--points", type=int, default=833, help="Points per scan (5 kHz sample rate at 6 Hz)")
+    parser.add_argument("--yaw-rate", type=float, default=0.3, help="Rotation of the moving replay in rad/s")
+    parser.add_argument("--threshold", type=int, default=20, help="Delta threshold in mm")
+    parser.add_argument("--keyframe-interval", type=int, default=12)
+    args = parser.parse_args()
+
+    centers = bin_centers(TIERS[args.tier])
+    codecs = [
+        ("float32 frame", lambda: (lambda r: encode_scan(centers, r), decode_scan)),
+        ("uint16 frame", lambda: (lambda r: encode_scan(centers, r, quantize=True), decode_scan)),
+    ]
+    compressions = [None, "zlib"] + (["lz4"] if lidar_codec.lz4 is not None else [])
+    for compression in compressions:
+        def make(compression=compression):
+            encoder = DeltaEncoder(args.keyframe_interval, args.threshold, compression)
+            return lambda r: encoder.encode(r), DeltaDecoder().decode
+        codecs.append(("delta" + ("+" + compression if compression else ""), make))
+    if lidar_codec.lz4 is None:
+        print("lz4 not installed, skipping delta+lz4")
+
+    print("{} tier, {} bins, {} scans, keyframe every {}, threshold {} mm".format(
+        args.tier, len(centers), args.scans, args.keyframe_interval, args.threshold))
+    for name, yaw_rate in (("static", 0.0), ("moving", args.yaw_rate)):
+        grids = replay(args.tier, args.scans, args.points, yaw_rate)
+        print("\n{} replay".format(name))
+        print("{:<16} {:>10} {:>11} {:>11}".format("codec", "B/scan", "encode us", "decode us"))
+        for label, make in codecs:
+            encode, decode = make()
+            size, encode_us, decode_us = time_frames(encode, decode, grids)
+            print("{:<16} {:>10.0f} {:>11.1f} {:>11.1f}".format(label, size, encode_us, decode_us))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+# Throughput of the raw YDLIDAR packet parser in packets per second.
+# Uses a recorded dump (python3 test.py --record dump.bin) if given,
+# otherwise a synthesized one.
+#
+#   python3 lidar_node/bench_raw_parser.py [--dump dump.bin] [--revolutions 200]
+import argparse
+import io
+import os
+import sys
+import time
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from fake_ydlidar import room_ranges
+from ydlidar_raw import RawScanReader, encode_revolution
+
+def synthesize(revolutions, points, samples_per_packet):
+    angles = np.linspace(-np.pi, np.pi, points, endpoint=False)
+    distances = np.rint(room_ranges(angles) * 1000.0)
+    distances[distances > 10000] = 0
+    # Response descriptor first, like a real capture.
+    return b"\xA5\x5A\x05\x00\x00\x40\x81" + encode_revolution(distances, samples_per_packet) * revolutions
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--dump", help="Recorded raw byte dump")
+    parser.add_argument("--revolutions", type=int, default=200)
+    parser.add_argument("--points", type=int, default=720, help="Samples per synthesized revolution")
+    parser.add_argument("--samples-per-packet", type=int, default=40)
+    parser.add_argument("--chunk", type=int, default=4096, help="Bytes per read")
+    args = parser.parse_args()
+
+    if args.dump:
+        with open(args.dump, "rb") as f:
+            dump = f.read()
+    else:
+        dump = synthesize(args.revolutions, args.points, args.samples_per_packet)
+
+    reader = RawScanReader(io.BytesIO(dump), chunk_size=args.chunk)
+    start = time.perf_counter()
+    scans = 0
+    points = 0
+    for angles, ranges in reader.scans():
+        scans += 1
+        points += len(ranges)
+    elapsed = time.perf_counter() - start
+
+    print("{:.1f} KiB parsed in {:.3f} s".format(len(dump) / 1024.0, elapsed))
+    print("packets:   {} ({:.0f}/s)".format(reader.packets, reader.packets / elapsed))
+    print("scans:     {} ({:.0f}/s)".format(scans, scans / elapsed))
+    print("samples:   {} ({:.0f}/s)".format(points, points / elapsed))
+    print("rejected:  {} candidate headers".format(reader.bad_checksums))
+    # An X4 at 5 kHz produces roughly 5000 / samples-per-packet packets per second.
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,46 @@
+#!/usr/bin/env python3
+# Time the scan reduction stage per resolution tier on simulated scans.
+#
+#   python3 lidar_node/bench_reduce.py [--points 833] [--repeat 500]
+import argparse
+import os
+import sys
+import time
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from common.lidar_frame import encode_scan
+from fake_ydlidar import room_ranges
+from scan_reduce import TIERS, ScanReducer
+
+def make_scan(n):
+    angles = np.linspace(-np.pi, np.pi, n, endpoint=False).astype(np.float32)
+    ranges = (room_ranges(angles) + np.random.normal(0.0, 0.01, n)).astype(np.float32)
+    ranges[np.random.rand(n) < 0.03] = 0.0
+    return angles, ranges
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--points", type=int, default=833, help="Points per scan (5 kHz sample rate at 6 Hz)")
+    parser.add_argument("--repeat", type=int, default=500)
+    args = parser.parse_args()
+
+    angles, ranges = make_scan(args.points)
+    print("{} points per scan".format(args.points))
+    print("{:<6} {:<16} {:>10} {:>12} {:>12}".format("tier", "filters", "reduce us", "float32 B", "uint16 B"))
+    for tier in TIERS:
+        for label, median, alpha in (("none", 0, 0.0), ("median3", 3, 0.0), ("median3+temporal", 3, 0.5)):
+            if TIERS[tier] is None and label != "none":
+                continue  # Filters only apply to binned tiers
+            reducer = ScanReducer((tier,), median_window=median, temporal_alpha=alpha)
+            start = time.perf_counter()
+            for _ in range(args.repeat):
+                topic, tier_angles, tier_ranges = reducer.reduce(angles, ranges)[0]
+            reduce_us = (time.perf_counter() - start) / args.repeat * 1e6
+            print("{:<6} {:<16} {:>10.1f} {:>12} {:>12}".format(
+                tier, label, reduce_us,
+                len(encode_scan(tier_angles, tier_ranges)),
+                len(encode_scan(tier_angles, tier_ranges, quantize=True))))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+# Compare the old per-point JSON scan format with the binary scan frames.
+#
+#   python3 lidar_node/bench_scan_format.py [--points 833] [--repeat 200]
+import argparse
+import json
+import os
+import sys
+import time
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from common.lidar_frame import decode_scan, encode_scan, points_to_arrays, scan_arrays
+
+class Point:
+    # Same attributes as ydlidar.LaserPoint
+    __slots__ = ("angle", "range", "intensity")
+
+    def __init__(self, angle, range_):
+        self.angle = angle
+        self.range = range_
+        self.intensity = 0.0
+
+def make_points(n):
+    angles = np.linspace(-np.pi, np.pi, n, endpoint=False)
+    ranges = 2.0 + np.sin(angles * 3.0) + np.random.rand(n) * 0.05
+    ranges[::17] = 0.0  # Some invalid returns
+    return [Point(float(a), float(r)) for a, r in zip(angles, ranges)]
+
+def old_encode(points):
+    return json.dumps({
+        "timestamp": 0,
+        "scan_frequency": 6.0,
+        "points": [{"angle": p.angle, "range": p.range} for p in points]
+    }).encode()
+
+def old_decode(msg):
+    return json.loads(msg.decode('utf-8'))
+
+def new_encode(points, quantize):
+    angles, ranges = points_to_arrays(points)
+    return encode_scan(angles, ranges, 0, 6.0, quantize=quantize)
+
+def new_decode(msg):
+    return scan_arrays(decode_scan(msg))
+
+def timed(fn, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = fn()
+    return (time.perf_counter() - start) / repeat * 1e6, result
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--points", type=int, default=833, help="Points per scan (5 kHz sample rate at 6 Hz)")
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    points = make_points(args.points)
+    formats = [
+        ("json dicts", lambda: old_encode(points), old_decode),
+        ("float32", lambda: new_encode(points, False), new_decode),
+        ("uint16", lambda: new_encode(points, True), new_decode),
+    ]
+
+    print("{} points per scan".format(args.points))
+    print("{:<11} {:>10} {:>12} {:>12}".format("format", "bytes", "encode us", "decode us"))
+    for name, encode, decode in formats:
+        encode_us, msg = timed(encode, args.repeat)
+        decode_us, _ = timed(lambda: decode(msg), args.repeat)
+        print("{:<11} {:>10} {:>12.1f} {:>12.1f}".format(name, len(msg), encode_us, decode_us))
+
+if __name__ == "__main__":
+    main()
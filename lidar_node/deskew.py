@@ -0,0 +1,168 @@
+import json
+import math
+import os
+import sys
+import threading
+import time
+import numpy as np
+import zmq
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from common.imu_batch import decode_batch
+
+# IMU motion compensation (de-skewing) of LiDAR scans.
+#
+# One revolution takes 1 / scan_frequency (~170 ms at 6 Hz); if the sensor
+# turns during the sweep, every point is measured from a different heading.
+# Each point is timestamped from its angle within the sweep, the gyro z-rate
+# is integrated from a buffered IMU history (every FIFO sample of the
+# imu_batch stream, see ImuFeed) into yaw at those times, and the point
+# angles are rotated to the heading at a common reference time (the end of
+# the sweep, so the corrected scan describes the newest pose):
+#
+#   angle_ref = angle + yaw(t_point) - yaw(t_ref)
+#
+# Only rotation is compensated; translation during a sweep is small at walking
+# speeds compared to the angular smear.
+
+class ImuHistory:
+    # Ring of (timestamp_ns, yaw rate rad/s) samples with a running integral,
+    # written by the IMU listener thread and read by the publish thread.
+    def __init__(self, capacity=2048):
+        self.times = np.zeros(capacity, dtype=np.int64)
+        self.rates = np.zeros(capacity, dtype=np.float64)
+        self.yaws = np.zeros(capacity, dtype=np.float64)  # Integrated yaw at each sample
+        self.capacity = capacity
+        self.count = 0
+        self.lock = threading.Lock()
+
+    def append(self, timestamp_ns, rate):
+        with self.lock:
+            i = self.count % self.capacity
+            if self.count:
+                prev = (self.count - 1) % self.capacity
+                if timestamp_ns <= self.times[prev]:
+                    return  # Out of order or duplicate
+                dt = (timestamp_ns - self.times[prev]) * 1e-9
+                # Trapezoid between consecutive samples.
+                self.yaws[i] = self.yaws[prev] + 0.5 * (rate + self.rates[prev]) * dt
+            else:
+                self.yaws[i] = 0.0
+            self.times[i] = timestamp_ns
+            self.rates[i] = rate
+            self.count += 1
+
+    def snapshot(self):
+        # Samples in time order as (times, rates, yaws) copies.
+        with self.lock:
+            n = min(self.count, self.capacity)
+            start = self.count % self.capacity if self.count > self.capacity else 0
+            order = (np.arange(n) + start) % self.capacity
+            return self.times[order], self.rates[order], self.yaws[order]
+
+    def yaw_at(self, times_ns, history=None):
+        # Integrated yaw (rad) at each time. Beyond the newest sample the last
+        # rate is extrapolated (the IMU message may not have arrived yet);
+        # returns None if the history does not reach back to the first time.
+        times, rates, yaws = history if history is not None else self.snapshot()
+        times_ns = np.asarray(times_ns, dtype=np.int64)
+        if len(times) < 2 or times_ns.min() < times[0]:
+            return None
+        # Relative float seconds keep precision that float ns would lose.
+        base = times[0]
+        t = (times_ns - base) * 1e-9
+        sample_t = (times - base) * 1e-9
+        yaw = np.interp(t, sample_t, yaws)
+        late = t > sample_t[-1]
+        if late.any():
+            yaw[late] = yaws[-1] + rates[-1] * (t[late] - sample_t[-1])
+        return yaw
+
+class Deskewer:
+    def __init__(self, history, max_gap=0.1):
+        self.history = history
+        self.max_gap = max_gap  # Seconds of IMU silence before the sweep ends that we still bridge
+        self.corrected = 0
+        self.skipped = 0
+
+    def __call__(self, stamp, frequency, angles):
+        # stamp: sweep start (ns). Returns corrected angles, or None without
+        # IMU coverage (the raw scan is still published).
+        if len(angles) == 0 or frequency <= 0:
+            self.skipped += 1
+            return None
+        period = 1.0 / frequency
+        history = self.history.snapshot()
+        if len(history[0]) < 2 or (stamp + period * 1e9 - history[0][-1]) * 1e-9 > self.max_gap:
+            self.skipped += 1
+            return None
+        # Fraction of the sweep at which each point was measured, from its
+        # angle relative to the first point (angles increase over the sweep).
+        fraction = np.mod(angles - angles[0], 2.0 * np.pi) * (1.0 / (2.0 * np.pi))
+        point_times = stamp + (fraction * (period * 1e9)).astype(np.int64)
+        end = stamp + int(period * 1e9)
+        yaw = self.history.yaw_at(np.append(point_times, end), history)
+        if yaw is None:
+            self.skipped += 1
+            return None
+        corrected = angles + (yaw[:-1] - yaw[-1]).astype(np.float32)
+        self.corrected += 1
+        return (np.mod(corrected + np.pi, 2.0 * np.pi) - np.pi).astype(np.float32)
+
+class ImuFeed:
+    # Turns IMU messages into ImuHistory samples. Preferred source is the
+    # imu_batch stream (imu.py --fifo): every FIFO sample with its own
+    # timestamp, raw gyro z minus `bias` (deg/s, from the IMU calibration).
+    # The decimated JSON imu stream (20 Hz by default) is only used while no
+    # batch has arrived for `fallback_after` seconds; its "yaw_rate" is the
+    # mean since the previous message, so each entry still covers its
+    # interval. Uses the message "timestamp" (ns) when present, otherwise
+    # the receive time.
+    def __init__(self, history, sign=1.0, bias=0.0, fallback_after=1.0):
+        self.history = history
+        self.sign = sign
+        self.bias = bias
+        self.fallback_after = fallback_after
+        self.last_batch = None
+        self.samples = 0
+        self.messages = 0
+
+    def batch(self, frame):
+        batch = decode_batch(frame)
+        rates = np.radians((batch.gyro[:, 2].astype(np.float64) - self.bias) * self.sign)
+        for timestamp, rate in zip(batch.timestamps.tolist(), rates.tolist()):
+            self.history.append(timestamp, rate)
+        self.samples += len(rates)
+        self.last_batch = time.monotonic()
+
+    def message(self, imu):
+        if self.last_batch is not None and time.monotonic() - self.last_batch < self.fallback_after:
+            return
+        rate = imu.get("yaw_rate")  # deg/s, mean since the previous message
+        if rate is None:
+            return
+        timestamp = imu.get("timestamp") or time.time_ns()
+        self.history.append(int(timestamp), self.sign * math.radians(rate))
+        self.messages += 1
+
+class ImuListener(threading.Thread):
+    # Feeds ImuHistory from the imu_batch and imu streams (see ImuFeed).
+    def __init__(self, batch_socket, socket, history, stop_event, sign=1.0, bias=0.0):
+        super().__init__(name="lidar-imu", daemon=True)
+        self.batch_socket = batch_socket
+        self.socket = socket
+        self.feed = ImuFeed(history, sign, bias)
+        self.stop_event = stop_event
+
+    def run(self):
+        poller = zmq.Poller()
+        poller.register(self.batch_socket, zmq.POLLIN)
+        poller.register(self.socket, zmq.POLLIN)
+        while not self.stop_event.is_set():
+            events = dict(poller.poll(200))
+            if self.batch_socket in events:
+                self.feed.batch(self.batch_socket.recv())
+            if self.socket in events:
+                self.feed.message(json.loads(self.socket.recv()))
+        self.batch_socket.close(linger=0)
+        self.socket.close(linger=0)
@@ -0,0 +1,144 @@
+# Stand-in for the parts of the YDLIDAR SDK python module that lidar.py uses,
+# so the node can run without the device:  python3 lidar.py --fake
+#
+# Scans come from a simulated rectangular room with a box in it, paced by the
+# configured scan frequency and sample rate like the real driver.
+import math
+import time
+import numpy as np
+
+LidarPropSerialPort = "serial_port"
+LidarPropSerialBaudrate = "serial_baudrate"
+LidarPropLidarType = "lidar_type"
+LidarPropDeviceType = "device_type"
+LidarPropScanFrequency = "scan_frequency"
+LidarPropSampleRate = "sample_rate"
+LidarPropSingleChannel = "single_channel"
+LidarPropMaxAngle = "max_angle"
+LidarPropMinAngle = "min_angle"
+LidarPropMaxRange = "max_range"
+LidarPropMinRange = "min_range"
+LidarPropIntenstiy = "intensity"
+
+TYPE_TRIANGLE = 1
+YDLIDAR_TYPE_SERIAL = 0
+
+def os_init():
+    pass
+
+def os_isOk():
+    return True
+
+def lidarPortList():
+    return {"fake": "/dev/fake_lidar"}
+
+class LaserPoint:
+    def __init__(self, angle, range_, intensity=0.0):
+        self.angle = angle
+        self.range = range_
+        self.intensity = intensity
+
+class LaserConfig:
+    def __init__(self):
+        self.min_angle = -math.pi
+        self.max_angle = math.pi
+        self.angle_increment = 0.0
+        self.time_increment = 0.0
+        self.scan_time = 0.0
+        self.min_range = 0.0
+        self.max_range = 0.0
+
+class LaserScan:
+    def __init__(self):
+        self.stamp = 0
+        self.config = LaserConfig()
+        self.points = []
+
+def room_ranges(angles, heading=0.0, half_width=3.0, half_depth=4.5, x=0.0, y=0.0):
+    # Ray/rectangle intersection for a sensor at (x, y) from the room centre,
+    # plus a 0.6 m box at (1.5, 1.0) so scans are not perfectly symmetric.
+    world = angles + heading
+    c = np.cos(world)
+    s = np.sin(world)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        tx = np.where(np.abs(c) > 1e-9, (np.sign(c) * half_depth - x) / c, np.inf)
+        ty = np.where(np.abs(s) > 1e-9, (np.sign(s) * half_width - y) / s, np.inf)
+    ranges = np.minimum(tx, ty)
+
+    box_x, box_y, box_r = 1.5 - x, 1.0 - y, 0.3
+    proj = box_x * c + box_y * s
+    dist2 = box_x ** 2 + box_y ** 2 - proj ** 2
+    hit = (proj > 0) & (dist2 < box_r ** 2)
+    box_range = proj - np.sqrt(np.maximum(box_r ** 2 - dist2, 0.0))
+    return np.where(hit, np.minimum(ranges, box_range), ranges)
+
+class CYdLidar:
+    def __init__(self):
+        self.options = {
+            LidarPropScanFrequency: 6.0,
+            LidarPropSampleRate: 5,
+            LidarPropMinAngle: -180.0,
+            LidarPropMaxAngle: 180.0,
+            LidarPropMinRange: 0.12,
+            LidarPropMaxRange: 10.0,
+        }
+        self.scanning = False
+        self.next_scan = 0.0
+        self.heading = 0.0
+        # Angular velocity of the simulated robot in rad/s (0 = standing still).
+        self.yaw_rate = 0.0
+        self.noise = 0.01
+        self.dropout = 0.03
+
+    def setlidaropt(self, option, value):
+        self.options[option] = value
+        return True
+
+    def initialize(self):
+        return True
+
+    def turnOn(self):
+        self.scanning = True
+        self.next_scan = time.monotonic()
+        return True
+
+    def turnOff(self):
+        self.scanning = False
+        return True
+
+    def disconnecting(self):
+        pass
+
+    def doProcessSimple(self, scan):
+        if not self.scanning:
+            return False
+        frequency = float(self.options[LidarPropScanFrequency])
+        period = 1.0 / frequency
+        # Block until the simulated revolution completes, like the real driver.
+        self.next_scan += period
+        delay = self.next_scan - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+        else:
+            self.next_scan = time.monotonic()
+
+        count = int(self.options[LidarPropSampleRate] * 1000 / frequency)
+        min_angle = math.radians(self.options[LidarPropMinAngle])
+        max_angle = math.radians(self.options[LidarPropMaxAngle])
+        angles = np.linspace(min_angle, max_angle, count, endpoint=False)
+        # The sensor keeps turning during the sweep, so each point sees its own heading.
+        headings = self.heading + self.yaw_rate * period * np.arange(count) / count
+        self.heading += self.yaw_rate * period
+        ranges = room_ranges(angles, headings) + np.random.normal(0.0, self.noise, count)
+        out_of_range = (ranges < self.options[LidarPropMinRange]) | (ranges > self.options[LidarPropMaxRange])
+        ranges[out_of_range | (np.random.rand(count) < self.dropout)] = 0.0
+
+        # Like the SDK, stamp the first point of the sweep.
+        scan.stamp = time.time_ns() - int(period * 1e9)
+        scan.config.scan_time = period
+        scan.config.time_increment = period / count
+        scan.config.angle_increment = (max_angle - min_angle) / count
+        scan.config.min_angle = min_angle
+        scan.config.max_angle = max_angle
+        scan.points = [LaserPoint(float(a), float(r)) for a, r in zip(angles, ranges)]
+        return True
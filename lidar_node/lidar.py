@@ -1,16 +1,20 @@
+import argparse
 import os
-import ydlidar
-import zmq
-import json
-import time
+import signal
+import sys
+import threading
 
-if __name__ == "__main__":
-    # Initialize ZeroMQ Publisher
-    context = zmq.Context()
-    publisher = context.socket(zmq.PUB)
-    publisher.bind("tcp://*:5556")  # Port for LiDAR data
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "imu_node"))
+from common import transport
+from common.lidar_codec import DeltaEncoder
+from common.metrics import Metrics
+from acquisition import ScanAcquirer, ScanCounters, ScanPublisher, ScanRing
+from calibration import load_calibration
+from deskew import Deskewer, ImuHistory, ImuListener
+from scan_reduce import ScanReducer, TIERS, topic_for
 
-    # Initialize LiDAR
+def open_laser(ydlidar):
     ydlidar.os_init()
     ports = ydlidar.lidarPortList()
     port = "/dev/ttyUSB0"
@@ -39,26 +43,130 @@ if __name__ == "__main__":
     if not laser.turnOn():
         print("Failed to start LiDAR scanning.")
         exit(1)
+    return laser
 
-    scan = ydlidar.LaserScan()
-    print("LiDAR scanning started...")
+def add_scan_arguments(parser):
+    # Tier, filter and coding options, shared with the sensor runtime.
+    parser.add_argument("--quantize", action="store_true",
+                        help="Send angles/ranges as uint16 (ranges in mm) instead of float32")
+    parser.add_argument("--tiers", default="full,1deg,5deg",
+                        help="Comma-separated resolution tiers to publish, each on topic lidar/<tier> ({})".format(
+                            ", ".join(TIERS)))
+    parser.add_argument("--min-range", type=float, default=0.12, help="Drop returns closer than this (m)")
+    parser.add_argument("--max-range", type=float, default=10.0, help="Drop returns farther than this (m)")
+    parser.add_argument("--median", type=int, default=0, help="Median filter window in bins for binned tiers (0 = off)")
+    parser.add_argument("--temporal", type=float, default=0.0,
+                        help="Per-bin smoothing factor across scans for binned tiers (0 = off, 1 = no smoothing)")
+    parser.add_argument("--delta", default="",
+                        help="Binned tier to also send as keyframes + deltas on topic lidar/delta/<tier> (e.g. 1deg)")
+    parser.add_argument("--delta-compression", choices=["none", "zlib", "lz4"], default="zlib")
+    parser.add_argument("--delta-threshold", type=int, default=20, help="Range change in mm that counts as changed")
+    parser.add_argument("--keyframe-interval", type=int, default=12, help="Scans between keyframes")
+
+def scan_pipeline(args, imu_history=None):
+    # ScanSender arguments for the add_scan_arguments options:
+    # (reducer, raw_topics, delta, deskew). Deskewed tiers need an IMU history.
+    tiers = [tier.strip() for tier in args.tiers.split(",") if tier.strip()]
+    delta = {}
+    if args.delta:
+        if not TIERS.get(args.delta):
+            raise ValueError("Delta coding needs a binned tier, not: {}".format(args.delta))
+        compression = None if args.delta_compression == "none" else args.delta_compression
+        encoder = DeltaEncoder(args.keyframe_interval, args.delta_threshold, compression)
+        delta[topic_for(args.delta)] = (b"lidar/delta/" + args.delta.encode(), encoder)
+    raw_topics = set(topic_for(tier) for tier in tiers)
+    reduce_tiers = tiers + [args.delta] if args.delta and args.delta not in tiers else tiers
+    reducer = ScanReducer(tuple(reduce_tiers), args.min_range, args.max_range,
+                          median_window=args.median, temporal_alpha=args.temporal)
+    deskew = None
+    if imu_history is not None:
+        deskew = (Deskewer(imu_history), ScanReducer(tuple(tiers), args.min_range, args.max_range,
+                                                     median_window=args.median, temporal_alpha=args.temporal))
+    return reducer, raw_topics, delta, deskew
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--fake", action="store_true", help="Use the simulated LiDAR in fake_ydlidar.py")
+    parser.add_argument("--fake-yaw-rate", type=float, default=0.0,
+                        help="Rotation of the simulated LiDAR in rad/s (with --fake)")
+    parser.add_argument("--policy", choices=["all", "latest"], default="all",
+                        help="all: publish every scan; latest: publish the newest scan at --rate")
+    parser.add_argument("--rate", type=float, default=10.0, help="Publish rate in Hz for the latest policy")
+    parser.add_argument("--ring", type=int, default=64, help="Scans buffered between acquisition and publishing")
+    add_scan_arguments(parser)
+    parser.add_argument("--deskew", action="store_true",
+                        help="Also publish IMU motion-compensated tiers on lidar/deskewed/<tier>")
+    parser.add_argument("--imu-sign", type=float, default=1.0,
+                        help="Sign applied to the IMU z rate (-1 if the IMU z axis points down)")
+    parser.add_argument("--imu-calibration", default=None,
+                        help="IMU calibration whose gyro bias is taken off the imu_batch samples "
+                             "(default: the one imu.py loads)")
+    args = parser.parse_args()
+
+    if args.fake:
+        import fake_ydlidar as ydlidar
+    else:
+        import ydlidar
 
-    while laser.doProcessSimple(scan) and ydlidar.os_isOk():
-        if scan.config.scan_time == 0.0:
-            scan_time = 1
-        else:
-            scan_time = scan.config.scan_time
+    # Initialize ZeroMQ Publisher
+    context = transport.make_context()
+    publisher = transport.publisher(context, "lidar")  # tcp://*:5556 by default
 
-        scan_data = {
-            "timestamp": scan.stamp,
-            "scan_frequency": 1.0 / scan_time,
-            "points": [{"angle": p.angle, "range": p.range} for p in scan.points]
-        }
+    # Initialize LiDAR
+    laser = open_laser(ydlidar)
+    if args.fake:
+        laser.yaw_rate = args.fake_yaw_rate
+    print("LiDAR scanning started...")
 
-        publisher.send_json(scan_data)
-        print(f"Sent LiDAR data with {len(scan.points)} points", end="\r")
+    # Acquisition and publishing run on their own threads (see acquisition.py)
+    metrics = Metrics("lidar", context)
+    counters = ScanCounters()
+    ring = ScanRing(args.ring, counters)
+    stop_event = threading.Event()
+    imu_history = None
+    if args.deskew:
+        # The IMU history is filled on its own thread with every FIFO sample
+        # from imu_batch (imu.py --fifo), else from the decimated imu stream.
+        calibration, calibration_file = load_calibration(args.imu_calibration)
+        print("IMU calibration for deskew:", calibration_file or "none, zero gyro bias")
+        imu_history = ImuHistory()
+        imu_listener = ImuListener(transport.subscriber(context, "imu_batch"), transport.subscriber(context, "imu"),
+                                   imu_history, stop_event, args.imu_sign, float(calibration.gyro_bias[2]))
+        imu_listener.start()
+    try:
+        reducer, raw_topics, delta, deskew = scan_pipeline(args, imu_history)
+    except ValueError as e:
+        print(e)
+        exit(1)
+    acquirer = ScanAcquirer(laser, ydlidar.LaserScan(), ring, counters, ydlidar.os_isOk, stop_event)
+    scan_publisher = ScanPublisher(lambda topic, frame: publisher.send_multipart([topic, frame], copy=False),
+                                   ring, counters, stop_event, reducer,
+                                   policy=args.policy, rate=args.rate, quantize=args.quantize,
+                                   raw_topics=raw_topics, delta=delta, deskew=deskew, metrics=metrics,
+                                   acquirer=acquirer)
+    acquirer.start()
+    scan_publisher.start()
+    # supervisor.py stops nodes with SIGTERM: shut down as on Ctrl+C
+    signal.signal(signal.SIGTERM, lambda *_: stop_event.set())
 
-        time.sleep(0.05)
+    try:
+        while not stop_event.is_set():
+            stop_event.wait(1.0)
+            c = counters
+            deskewed = f" deskewed={deskew[0].corrected}" if deskew else ""
+            print(f"LiDAR scans acquired={c.acquired} published={c.published} "
+                  f"dropped={c.dropped} superseded={c.superseded} queued={len(ring)}{deskewed}", end="\r")
+            for name, total in c.as_dict().items():
+                metrics.set_count(name, total)
+            metrics.gauge("queued", len(ring))
+            if deskew:
+                metrics.set_count("deskewed", deskew[0].corrected)
+            metrics.publish()
+    except KeyboardInterrupt:
+        pass
 
+    stop_event.set()
+    acquirer.join(timeout=2.0)
+    scan_publisher.join(timeout=5.0)  # "all" sends the scans still queued first
     laser.turnOff()
     laser.disconnecting()
@@ -0,0 +1,100 @@
+import numpy as np
+
+# Source-side scan reduction. Every stage works on whole angle/range arrays.
+#
+#   full  - all valid points (0-range and out-of-range returns removed)
+#   1deg  - 360-bin polar profile, minimum range per bin
+#   5deg  - 72-bin polar profile, minimum range per bin
+#
+# Binned tiers always have a fixed grid: angles are bin centres over
+# [-pi, pi) and empty bins have range 0, so consumers can index bins directly.
+
+TIERS = {"full": None, "1deg": 1.0, "5deg": 5.0}
+
+def topic_for(tier):
+    return b"lidar/" + tier.encode()
+
+def valid_points(angles, ranges, min_range=0.12, max_range=10.0):
+    keep = (ranges >= min_range) & (ranges <= max_range)
+    return angles[keep], ranges[keep]
+
+def bin_centers(bin_deg):
+    n = int(round(360.0 / bin_deg))
+    width = 2.0 * np.pi / n
+    return (-np.pi + (np.arange(n) + 0.5) * width).astype(np.float32)
+
+def bin_min(angles, ranges, bin_deg):
+    # Minimum range per angular bin. Sort by bin once and reduce each run of
+    # equal bins with np.minimum.reduceat (no per-point Python work).
+    n = int(round(360.0 / bin_deg))
+    out = np.zeros(n, dtype=np.float32)
+    if len(ranges) == 0:
+        return out
+    idx = ((angles + np.pi) * (n / (2.0 * np.pi))).astype(np.intp) % n
+    order = np.argsort(idx, kind="stable")
+    idx = idx[order]
+    starts = np.flatnonzero(np.r_[True, idx[1:] != idx[:-1]])
+    out[idx[starts]] = np.minimum.reduceat(ranges[order], starts)
+    return out
+
+def median_filter(binned, window=3):
+    # Circular median over neighbouring bins, ignoring empty bins.
+    if window <= 1:
+        return binned
+    half = window // 2
+    values = np.where(binned > 0, binned, np.nan)
+    padded = np.concatenate((values[-half:], values, values[:half]))
+    windows = np.lib.stride_tricks.sliding_window_view(padded, window)
+    # NaNs sort last, so the median of the valid values in each window sits at
+    # index (valid - 1) // 2 of the sorted row. Much cheaper than np.nanmedian.
+    ordered = np.sort(windows, axis=1)
+    valid = np.count_nonzero(~np.isnan(windows), axis=1)
+    filtered = ordered[np.arange(len(binned)), np.maximum(valid - 1, 0) // 2]
+    # Keep bins empty where the scan had no return at all.
+    return np.where(binned > 0, filtered, 0.0).astype(np.float32)
+
+class TemporalFilter:
+    # Per-bin exponential smoothing across scans. A bin that is empty in the
+    # current scan is output empty; a bin that just appeared is not smoothed.
+    def __init__(self, alpha):
+        self.alpha = alpha
+        self.state = None
+
+    def __call__(self, binned):
+        if self.state is None or self.state.shape != binned.shape:
+            self.state = binned.copy()
+            return binned
+        both = (binned > 0) & (self.state > 0)
+        smoothed = np.where(both, self.alpha * binned + (1.0 - self.alpha) * self.state, binned)
+        self.state = smoothed.astype(np.float32)
+        return self.state
+
+class ScanReducer:
+    def __init__(self, tiers=("full", "1deg", "5deg"), min_range=0.12, max_range=10.0,
+                 median_window=0, temporal_alpha=0.0):
+        for tier in tiers:
+            if tier not in TIERS:
+                raise ValueError("Unknown LiDAR tier: {}".format(tier))
+        self.tiers = tiers
+        self.min_range = min_range
+        self.max_range = max_range
+        self.median_window = median_window
+        self.temporal = {tier: TemporalFilter(temporal_alpha) for tier in tiers if temporal_alpha > 0}
+        self.centers = {tier: bin_centers(TIERS[tier]) for tier in tiers if TIERS[tier]}
+
+    def reduce(self, angles, ranges):
+        # Returns [(topic, angles, ranges), ...] for each configured tier.
+        angles, ranges = valid_points(angles, ranges, self.min_range, self.max_range)
+        out = []
+        for tier in self.tiers:
+            bin_deg = TIERS[tier]
+            if bin_deg is None:
+                out.append((topic_for(tier), angles, ranges))
+                continue
+            binned = bin_min(angles, ranges, bin_deg)
+            if self.median_window > 1:
+                binned = median_filter(binned, self.median_window)
+            if tier in self.temporal:
+                binned = self.temporal[tier](binned)
+            out.append((topic_for(tier), self.centers[tier], binned))
+        return out
@@ -1,32 +1,82 @@
-import serial
-import zmq
-import json
-
-# Initialize ZeroMQ Publisher
-context = zmq.Context()
-publisher = context.socket(zmq.PUB)
-publisher.bind("tcp://*:5556")  # Different port for LiDAR data
-
-# Initialize LiDAR
-lidar = serial.Serial('/dev/ttyUSB0', 128000, timeout=1)
-lidar.write(b'\xA5\x60')  # Start scanning
-
-print("LiDAR Publisher Started on tcp://*:5556")
-
-while True:
-    lidar_data = []
-    for _ in range(360):  # Read 360 degrees
-        line = lidar.readline().decode().strip()
-        if line:
-            lidar_data.append(line)
-
-    # Create and send message
-    message = {
-        "lidar": lidar_data
-    }
-    publisher.send_json(message)
-
-    print(f"Sent {len(lidar_data)} LiDAR points", end="\r")
-
-lidar.write(b'\xA5\x65')  # Stop scanning
-lidar.close()
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from common import transport
+from common.lidar_frame import encode_scan
+from scan_reduce import ScanReducer
+from ydlidar_raw import RawScanReader, START_SCAN, STOP_SCAN
+
+# LiDAR publisher that talks the raw serial protocol instead of using the SDK
+# (see ydlidar_raw.py). Can record the raw byte stream and replay it later:
+#
+#   python3 test.py --record scan_dump.bin
+#   python3 test.py --replay scan_dump.bin
+
+class RecordingStream:
+    # Passes reads through and appends every byte read to a dump file.
+    def __init__(self, stream, path):
+        self.stream = stream
+        self.dump = open(path, "wb")
+
+    def readinto(self, view):
+        n = self.stream.readinto(view) or 0
+        self.dump.write(view[:n])
+        return n
+
+    def close(self):
+        self.dump.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--port", default="/dev/ttyUSB0")
+    parser.add_argument("--baud", type=int, default=128000)
+    parser.add_argument("--record", help="Also write the raw serial bytes to this file")
+    parser.add_argument("--replay", help="Read raw bytes from a recorded dump instead of the serial port")
+    parser.add_argument("--replay-hz", type=float, default=6.0, help="Scan rate when replaying (0 = as fast as possible)")
+    parser.add_argument("--tiers", default="full,1deg,5deg")
+    args = parser.parse_args()
+
+    # Initialize ZeroMQ Publisher
+    context = transport.make_context()
+    publisher = transport.publisher(context, "lidar")
+    reducer = ScanReducer(tuple(tier.strip() for tier in args.tiers.split(",") if tier.strip()))
+
+    # Initialize LiDAR
+    lidar = None
+    if args.replay:
+        stream = open(args.replay, "rb")
+        print("Replaying raw LiDAR dump:", args.replay)
+    else:
+        import serial
+        lidar = serial.Serial(args.port, args.baud, timeout=1)
+        lidar.write(START_SCAN)  # Start scanning
+        stream = lidar
+        if args.record:
+            stream = RecordingStream(lidar, args.record)
+            print("Recording raw bytes to", args.record)
+
+    print("LiDAR Publisher Started on", transport.endpoint("lidar", bind=True))
+
+    reader = RawScanReader(stream, eof_on_empty=bool(args.replay))  # serial reads time out after 1 s
+    scan_count = 0
+    try:
+        for angles, ranges in reader.scans():
+            scan_count += 1
+            stamp = time.time_ns()
+            for topic, tier_angles, tier_ranges in reducer.reduce(angles, ranges):
+                publisher.send_multipart([topic, encode_scan(tier_angles, tier_ranges, stamp)], copy=False)
+            print(f"Sent scan {scan_count} with {len(ranges)} points "
+                  f"({reader.packets} packets, {reader.bad_checksums} rejected)", end="\r")
+            if args.replay and args.replay_hz > 0:
+                time.sleep(1.0 / args.replay_hz)
+    except KeyboardInterrupt:
+        pass
+
+    if lidar is not None:
+        lidar.write(STOP_SCAN)  # Stop scanning
+        lidar.close()
+    if isinstance(stream, RecordingStream):
+        stream.close()
@@ -0,0 +1,165 @@
+import struct
+import numpy as np
+
+# Reader for the raw YDLIDAR triangle-lidar serial protocol (X2/X4 family),
+# for running without the SDK.
+#
+# After the start command (A5 60) the device answers with a 7 byte response
+# descriptor and then streams scan packets:
+#
+#   PH(2) = AA 55 | CT(1) | LSN(1) | FSA(2) | LSA(2) | CS(2) | LSN x Si(2)
+#
+#   CT bit 0   1 marks the first packet of a new revolution
+#   LSN        number of samples in the packet
+#   FSA, LSA   first/last sample angle: (value >> 1) / 64 degrees
+#   CS         XOR of all 16-bit words: PH, CT|LSN, FSA, LSA and every Si
+#   Si         distance * 4 in mm (0 = no return)
+#
+# Sample angles are spread evenly between FSA and LSA and then corrected for
+# the triangulation geometry:
+#   AngCorrect = atan(21.8 * (155.3 - d) / (155.3 * d))   (d in mm, 0 if d == 0)
+#
+# Scans come out as the SDK path produces them (see common/lidar_frame.py):
+# float32 angles in radians over [-pi, pi) and float32 ranges in metres.
+
+START_SCAN = b"\xA5\x60"
+STOP_SCAN = b"\xA5\x65"
+
+PACKET_HEADER = struct.Struct("<HBBHHH")
+HEADER_SIZE = PACKET_HEADER.size  # 10 bytes
+PH = 0x55AA
+
+class RawScanReader:
+    def __init__(self, stream, chunk_size=4096, buffer_size=65536, eof_on_empty=True):
+        # `stream` only needs read(n) (a serial.Serial, an open dump file, ...);
+        # readinto() is used when available to fill the buffer in place.
+        # An empty read ends a dump; on a serial port it is only a read
+        # timeout (a quiet link), so pass eof_on_empty=False to keep reading.
+        self.stream = stream
+        self.eof_on_empty = eof_on_empty
+        self.chunk_size = chunk_size
+        self.buf = bytearray(buffer_size)
+        self.fill = 0
+        self.packets = 0
+        self.bad_checksums = 0
+        # Samples of the revolution being assembled, as per-packet arrays.
+        self.scan_angles = []
+        self.scan_distances = []
+
+    def _read_more(self):
+        if self.fill + self.chunk_size > len(self.buf):
+            self.buf.extend(bytes(self.chunk_size))
+        view = memoryview(self.buf)[self.fill:self.fill + self.chunk_size]
+        readinto = getattr(self.stream, "readinto", None)
+        if readinto is not None:
+            n = readinto(view) or 0
+        else:
+            data = self.stream.read(self.chunk_size)
+            n = len(data)
+            view[:n] = data
+        view.release()
+        self.fill += n
+        return n
+
+    def _parse(self):
+        # Parse all complete packets in the buffer. Returns finished scans.
+        scans = []
+        data = np.frombuffer(self.buf, dtype=np.uint8, count=self.fill)
+        candidates = np.flatnonzero((data[:-1] == 0xAA) & (data[1:] == 0x55))
+        consumed = 0
+        keep_from = None
+        for start in candidates:
+            start = int(start)
+            if start < consumed:
+                continue  # Inside a packet we already decoded
+            if start + HEADER_SIZE > self.fill:
+                keep_from = start
+                break
+            _, ct, lsn, fsa, lsa, cs = PACKET_HEADER.unpack_from(self.buf, start)
+            end = start + HEADER_SIZE + 2 * lsn
+            if end > self.fill:
+                keep_from = start  # Wait for the rest of this packet
+                break
+            samples = np.frombuffer(self.buf, dtype="<u2", count=lsn, offset=start + HEADER_SIZE)
+            check = PH ^ (ct | (lsn << 8)) ^ fsa ^ lsa
+            if lsn:
+                check ^= int(np.bitwise_xor.reduce(samples))
+            if check != cs or not (fsa & 1 and lsa & 1):
+                # Not a real packet start (or corrupted); try the next candidate.
+                self.bad_checksums += 1
+                continue
+            self.packets += 1
+            consumed = end
+
+            if ct & 0x01 and self.scan_distances:
+                scans.append(self._finish_scan())
+            first = (fsa >> 1) / 64.0
+            last = (lsa >> 1) / 64.0
+            span = last - first
+            if span < 0:
+                span += 360.0
+            if lsn > 1:
+                angles = first + np.arange(lsn, dtype=np.float32) * np.float32(span / (lsn - 1))
+            else:
+                angles = np.full(lsn, first, dtype=np.float32)
+            self.scan_angles.append(angles)
+            self.scan_distances.append(samples.astype(np.float32) * np.float32(0.25))
+
+        # Keep the unparsed tail (a partial packet, or a lone trailing 0xAA that
+        # may start the next header) at the front of the buffer.
+        if keep_from is None:
+            keep_from = max(consumed, self.fill - 1)
+        del data
+        tail = self.fill - keep_from
+        self.buf[:tail] = self.buf[keep_from:self.fill]
+        self.fill = tail
+        return scans
+
+    def _finish_scan(self):
+        degrees = np.concatenate(self.scan_angles)
+        distances = np.concatenate(self.scan_distances)
+        self.scan_angles = []
+        self.scan_distances = []
+        # Vectorized triangulation angle correction over the whole revolution.
+        with np.errstate(divide="ignore", invalid="ignore"):
+            correction = np.degrees(np.arctan(21.8 * (155.3 - distances) / (155.3 * distances)))
+        degrees = degrees + np.where(distances > 0, correction, 0.0)
+        radians = np.radians(degrees)
+        angles = (np.mod(radians + np.pi, 2.0 * np.pi) - np.pi).astype(np.float32)
+        ranges = (distances * 0.001).astype(np.float32)
+        return angles, ranges
+
+    def scans(self):
+        # Generator of (angles, ranges) per revolution until the stream ends.
+        while True:
+            if self._read_more() == 0:
+                if self.eof_on_empty:
+                    return
+                continue
+            for scan in self._parse():
+                yield scan
+
+def encode_packet(fsa_deg, lsa_deg, distances_mm, start=False):
+    # Build one packet; used to synthesize dumps for testing and benchmarks.
+    samples = (np.asarray(distances_mm, dtype=np.float64) * 4.0).astype("<u2")
+    ct = 0x01 if start else 0x00
+    lsn = len(samples)
+    fsa = (int(round(fsa_deg * 64.0)) << 1) | 1
+    lsa = (int(round(lsa_deg * 64.0)) << 1) | 1
+    cs = PH ^ (ct | (lsn << 8)) ^ fsa ^ lsa
+    if lsn:
+        cs ^= int(np.bitwise_xor.reduce(samples))
+    return PACKET_HEADER.pack(PH, ct, lsn, fsa, lsa, cs) + samples.tobytes()
+
+def encode_revolution(distances_mm, samples_per_packet=40):
+    # One revolution as packets: a start packet followed by data packets
+    # covering 0..360 degrees evenly.
+    n = len(distances_mm)
+    step = 360.0 / n
+    packets = [encode_packet(0.0, 0.0, distances_mm[:1], start=True)]
+    for i in range(1, n, samples_per_packet):
+        chunk = distances_mm[i:i + samples_per_packet]
+        first = i * step
+        last = (i + len(chunk) - 1) * step
+        packets.append(encode_packet(first, last, chunk))
+    return b"".join(packets)
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+# Time occupancy grid updates on synthetic scans: the precomputed ray table
+# path used by mapping.py against a per-ray Python Bresenham baseline, plus
+# the changed-tile encoding that follows each update.
+#
+#   python3 mapping_node/bench_mapping.py [--bins 360] [--scans 300] [--resolution 0.05]
+import argparse
+import os
+import sys
+import time
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "lidar_node"))
+from common.map_tiles import encode_tiles
+from fake_ydlidar import room_ranges
+from occupancy import L_FREE, L_MAX, L_MIN, L_OCC, OccupancyGrid
+
+SCAN_FREQUENCY = 6.0
+
+def make_scans(bins, count, yaw_rate):
+    angles = -np.pi + (np.arange(bins) + 0.5) * (2.0 * np.pi / bins)
+    scans = []
+    for i in range(count):
+        heading = yaw_rate * i / SCAN_FREQUENCY
+        ranges = (room_ranges(angles, heading) + np.random.normal(0.0, 0.01, bins)).astype(np.float32)
+        ranges[np.random.rand(bins) < 0.03] = 0.0
+        scans.append(ranges)
+    return scans
+
+def bresenham_update(grid, ranges):
+    # Reference implementation: one Python loop per ray and per cell.
+    bins = len(ranges)
+    col0, row0 = grid.cell(0.0, 0.0)
+    for i, r in enumerate(ranges):
+        if r <= 0 or r > grid.max_range:
+            continue
+        angle = -np.pi + (i + 0.5) * (2.0 * np.pi / bins)
+        col1 = col0 + int(round(np.cos(angle) * r / grid.resolution))
+        row1 = row0 + int(round(np.sin(angle) * r / grid.resolution))
+        dx, dy = abs(col1 - col0), -abs(row1 - row0)
+        sx, sy = (1 if col1 > col0 else -1), (1 if row1 > row0 else -1)
+        err = dx + dy
+        x, y = col0, row0
+        while (x, y) != (col1, row1):
+            if 0 <= x < grid.width and 0 <= y < grid.height:
+                grid.grid[y, x] = max(L_MIN, grid.grid[y, x] + L_FREE)
+            e2 = 2 * err
+            if e2 >= dy:
+                err += dy
+                x += sx
+            if e2 <= dx:
+                err += dx
+                y += sy
+        if 0 <= col1 < grid.width and 0 <= row1 < grid.height:
+            grid.grid[row1, col1] = min(L_MAX, grid.grid[row1, col1] + L_OCC)
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--bins", type=int, default=360, help="Rays per scan (360 = lidar/1deg)")
+    parser.add_argument("--scans", type=int, default=300)
+    parser.add_argument("--resolution", type=float, default=0.05)
+    parser.add_argument("--size", type=float, default=20.0)
+    parser.add_argument("--yaw-rate", type=float, default=0.3, help="Rotation of the replay in rad/s")
+    args = parser.parse_args()
+
+    scans = make_scans(args.bins, args.scans, args.yaw_rate)
+    print("{} rays per scan, {} scans, {} m cells, scanner at {} Hz".format(
+        args.bins, args.scans, args.resolution, SCAN_FREQUENCY))
+
+    grid = OccupancyGrid(args.size, args.resolution)
+    start = time.perf_counter()
+    grid.table(args.bins)
+    print("ray table build: {:.1f} ms".format((time.perf_counter() - start) * 1e3))
+
+    update_time = tile_time = 0.0
+    tiles_sent = bytes_sent = 0
+    for seq, ranges in enumerate(scans):
+        heading = args.yaw_rate * seq / SCAN_FREQUENCY
+        start = time.perf_counter()
+        grid.update(ranges, (0.0, 0.0, heading))
+        update_time += time.perf_counter() - start
+        start = time.perf_counter()
+        tiles = grid.changed_tiles()
+        if len(tiles):
+            bytes_sent += len(encode_tiles(grid, tiles, seq))
+        tile_time += time.perf_counter() - start
+        tiles_sent += len(tiles)
+    per_scan = (update_time + tile_time) / len(scans)
+    print("ray table update:     {:8.2f} ms/scan".format(update_time / len(scans) * 1e3))
+    print("changed tiles+encode: {:8.2f} ms/scan ({:.1f} tiles, {:.0f} B per scan)".format(
+        tile_time / len(scans) * 1e3, tiles_sent / len(scans), bytes_sent / len(scans)))
+    print("total:                {:8.2f} ms/scan -> {:.0f} scans/s on one core ({:.1f}% of a core at {} Hz)".format(
+        per_scan * 1e3, 1.0 / per_scan, per_scan * SCAN_FREQUENCY * 100, SCAN_FREQUENCY))
+    print("full snapshot:        {} B for {} observed tiles".format(
+        len(encode_tiles(grid, grid.known_tiles(), 0, full=True)), len(grid.known_tiles())))
+
+    baseline = OccupancyGrid(args.size, args.resolution)
+    count = min(len(scans), 20)
+    start = time.perf_counter()
+    for ranges in scans[:count]:
+        bresenham_update(baseline, ranges)
+    print("python bresenham:     {:8.2f} ms/scan".format((time.perf_counter() - start) / count * 1e3))
+
+if __name__ == "__main__":
+    main()
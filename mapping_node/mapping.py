@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+# Local occupancy map from the LiDAR stream.
+#
+# Every scan of a binned tier updates a log-odds grid (occupancy.py). Tiles
+# whose cells changed are published as [b"map/tiles", frame] on the map stream
+# (tcp://*:5559 by default, frame format in common/map_tiles.py), and every
+# --snapshot seconds all observed tiles are sent as [b"map/full", frame].
+# With --use-pose each scan is placed at its odometry pose (pose stream).
+#
+#   python3 mapping.py [--lidar-tier 1deg] [--size 20] [--resolution 0.05]
+import argparse
+import os
+import sys
+import time
+from collections import deque
+import zmq
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from common import transport
+from common.lidar_frame import decode_scan, scan_arrays
+from common.map_tiles import encode_tiles
+from common.metrics import Metrics
+from occupancy import OccupancyGrid
+
+class MapPublisher:
+    def __init__(self, grid, publisher, snapshot, metrics):
+        self.grid = grid
+        self.publisher = publisher
+        self.snapshot = snapshot
+        self.metrics = metrics
+        self.next_snapshot = time.monotonic() + snapshot
+        self.seq = 0
+        self.scans = 0
+        self.update_time = 0.0
+        self.sent_bytes = 0
+
+    def send(self, topic, tiles, full=False):
+        self.seq += 1
+        message = encode_tiles(self.grid, tiles, self.seq, full=full)
+        self.publisher.send_multipart([topic, message], copy=False)
+        self.sent_bytes += len(message)
+        self.metrics.count("messages")
+        self.metrics.count("sent_bytes", len(message))
+
+    def map_scan(self, ranges, pose):
+        start = time.perf_counter()
+        self.grid.update(ranges, pose)
+        tiles = self.grid.changed_tiles()
+        elapsed = time.perf_counter() - start
+        self.update_time += elapsed
+        self.scans += 1
+        self.metrics.observe("update", elapsed)
+        self.metrics.count("scans")
+        self.metrics.gauge("changed_tiles", len(tiles))
+
+        with self.metrics.timer("publish"):
+            if len(tiles):
+                self.send(b"map/tiles", tiles)
+            if time.monotonic() >= self.next_snapshot:
+                self.send(b"map/full", self.grid.known_tiles(), full=True)
+                self.next_snapshot = time.monotonic() + self.snapshot
+
+        print("Scans mapped: {} ({:.2f} ms per scan, {} changed tiles, {:.1f} kB sent)".format(
+            self.scans, self.update_time / self.scans * 1e3, len(tiles), self.sent_bytes / 1e3),
+            end="\r", flush=True)
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--lidar-tier", choices=["1deg", "5deg"], default="1deg",
+                        help="Binned LiDAR tier to map from (lidar/<tier>)")
+    parser.add_argument("--size", type=float, default=20.0, help="Map side length in metres")
+    parser.add_argument("--resolution", type=float, default=0.05, help="Cell size in metres")
+    parser.add_argument("--tile-size", type=int, default=32, help="Tile side length in cells")
+    parser.add_argument("--max-range", type=float, default=10.0, help="Ignore returns farther than this (m)")
+    parser.add_argument("--snapshot", type=float, default=5.0, help="Seconds between full map snapshots")
+    parser.add_argument("--use-pose", action="store_true",
+                        help="Place scans with the odometry pose stream instead of mapping at the origin")
+    args = parser.parse_args()
+
+    grid = OccupancyGrid(args.size, args.resolution, args.tile_size, args.max_range)
+    print("Map {}x{} cells at {} m, {}x{} tiles".format(grid.width, grid.height, grid.resolution,
+                                                          grid.tiles_x, grid.tiles_y))
+
+    context = transport.make_context()
+    lidar_socket = transport.subscriber(context, "lidar", b"lidar/" + args.lidar_tier.encode())
+    publisher = transport.publisher(context, "map")  # tcp://*:5559 by default
+    poller = zmq.Poller()
+    poller.register(lidar_socket, zmq.POLLIN)
+    pose_socket = None
+    if args.use_pose:
+        # Scans wait here until odometry publishes the pose with their timestamp.
+        pose_socket = transport.subscriber(context, "pose")
+        poller.register(pose_socket, zmq.POLLIN)
+    pending = deque(maxlen=32)  # (timestamp, ranges)
+
+    metrics = Metrics("mapping", context)
+    mapper = MapPublisher(grid, publisher, args.snapshot, metrics)
+
+    try:
+        while True:
+            events = dict(poller.poll(100))
+            metrics.maybe_publish()
+            if lidar_socket in events:
+                topic, frame = lidar_socket.recv_multipart()
+                with metrics.timer("decode"):
+                    scan = decode_scan(frame)
+                    angles, ranges = scan_arrays(scan)
+                if pose_socket is None:
+                    mapper.map_scan(ranges, (0.0, 0.0, 0.0))
+                else:
+                    pending.append((scan.timestamp, ranges.copy()))
+
+            if pose_socket is not None and pose_socket in events:
+                pose = pose_socket.recv_json()
+                # Scans older than this pose never get one (e.g. odometry
+                # started later or dropped them); the matching one is mapped.
+                while pending and pending[0][0] <= pose["timestamp"]:
+                    timestamp, ranges = pending.popleft()
+                    if timestamp == pose["timestamp"]:
+                        mapper.map_scan(ranges, (pose["x"], pose["y"], pose["yaw"]))
+                    else:
+                        metrics.count("unposed_scans")
+                metrics.gauge("pending", len(pending))
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
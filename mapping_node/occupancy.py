@@ -0,0 +1,146 @@
+import math
+import numpy as np
+
+# 2D log-odds occupancy grid updated from binned LiDAR scans.
+#
+# Log-odds are stored as int8 in units of LOGODDS_SCALE (0 = unknown, > 0
+# occupied, < 0 free), so the grid is also the publishable representation.
+# Every ray of a fixed angular grid (lidar/1deg, lidar/5deg) is traced once
+# up front into a RayTable: the cell offsets it crosses and their distance
+# from the sensor. A scan update is then a few masked array operations over
+# that table: cells closer than the measured range get the free update, the
+# end cell the occupied update. Fancy-index "+=" applies once per cell even
+# when several rays cross it, which is the usual one-update-per-scan rule.
+
+LOGODDS_SCALE = 0.05
+L_OCC = 17    # log(0.7 / 0.3) / LOGODDS_SCALE
+L_FREE = -8   # log(0.4 / 0.6) / LOGODDS_SCALE
+L_MIN = -70   # Clamp at ~p 0.03 / 0.97 so the map can still change
+L_MAX = 70
+
+class RayTable:
+    def __init__(self, bins, resolution, max_range):
+        self.bins = bins
+        self.resolution = resolution
+        self.max_range = max_range
+        # Sample each ray at half-cell steps, then keep each cell once per ray.
+        steps = int(math.ceil(max_range / (resolution * 0.5)))
+        angles = -np.pi + (np.arange(bins) + 0.5) * (2.0 * np.pi / bins)
+        t = (np.arange(1, steps + 1) * resolution * 0.5)[None, :]
+        cx = np.floor(np.cos(angles)[:, None] * t / resolution + 0.5).astype(np.int32)
+        cy = np.floor(np.sin(angles)[:, None] * t / resolution + 0.5).astype(np.int32)
+        repeat = np.zeros(cx.shape, dtype=bool)
+        repeat[:, 1:] = (cx[:, 1:] == cx[:, :-1]) & (cy[:, 1:] == cy[:, :-1])
+        dist = np.hypot(cx, cy).astype(np.float32) * np.float32(resolution)
+        # Padded rectangular table; repeated samples get an infinite distance
+        # so no range ever selects them.
+        self.dx = cx
+        self.dy = cy
+        self.dist = np.where(repeat, np.inf, dist).astype(np.float32)
+
+class OccupancyGrid:
+    def __init__(self, size_m=20.0, resolution=0.05, tile_size=32, max_range=10.0):
+        self.resolution = resolution
+        self.tile_size = tile_size
+        self.max_range = max_range
+        cells = int(math.ceil(size_m / resolution / tile_size)) * tile_size
+        self.width = cells
+        self.height = cells
+        # World (0, 0) is the grid centre; origin is the world position of cell (0, 0).
+        self.origin = (-cells * resolution / 2.0, -cells * resolution / 2.0)
+        self.grid = np.zeros((cells, cells), dtype=np.int8)
+        self.tables = {}
+        self.tiles_x = cells // tile_size
+        self.tiles_y = cells // tile_size
+        self.dirty = np.zeros((self.tiles_y, self.tiles_x), dtype=bool)
+        # Grid as last handed out by changed_tiles(), to skip touched tiles
+        # whose cells did not actually change (e.g. already saturated).
+        self.published = np.zeros_like(self.grid)
+
+    def table(self, bins):
+        if bins not in self.tables:
+            self.tables[bins] = RayTable(bins, self.resolution, self.max_range)
+        return self.tables[bins]
+
+    def cell(self, x, y):
+        return (int(math.floor((x - self.origin[0]) / self.resolution)),
+                int(math.floor((y - self.origin[1]) / self.resolution)))
+
+    def _apply(self, flat, delta):
+        values = self.grid.ravel()
+        values[flat] = np.clip(values[flat].astype(np.int16) + delta, L_MIN, L_MAX).astype(np.int8)
+
+    def update(self, ranges, pose=(0.0, 0.0, 0.0)):
+        # ranges: metres per bin of a fixed angular grid (0 = no return).
+        # pose: sensor (x, y, yaw) in the map frame. Yaw is applied by
+        # rotating the scan by whole bins, which is exact for the table.
+        ranges = np.asarray(ranges, dtype=np.float32)
+        table = self.table(len(ranges))
+        shift = int(round(pose[2] / (2.0 * np.pi / len(ranges))))
+        if shift:
+            ranges = np.roll(ranges, shift)
+        col0, row0 = self.cell(pose[0], pose[1])
+
+        valid = (ranges > 0) & (ranges <= self.max_range)
+        rays = np.flatnonzero(valid)
+        if len(rays) == 0:
+            return 0
+        limit = ranges[rays, None]
+        dist = table.dist[rays]
+        # Free: cells fully before the return. Hit: the cell holding the return.
+        free = dist < limit - np.float32(self.resolution)
+        end = np.minimum(np.rint(limit[:, 0] / (self.resolution * 0.5)).astype(np.intp) - 1,
+                         table.dx.shape[1] - 1)
+
+        free_cols = table.dx[rays][free] + col0
+        free_rows = table.dy[rays][free] + row0
+        hit_cols = table.dx[rays, end] + col0
+        hit_rows = table.dy[rays, end] + row0
+
+        free_flat = self._flat(free_cols, free_rows)
+        hit_flat = self._flat(hit_cols, hit_rows)
+        self._apply(free_flat, L_FREE)
+        self._apply(hit_flat, L_OCC)
+        self._mark_dirty(np.concatenate((free_flat, hit_flat)))
+        return len(free_flat) + len(hit_flat)
+
+    def _flat(self, cols, rows):
+        inside = (cols >= 0) & (cols < self.width) & (rows >= 0) & (rows < self.height)
+        return rows[inside].astype(np.intp) * self.width + cols[inside]
+
+    def _mark_dirty(self, flat):
+        rows = flat // self.width // self.tile_size
+        cols = flat % self.width // self.tile_size
+        self.dirty[rows, cols] = True
+
+    def _blocks(self, grid):
+        t = self.tile_size
+        return grid.reshape(self.tiles_y, t, self.tiles_x, t)
+
+    def changed_tiles(self):
+        # (ty, tx) of tiles whose cells changed since the last call.
+        touched = np.argwhere(self.dirty)
+        self.dirty[:] = False
+        if len(touched) == 0:
+            return touched
+        ty, tx = touched[:, 0], touched[:, 1]
+        current = self._blocks(self.grid)[ty, :, tx, :]
+        changed = np.any(current != self._blocks(self.published)[ty, :, tx, :], axis=(1, 2))
+        tiles = touched[changed]
+        for y, x in tiles:
+            self.tile_view(self.published, y, x)[:] = self.tile(y, x)
+        return tiles
+
+    def tile_view(self, grid, ty, tx):
+        t = self.tile_size
+        return grid[ty * t:(ty + 1) * t, tx * t:(tx + 1) * t]
+
+    def tile(self, ty, tx):
+        return self.tile_view(self.grid, ty, tx)
+
+    def known_tiles(self):
+        # Tiles with any observed cell, e.g. for a full map snapshot.
+        return np.argwhere(np.any(self._blocks(self.grid) != 0, axis=(1, 3)))
+
+    def probabilities(self):
+        return 1.0 / (1.0 + np.exp(-self.grid.astype(np.float32) * LOGODDS_SCALE))
@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+# ICP match time, iterations and error on synthetic scan pairs with known
+# motion, for each correspondence index and error metric.
+#
+#   python3 odometry_node/bench_icp.py [--pairs 100] [--bins 360]
+import argparse
+import math
+import os
+import sys
+import time
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "lidar_node"))
+from fake_ydlidar import room_ranges
+from icp import cKDTree, icp, make_index, scan_normals, scan_points
+
+def make_scan(angles, x, y, heading):
+    ranges = (room_ranges(angles, heading, x=x, y=y) + np.random.normal(0.0, 0.01, len(angles))).astype(np.float32)
+    ranges[np.random.rand(len(angles)) < 0.03] = 0.0
+    return scan_points(angles, ranges)
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--pairs", type=int, default=100)
+    parser.add_argument("--bins", type=int, default=360, help="Points per scan (360 = lidar/1deg, 833 = full)")
+    parser.add_argument("--step", type=float, default=0.08, help="Translation between scans in metres")
+    parser.add_argument("--turn", type=float, default=5.0, help="Rotation between scans in degrees")
+    parser.add_argument("--imu-noise", type=float, default=1.0, help="Error of the IMU yaw guess in degrees")
+    args = parser.parse_args()
+
+    angles = (-np.pi + (np.arange(args.bins) + 0.5) * (2.0 * np.pi / args.bins)).astype(np.float32)
+    pairs = []
+    for _ in range(args.pairs):
+        x, y = np.random.uniform(-1.0, 1.0, 2)
+        heading = np.random.uniform(-np.pi, np.pi)
+        direction = np.random.uniform(-np.pi, np.pi)
+        turn = math.radians(np.random.uniform(-args.turn, args.turn))
+        nx, ny = x + args.step * math.cos(direction), y + args.step * math.sin(direction)
+        # Motion of the sensor expressed in the first scan's frame.
+        c, s = math.cos(-heading), math.sin(-heading)
+        truth = (c * (nx - x) - s * (ny - y), s * (nx - x) + c * (ny - y), turn)
+        pairs.append((make_scan(angles, x, y, heading), make_scan(angles, nx, ny, heading + turn), truth))
+
+    kinds = ["grid"] + (["kdtree"] if cKDTree is not None else [])
+    if cKDTree is None:
+        print("scipy not installed, skipping the cKDTree index")
+    print("{} pairs, {} bins, {} m / +-{} deg per scan, IMU guess error {} deg".format(
+        args.pairs, args.bins, args.step, args.turn, args.imu_noise))
+    print("{:<7} {:<6} {:<9} {:>9} {:>9} {:>7} {:>11} {:>10}".format(
+        "index", "metric", "guess", "index ms", "match ms", "iters", "err mm", "err deg"))
+    for kind in kinds:
+        for method in ("point", "line"):
+            for guess in ("none", "imu"):
+                build = match = iterations = 0.0
+                t_err = []
+                r_err = []
+                for target, source, truth in pairs:
+                    start = time.perf_counter()
+                    index = make_index(target, 0.5, kind)
+                    fine = make_index(target, 0.15, kind) if kind == "grid" else None
+                    normals = scan_normals(target) if method == "line" else None
+                    build += time.perf_counter() - start
+                    yaw0 = truth[2] + math.radians(np.random.normal(0.0, args.imu_noise)) if guess == "imu" else 0.0
+                    start = time.perf_counter()
+                    result = icp(source, target, index, normals, (0.0, 0.0, yaw0), method, fine_index=fine)
+                    match += time.perf_counter() - start
+                    iterations += result.iterations
+                    t_err.append(math.hypot(result.x - truth[0], result.y - truth[1]))
+                    r_err.append(abs(math.degrees(math.atan2(math.sin(result.yaw - truth[2]),
+                                                             math.cos(result.yaw - truth[2])))))
+                n = len(pairs)
+                print("{:<7} {:<6} {:<9} {:>9.2f} {:>9.2f} {:>7.1f} {:>11.1f} {:>10.2f}".format(
+                    kind, method, guess, build / n * 1e3, match / n * 1e3, iterations / n,
+                    np.median(t_err) * 1e3, np.median(r_err)))
+
+if __name__ == "__main__":
+    main()
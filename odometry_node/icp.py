@@ -0,0 +1,194 @@
+import math
+from collections import namedtuple
+import numpy as np
+
+try:
+    from scipy.spatial import cKDTree
+except ImportError:
+    cKDTree = None
+
+# 2D ICP scan matching between consecutive LiDAR scans.
+#
+# Correspondences come from a nearest-neighbour index over the reference scan,
+# built once per scan and reused for every iteration: scipy's cKDTree when
+# available, otherwise a uniform grid hash (GridHash). Each iteration is a
+# handful of array operations plus a closed-form solve:
+#
+#   point - point-to-point, SVD/Kabsch closed form
+#   line  - point-to-line (Censi), linearized 3x3 least squares against the
+#           reference normals, which converges in fewer iterations on walls
+#
+# A transform (x, y, yaw) maps points of the current scan into the frame of
+# the reference scan, i.e. it is the motion of the sensor between the scans.
+
+IcpResult = namedtuple("IcpResult", ["x", "y", "yaw", "iterations", "matches", "rms", "converged"])
+
+# Key offsets of the 3x3 cell neighbourhood (keys are (cx << 32) + cy).
+NEIGHBOUR_KEY_OFFSETS = np.array([(dx << 32) + dy for dx in (-1, 0, 1) for dy in (-1, 0, 1)], dtype=np.int64)
+
+class GridHash:
+    # Nearest neighbour within `cell` metres: points are bucketed into square
+    # cells of that size, so the answer is always in the 3x3 cells around the
+    # query. Buckets are stored as runs of a key-sorted index array.
+    def __init__(self, points, cell):
+        self.points = points
+        self.cell = cell
+        keys = self._keys(points)
+        self.order = np.argsort(keys, kind="stable")
+        sorted_keys = keys[self.order]
+        self.keys, self.starts, self.counts = np.unique(sorted_keys, return_index=True, return_counts=True)
+
+    def _cells(self, points):
+        return np.floor(points / self.cell).astype(np.int64)
+
+    def _keys(self, points):
+        cells = self._cells(points)
+        return (cells[:, 0] << 32) + cells[:, 1]
+
+    def query(self, queries, max_distance):
+        # Returns (distances, indices); inf / -1 where nothing is in range.
+        n = len(queries)
+        distances = np.full(n, np.inf)
+        indices = np.full(n, -1, dtype=np.intp)
+        if n == 0 or len(self.keys) == 0:
+            return distances, indices
+        keys = self._keys(queries)[:, None] + NEIGHBOUR_KEY_OFFSETS             # (N, 9)
+        pos = np.minimum(np.searchsorted(self.keys, keys), len(self.keys) - 1)
+        hit = self.keys[pos] == keys
+        starts = np.where(hit, self.starts[pos], 0).ravel()
+        counts = np.where(hit, self.counts[pos], 0).ravel()
+        # Expand every (query, bucket) pair into its candidates as one flat,
+        # query-major array; buckets vary a lot in size, so padding them to
+        # the largest one would mostly compare against nothing.
+        total = int(counts.sum())
+        if total == 0:
+            return distances, indices
+        run_starts = np.repeat(starts - (np.cumsum(counts) - counts), counts)
+        candidates = self.order[run_starts + np.arange(total)]
+        owner = np.repeat(np.arange(n * 9) // 9, counts)
+        d2 = np.sum((self.points[candidates] - queries[owner]) ** 2, axis=1)
+        per_query = counts.reshape(n, 9).sum(axis=1)
+        found = np.flatnonzero(per_query)
+        group_starts = (np.cumsum(per_query) - per_query)[found]
+        best = np.minimum.reduceat(d2, group_starts)
+        # First candidate of each query that attains its minimum.
+        is_best = np.flatnonzero(d2 == np.repeat(best, per_query[found]))
+        _, first = np.unique(owner[is_best], return_index=True)
+        distances[found] = np.sqrt(best)
+        indices[found] = candidates[is_best[first]]
+        far = distances > max_distance
+        distances[far] = np.inf
+        indices[far] = -1
+        return distances, indices
+
+class KdIndex:
+    def __init__(self, points):
+        self.tree = cKDTree(points)
+
+    def query(self, queries, max_distance):
+        distances, indices = self.tree.query(queries, distance_upper_bound=max_distance)
+        return distances, np.where(np.isinf(distances), -1, indices)
+
+def make_index(points, max_distance, kind="auto"):
+    if kind == "auto":
+        kind = "kdtree" if cKDTree is not None else "grid"
+    if kind == "kdtree":
+        if cKDTree is None:
+            raise ValueError("scipy is not installed; use the grid index")
+        return KdIndex(points)
+    return GridHash(points, max_distance)
+
+def scan_points(angles, ranges, min_range=0.12, max_range=10.0):
+    # Valid returns as (N, 2) float64 points in the sensor frame, in scan order.
+    keep = (ranges >= min_range) & (ranges <= max_range)
+    a = angles[keep].astype(np.float64)
+    r = ranges[keep].astype(np.float64)
+    return np.stack((r * np.cos(a), r * np.sin(a)), axis=1)
+
+def scan_normals(points, max_gap=0.3):
+    # Normals from the neighbours in scan order; NaN where the neighbours are
+    # too far apart to be on the same surface.
+    prev_pts = np.roll(points, 1, axis=0)
+    next_pts = np.roll(points, -1, axis=0)
+    tangent = next_pts - prev_pts
+    length = np.hypot(tangent[:, 0], tangent[:, 1])
+    gaps = np.maximum(np.hypot(*(points - prev_pts).T), np.hypot(*(next_pts - points).T))
+    with np.errstate(invalid="ignore", divide="ignore"):
+        normals = np.stack((-tangent[:, 1], tangent[:, 0]), axis=1) / length[:, None]
+    normals[(gaps > max_gap) | (length == 0)] = np.nan
+    return normals
+
+def _rotation(yaw):
+    c, s = math.cos(yaw), math.sin(yaw)
+    return np.array([[c, -s], [s, c]])
+
+def _solve_point(src, dst):
+    mu_s = src.mean(axis=0)
+    mu_d = dst.mean(axis=0)
+    h = (src - mu_s).T @ (dst - mu_d)
+    yaw = math.atan2(h[0, 1] - h[1, 0], h[0, 0] + h[1, 1])
+    t = mu_d - _rotation(yaw) @ mu_s
+    return t[0], t[1], yaw
+
+def _solve_line(src, dst, normals):
+    # Minimize sum((n . (R p + t - q))^2) linearized around yaw = 0.
+    a = np.empty((len(src), 3))
+    a[:, 0] = normals[:, 1] * src[:, 0] - normals[:, 0] * src[:, 1]
+    a[:, 1] = normals[:, 0]
+    a[:, 2] = normals[:, 1]
+    b = np.einsum("ij,ij->i", normals, dst - src)
+    yaw, x, y = np.linalg.solve(a.T @ a + np.eye(3) * 1e-9, a.T @ b)
+    return x, y, yaw
+
+def icp(source, target, index, target_normals=None, initial=(0.0, 0.0, 0.0), method="line",
+        max_iterations=30, max_distance=0.5, tolerance=1e-4, min_matches=20, fine_index=None,
+        fine_distance=0.15):
+    # Align `source` (current scan points) to `target` (reference scan points,
+    # indexed by `index`). Returns IcpResult; on failure converged is False
+    # and the pose is the last estimate. With a `fine_index` (a GridHash with
+    # fine_distance cells) the search switches to it once the correspondences
+    # are that close, since smaller cells hold fewer candidates per query.
+    x, y, yaw = initial
+    rotation = _rotation(yaw)
+    translation = np.array([x, y])
+    matches = 0
+    rms = float("nan")
+    search, radius = index, max_distance
+    for iteration in range(1, max_iterations + 1):
+        moved = source @ rotation.T + translation
+        distances, indices = search.query(moved, radius)
+        keep = indices >= 0
+        if keep.any():
+            # Trim the worst correspondences (dynamic objects, new surfaces).
+            cutoff = max(3.0 * np.median(distances[keep]), 0.05)
+            keep &= distances <= cutoff
+            if fine_index is not None and cutoff < fine_distance:
+                search, radius = fine_index, fine_distance
+        if method == "line":
+            keep &= ~np.isnan(target_normals[np.maximum(indices, 0), 0])
+        matches = int(np.count_nonzero(keep))
+        if matches < min_matches:
+            return IcpResult(translation[0], translation[1], math.atan2(rotation[1, 0], rotation[0, 0]),
+                             iteration, matches, rms, False)
+        src = moved[keep]
+        dst = target[indices[keep]]
+        if method == "line":
+            dx, dy, dyaw = _solve_line(src, dst, target_normals[indices[keep]])
+        else:
+            dx, dy, dyaw = _solve_point(src, dst)
+        step = _rotation(dyaw)
+        rotation = step @ rotation
+        translation = step @ translation + np.array([dx, dy])
+        rms = float(np.sqrt(np.mean(distances[keep] ** 2)))
+        if abs(dyaw) < tolerance and math.hypot(dx, dy) < tolerance:
+            break
+    yaw = math.atan2(rotation[1, 0], rotation[0, 0])
+    return IcpResult(translation[0], translation[1], yaw, iteration, matches, rms, True)
+
+def compose(pose, delta):
+    # pose (x, y, yaw) of the reference scan followed by the relative motion delta.
+    x, y, yaw = pose
+    dx, dy, dyaw = delta
+    c, s = math.cos(yaw), math.sin(yaw)
+    heading = math.atan2(math.sin(yaw + dyaw), math.cos(yaw + dyaw))
+    return x + c * dx - s * dy, y + s * dx + c * dy, heading
@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+# LiDAR scan-matching odometry.
+#
+# Every scan is aligned to the previous one with ICP (icp.py) and the relative
+# motions are chained into a pose, published as JSON on the pose stream
+# (tcp://*:5560 by default):
+#
+#   {"timestamp": <scan timestamp ns>, "x": m, "y": m, "yaw": rad,
+#    "iterations": n, "match_ms": ms, "matches": n, "rms": m, "converged": bool}
+#
+# The rotation guess for each match is the IMU yaw rate integrated between
+# the two scans' timestamps, using each IMU message's own timestamp (messages
+# queued while ICP ran still count for the time they cover); the translation
+# guess is the previous motion.
+#
+#   python3 odometry.py [--lidar-tier 1deg] [--method line] [--index auto]
+import argparse
+import math
+import os
+import sys
+import time
+from collections import deque
+import zmq
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from common import transport
+from common.lidar_frame import decode_scan, scan_arrays
+from common.metrics import Metrics
+from icp import GridHash, compose, icp, make_index, scan_normals, scan_points
+
+class Reference:
+    # Previous scan with everything ICP needs, built once per scan.
+    def __init__(self, points, args):
+        self.points = points
+        self.index = make_index(points, args.max_distance, args.index)
+        # A cKDTree is fast at any radius; only the grid hash gets a fine level.
+        self.fine = GridHash(points, args.fine_distance) if isinstance(self.index, GridHash) else None
+        self.normals = scan_normals(points) if args.method == "line" else None
+
+def integrate_yaw(samples, start, end):
+    # samples: (timestamp ns, rate rad/s) in time order, each rate the mean
+    # since the sample before it. Rotation over [start, end] (ns), the part
+    # past the newest sample at its rate; None without a sample after start.
+    if not samples or samples[-1][0] <= start:
+        return None
+    angle = 0.0
+    previous = None
+    for timestamp, rate in samples:
+        if previous is not None:
+            lo, hi = max(previous, start), min(timestamp, end)
+            if hi > lo:
+                angle += rate * (hi - lo) * 1e-9
+        previous = timestamp
+    timestamp, rate = samples[-1]
+    if end > timestamp:
+        angle += rate * (end - timestamp) * 1e-9
+    return angle
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--lidar-tier", default="1deg", help="LiDAR topic lidar/<tier> to match (full, 1deg)")
+    parser.add_argument("--method", choices=["line", "point"], default="line", help="ICP error metric")
+    parser.add_argument("--index", choices=["auto", "kdtree", "grid"], default="auto",
+                        help="Correspondence search: scipy cKDTree or grid hash (auto = cKDTree if installed)")
+    parser.add_argument("--max-distance", type=float, default=0.5, help="Largest correspondence distance (m)")
+    parser.add_argument("--fine-distance", type=float, default=0.15,
+                        help="Cell size of the fine grid hash used once matches are this close (m)")
+    parser.add_argument("--max-iterations", type=int, default=30)
+    parser.add_argument("--imu-sign", type=float, default=1.0,
+                        help="Sign applied to the IMU yaw rate (-1 if the IMU z axis points down)")
+    parser.add_argument("--no-imu", action="store_true", help="Do not use the IMU rotation guess")
+    args = parser.parse_args()
+
+    context = transport.make_context()
+    lidar_socket = transport.subscriber(context, "lidar", b"lidar/" + args.lidar_tier.encode())
+    imu_socket = transport.subscriber(context, "imu")
+    publisher = transport.publisher(context, "pose")
+    print("Scan matching lidar/{}, publishing poses on {}".format(
+        args.lidar_tier, transport.endpoint("pose", bind=True)))
+    metrics = Metrics("odometry", context)
+
+    poller = zmq.Poller()
+    poller.register(lidar_socket, zmq.POLLIN)
+    if not args.no_imu:
+        poller.register(imu_socket, zmq.POLLIN)
+
+    pose = (0.0, 0.0, 0.0)
+    last_motion = (0.0, 0.0, 0.0)
+    reference = None
+    imu_samples = deque()   # (timestamp ns, yaw rate rad/s) since the previous scan
+    scan_time = None
+    scans = failures = 0
+    match_time = 0.0
+    iterations = 0
+
+    try:
+        while True:
+            events = dict(poller.poll(100))
+            metrics.maybe_publish()
+            if imu_socket in events:
+                # Everything queued, e.g. while the last ICP ran
+                while True:
+                    try:
+                        imu = imu_socket.recv_json(zmq.NOBLOCK)
+                    except zmq.Again:
+                        break
+                    rate = imu.get("yaw_rate", imu.get("yaw"))  # deg/s
+                    if rate is None:
+                        continue
+                    timestamp = int(imu.get("timestamp") or time.time_ns())
+                    if imu_samples and timestamp <= imu_samples[-1][0]:
+                        continue
+                    imu_samples.append((timestamp, args.imu_sign * math.radians(rate)))
+                    metrics.count("imu_messages")
+
+            if lidar_socket not in events:
+                continue
+            topic, frame = lidar_socket.recv_multipart()
+            with metrics.timer("decode"):
+                scan = decode_scan(frame)
+                points = scan_points(*scan_arrays(scan))
+            metrics.count("scans")
+            metrics.gauge("imu_queued", len(imu_samples))
+
+            result = None
+            if reference is not None:
+                imu_yaw = integrate_yaw(imu_samples, scan_time, scan.timestamp)
+                guess = (last_motion[0], last_motion[1], last_motion[2] if imu_yaw is None else imu_yaw)
+                start = time.perf_counter()
+                result = icp(points, reference.points, reference.index, reference.normals, guess, args.method,
+                             args.max_iterations, args.max_distance, fine_index=reference.fine,
+                             fine_distance=args.fine_distance)
+                elapsed = time.perf_counter() - start
+                match_time += elapsed
+                iterations += result.iterations
+                scans += 1
+                metrics.observe("match", elapsed)
+                metrics.gauge("iterations", result.iterations)
+                if result.converged:
+                    last_motion = (result.x, result.y, result.yaw)
+                else:
+                    failures += 1
+                    metrics.count("failed_matches")
+                    last_motion = guess  # Dead-reckon on the guess for this scan
+                pose = compose(pose, last_motion)
+            # Keep the newest sample up to this scan: it starts the next interval
+            scan_time = scan.timestamp
+            while len(imu_samples) > 1 and imu_samples[1][0] <= scan_time:
+                imu_samples.popleft()
+            with metrics.timer("index"):
+                reference = Reference(points, args)
+
+            publisher.send_json({
+                "timestamp": scan.timestamp,
+                "x": round(pose[0], 4),
+                "y": round(pose[1], 4),
+                "yaw": round(pose[2], 5),
+                "iterations": result.iterations if result else 0,
+                "match_ms": round(elapsed * 1e3, 3) if result else 0.0,
+                "matches": result.matches if result else 0,
+                "rms": round(result.rms, 4) if result and result.rms == result.rms else None,
+                "converged": bool(result.converged) if result else True,
+            })
+            if scans:
+                print("Pose x={:.2f} y={:.2f} yaw={:.1f} deg | {:.2f} ms/match, {:.1f} iterations, {} failed".format(
+                    pose[0], pose[1], math.degrees(pose[2]), match_time / scans * 1e3, iterations / scans,
+                    failures), end="\r", flush=True)
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
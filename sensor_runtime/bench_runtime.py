@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+# imu.py + lidar.py as two processes against sensors.py as one, on the
+# fake hardware: resident memory and CPU of the processes, and how evenly
+# the imu messages arrive (the interval between them as a subscriber sees
+# it, against the nominal 1 / rate).
+#
+#   python3 sensor_runtime/bench_runtime.py [--seconds 10] [--fifo] [--deskew]
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+import numpy as np
+import zmq
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+from common import transport
+
+CLOCK_TICKS = os.sysconf("SC_CLK_TCK")
+
+def proc_stats(pid):
+    # (cpu seconds, rss bytes)
+    with open("/proc/{}/stat".format(pid)) as f:
+        fields = f.read().rsplit(")", 1)[1].split()
+    with open("/proc/{}/status".format(pid)) as f:
+        rss = next(int(line.split()[1]) * 1024 for line in f if line.startswith("VmRSS:"))
+    return (int(fields[11]) + int(fields[12])) / CLOCK_TICKS, rss
+
+def setups(args):
+    imu_args = ["--rate", str(args.rate), "--fake-yaw-rate", "0.5"] + (["--fifo"] if args.fifo else [])
+    lidar_args = ["--fake-yaw-rate", "0.5"] + (["--deskew"] if args.deskew else [])
+    runtime_args = ["--imu-rate", str(args.rate), "--fake-yaw-rate", "0.5"] + \
+        (["--imu-fifo"] if args.fifo else []) + (["--deskew"] if args.deskew else [])
+    return [
+        ("processes", [([sys.executable, "imu.py", "--fake"] + imu_args, "imu_node"),
+                       ([sys.executable, "lidar.py", "--fake"] + lidar_args, "lidar_node")]),
+        ("runtime", [([sys.executable, "sensors.py", "--fake"] + runtime_args, "sensor_runtime")]),
+    ]
+
+def run(name, commands, args, context):
+    imu = transport.subscriber(context, "imu")
+    lidar = transport.subscriber(context, "lidar", topic=b"lidar/full")
+    poller = zmq.Poller()
+    poller.register(imu, zmq.POLLIN)
+    poller.register(lidar, zmq.POLLIN)
+    processes = [subprocess.Popen(cmd, cwd=os.path.join(ROOT, cwd), stdout=subprocess.DEVNULL,
+                                  stderr=subprocess.DEVNULL) for cmd, cwd in commands]
+    try:
+        # Warm up: both streams flowing
+        deadline = time.monotonic() + args.warmup
+        while time.monotonic() < deadline:
+            for socket, _ in poller.poll(100):
+                socket.recv_multipart()
+        cpu_start = sum(proc_stats(p.pid)[0] for p in processes)
+        arrivals, scans = [], 0
+        start = time.monotonic()
+        while time.monotonic() - start < args.seconds:
+            for socket, _ in poller.poll(100):
+                parts = socket.recv_multipart()
+                if socket is imu:
+                    json.loads(parts[0])
+                    arrivals.append(time.monotonic())
+                else:
+                    scans += 1
+        elapsed = time.monotonic() - start
+        stats = [proc_stats(p.pid) for p in processes]
+    finally:
+        for p in processes:
+            p.terminate()
+        for p in processes:
+            p.wait(timeout=5)
+        imu.close(linger=0)
+        lidar.close(linger=0)
+
+    cpu = (sum(s[0] for s in stats) - cpu_start) / elapsed * 100
+    rss = sum(s[1] for s in stats) / 2 ** 20
+    intervals = np.diff(arrivals) * 1e3 if len(arrivals) > 1 else np.zeros(1)
+    print("{:>10} {:>5} {:>8.1f} {:>6.1f} {:>8.1f} {:>9.2f} {:>8.2f} {:>8.2f} {:>8.1f}".format(
+        name, len(processes), rss, cpu, len(arrivals) / elapsed, intervals.mean(), intervals.std(),
+        np.percentile(np.abs(intervals - 1e3 / args.rate), 99), scans / elapsed))
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--seconds", type=float, default=10.0)
+    parser.add_argument("--warmup", type=float, default=3.0)
+    parser.add_argument("--rate", type=float, default=20.0, help="IMU publish rate in Hz")
+    parser.add_argument("--fifo", action="store_true", help="IMU through the FIFO")
+    parser.add_argument("--deskew", action="store_true")
+    args = parser.parse_args()
+
+    context = zmq.Context()
+    print("IMU at {:.0f} Hz{}{}, {:.0f} s per setup\n".format(
+        args.rate, ", FIFO" if args.fifo else "", ", deskew" if args.deskew else "", args.seconds))
+    print("{:>10} {:>5} {:>8} {:>6} {:>8} {:>9} {:>8} {:>8} {:>8}".format(
+        "setup", "procs", "RSS MB", "CPU %", "imu/s", "mean ms", "std ms", "p99 err", "scans/s"))
+    for name, commands in setups(args):
+        run(name, commands, args, context)
+        time.sleep(0.5)  # let the ports go
+    context.term()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,323 @@
+import asyncio
+import json
+import math
+import os
+import sys
+import time
+import numpy as np
+import zmq
+import zmq.asyncio
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "imu_node"))
+sys.path.insert(0, os.path.join(ROOT, "lidar_node"))
+from common.imu_batch import encode_batch
+from runtime import Driver, Schedule
+from calibration import load_calibration
+from imu_processing import ImuProcessor
+from mpu6050 import DLPF_BANDWIDTH, FIFO_FRAME, FIFO_SIZE, FifoReader, MPU6050
+from acquisition import ScanAcquirer, ScanCounters, ScanRing, ScanSender, read_scan
+from deskew import ImuFeed, ImuHistory
+from lidar import open_laser, scan_pipeline
+
+# Sensor drivers for the runtime (runtime.py), doing what imu.py and
+# lidar.py do as processes: same streams, messages and metrics names.
+# fake=True uses the simulated hardware (fake_smbus.py, fake_ydlidar.py).
+#
+# Hosted together, the IMU feeds the LiDAR deskew history directly with
+# every sample instead of the LiDAR subscribing to the imu stream.
+
+class ImuDriver(Driver):
+    name = "imu"
+
+    def __init__(self, fake=False, fake_yaw_rate=0.0, rate=20.0, sample_rate=None, fifo=False, dlpf=3,
+                 kp=1.0, ki=0.05, calibration=None, online_bias=True):
+        super().__init__()
+        self.fake = fake
+        self.fake_yaw_rate = fake_yaw_rate
+        self.rate = rate
+        # 500 Hz of FIFO frames fits a 100 kHz bus, see imu.py
+        self.sample_rate = sample_rate or (500.0 if fifo else 200.0)
+        self.use_fifo = fifo
+        self.dlpf = dlpf
+        self.kp, self.ki = kp, ki
+        self.calibration_path = calibration
+        self.online_bias = online_bias
+        self.histories = []   # (ImuHistory, sign) fed with every sample's z rate
+        self.fifo = None
+        self.schedule = None
+        self.published = 0
+        self.samples = 0
+
+    def open(self):
+        if self.fake:
+            import fake_smbus as smbus
+        else:
+            import smbus2 as smbus
+        self.i2c_msg = getattr(smbus, "i2c_msg", None)
+        self.bus = smbus.SMBus(1)
+        if self.fake:
+            self.bus.yaw_rate = math.degrees(self.fake_yaw_rate)
+        self.imu = MPU6050(self.bus, dlpf=self.dlpf, sample_rate=self.sample_rate).configure()
+        print("MPU6050 at {:.0f} Hz, DLPF {} ({} Hz gyro bandwidth)".format(
+            self.imu.sample_rate, self.dlpf, DLPF_BANDWIDTH[self.dlpf][1]))
+        calibration, calibration_file = load_calibration(self.calibration_path)
+        print("IMU calibration:", calibration_file or "none, zero offsets")
+        self.processor = ImuProcessor(calibration, self.imu.sample_rate, kp=self.kp, ki=self.ki,
+                                      online_bias=self.online_bias)
+        if self.use_fifo:
+            self.fifo = FifoReader(self.imu, self.i2c_msg).start()
+            capacity = FIFO_SIZE // FIFO_FRAME
+            if self.imu.sample_rate / self.rate > 0.8 * capacity:
+                print("Warning: {:.0f} samples per cycle come close to the FIFO's {}; raise the IMU rate".format(
+                    self.imu.sample_rate / self.rate, capacity))
+
+    def feed(self, times_ns, rates):
+        # Deskew histories in this process: z rate (deg/s) per sample.
+        for history, sign in self.histories:
+            for timestamp, rate in zip(times_ns, rates):
+                history.append(int(timestamp), sign * math.radians(rate))
+
+    def publish(self, sample_time, yaw_rate, gyro_z):
+        self.publisher.send_json(self.processor.message(sample_time, yaw_rate, gyro_z))
+        self.published += 1
+        self.metrics.count("published")
+
+    async def run(self, runtime):
+        self.publisher = runtime.publisher("imu")
+        if self.fifo is not None:
+            await self.run_fifo(runtime)
+        else:
+            await self.run_polling(runtime)
+
+    async def run_fifo(self, runtime):
+        # One bulk FIFO read per cycle, as imu.py --fifo
+        fifo = self.fifo
+        batch_publisher = runtime.publisher("imu_batch")
+        schedule = self.schedule = Schedule(1.0 / self.rate)
+        seq = 0
+        gap = True
+        while True:
+            self.metrics.observe("late", await schedule.wait())
+            overflows = fifo.overflows
+            with self.metrics.timer("drain"):
+                drained = await runtime.blocking(fifo.drain)
+            if fifo.overflows != overflows:
+                gap = True
+                print("\nFIFO overflow: reset ({} overflows, {} samples lost)".format(fifo.overflows, fifo.lost))
+            if drained is None:
+                continue
+            first, raw = drained
+            batch_publisher.send(encode_batch(raw, first, fifo.period_ns, self.imu.accel_scale,
+                                              self.imu.gyro_scale, seq, fifo.overflows, fifo.lost, gap))
+            seq += 1
+            gap = False
+
+            filter_start = time.perf_counter()
+            accel, gyro = fifo.scale(raw)
+            rates = self.processor.process_block(accel, gyro, fifo.period_ns)
+            self.metrics.observe("filter", time.perf_counter() - filter_start)
+            self.metrics.gauge("batch_samples", len(raw))
+            times = first + fifo.period_ns * np.arange(len(raw), dtype=np.int64)
+            self.feed(times, rates)
+            self.samples = fifo.total
+            self.publish(int(times[-1]), float(rates.mean()), float(rates[-1]))
+
+    async def run_polling(self, runtime):
+        # Every sample through the filter, every `decimation`-th published
+        decimation = max(1, int(round(self.imu.sample_rate / self.rate)))
+        schedule = self.schedule = Schedule(1.0 / self.imu.sample_rate)
+        last = time.monotonic()
+        rate_sum = 0.0
+        count = 0
+        while True:
+            self.metrics.observe("late", await schedule.wait())
+            with self.metrics.timer("read"):
+                sample = await runtime.blocking(self.imu.read)
+            now = time.monotonic()
+            gyro_z = self.processor.process_sample(sample, now - last)
+            last = now
+            sample_time = time.time_ns()
+            self.feed((sample_time,), (gyro_z,))
+            rate_sum += gyro_z
+            count += 1
+            self.samples += 1
+            self.metrics.count("samples")
+            if count == decimation:
+                self.publish(sample_time, rate_sum / count, gyro_z)
+                rate_sum = 0.0
+                count = 0
+
+    def collect(self):
+        if self.fifo is not None:
+            self.metrics.set_count("samples", self.fifo.total)
+            self.metrics.set_count("overflows", self.fifo.overflows)
+            self.metrics.set_count("lost", self.fifo.lost)
+        self.metrics.set_count("bias_updates", self.processor.bias_updates)
+        if self.schedule is not None:
+            self.metrics.set_count("missed_ticks", self.schedule.missed)
+
+    def status(self):
+        return "published={} samples={}".format(self.published, self.samples)
+
+    def close(self):
+        close = getattr(self.bus, "close", None)
+        if close is not None:
+            close()
+
+class LidarDriver(Driver):
+    name = "lidar"
+
+    def __init__(self, args, fake=False, fake_yaw_rate=0.0, policy="all", rate=10.0, ring=64,
+                 imu_history=None, imu_sign=1.0, listen_imu=False, imu_bias=0.0):
+        # args: the lidar.add_scan_arguments options. With imu_history the
+        # deskewed tiers are published too; listen_imu fills that history
+        # from the imu_batch/imu streams (IMU not hosted in this runtime),
+        # taking imu_bias (deg/s) off the raw batch gyro z.
+        super().__init__()
+        if policy not in ("all", "latest"):
+            raise ValueError("Unknown publish policy: {}".format(policy))
+        self.args = args
+        self.fake = fake
+        self.fake_yaw_rate = fake_yaw_rate
+        self.policy = policy
+        self.period = 1.0 / rate
+        self.counters = ScanCounters()
+        self.ring = ScanRing(ring, self.counters)
+        self.imu_history = imu_history
+        self.imu_sign = imu_sign
+        self.listen_imu = listen_imu
+        self.imu_bias = imu_bias
+        self.deskew = None
+
+    def open(self):
+        if self.fake:
+            import fake_ydlidar as ydlidar
+        else:
+            import ydlidar
+        self.laser = open_laser(ydlidar)
+        if self.fake:
+            self.laser.yaw_rate = self.fake_yaw_rate
+        self.scan = ydlidar.LaserScan()
+        self.is_ok = ydlidar.os_isOk
+        print("LiDAR scanning started...")
+
+    async def run(self, runtime):
+        socket = runtime.publisher("lidar")  # tcp://*:5556 by default
+        reducer, raw_topics, delta, self.deskew = scan_pipeline(self.args, self.imu_history)
+        self.sender = ScanSender(lambda topic, frame: socket.send_multipart([topic, frame], copy=False),
+                                 self.counters, reducer, quantize=self.args.quantize, raw_topics=raw_topics,
+                                 delta=delta, deskew=self.deskew, metrics=self.metrics)
+        self.scan_ready = asyncio.Event()
+        acquire = asyncio.ensure_future(self.acquire(runtime))
+        loops = [acquire, asyncio.ensure_future(self.publish())]
+        if self.listen_imu and self.imu_history is not None:
+            loops.append(asyncio.ensure_future(self.listen(runtime)))
+        # The LiDAR is done when any loop ends (acquire gives up once the
+        # device stops delivering scans); returning stops the runtime.
+        try:
+            done, pending = await asyncio.wait(loops, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            for task in loops:
+                task.cancel()
+            await asyncio.gather(*loops, return_exceptions=True)
+        if acquire in done and self.policy == "all":
+            for scan in self.ring.pop_all(timeout=0):
+                self.sender.publish(scan)
+        for task in done:
+            task.result()
+
+    async def acquire(self, runtime):
+        # doProcessSimple blocks for a revolution; it runs in the executor
+        # while the loop keeps publishing.
+        failures = 0
+        while self.is_ok():
+            scan = await runtime.blocking(read_scan, self.laser, self.scan, self.counters)
+            if scan is None:
+                failures += 1
+                if failures >= ScanAcquirer.MAX_CONSECUTIVE_FAILURES:
+                    print("\nLiDAR stopped delivering scans.")
+                    return
+                continue
+            failures = 0
+            self.ring.push(scan)
+            self.scan_ready.set()
+
+    async def publish(self):
+        if self.policy == "all":
+            while True:
+                await self.scan_ready.wait()
+                self.scan_ready.clear()
+                for scan in self.ring.pop_all(timeout=0):
+                    self.sender.publish(scan)
+
+        schedule = Schedule(self.period)
+        while True:
+            self.metrics.observe("late", await schedule.wait())
+            scan = self.ring.pop_latest()
+            if scan is not None:
+                self.sender.publish(scan)
+
+    async def listen(self, runtime):
+        # As deskew.ImuListener, on the event loop
+        feed = ImuFeed(self.imu_history, self.imu_sign, self.imu_bias)
+        batch_socket = runtime.subscriber("imu_batch")
+        socket = runtime.subscriber("imu")
+        poller = zmq.asyncio.Poller()
+        poller.register(batch_socket, zmq.POLLIN)
+        poller.register(socket, zmq.POLLIN)
+        try:
+            while True:
+                events = dict(await poller.poll())
+                if batch_socket in events:
+                    feed.batch(await batch_socket.recv())
+                if socket in events:
+                    feed.message(json.loads(await socket.recv()))
+        finally:
+            batch_socket.close(linger=0)
+            socket.close(linger=0)
+
+    def collect(self):
+        for name, total in self.counters.as_dict().items():
+            self.metrics.set_count(name, total)
+        self.metrics.gauge("queued", len(self.ring))
+        if self.deskew is not None:
+            self.metrics.set_count("deskewed", self.deskew[0].corrected)
+
+    def status(self):
+        c = self.counters
+        deskewed = " deskewed={}".format(self.deskew[0].corrected) if self.deskew is not None else ""
+        return "acquired={} published={} dropped={}{}".format(c.acquired, c.published, c.dropped, deskewed)
+
+    def close(self):
+        self.laser.turnOff()
+        self.laser.disconnecting()
+
+def make_drivers(args):
+    # Drivers for the sensors.py options; the LiDAR deskews with the hosted
+    # IMU when there is one, else from the imu stream.
+    names = [name for name in args.drivers.split(",") if name]
+    unknown = [name for name in names if name not in ("imu", "lidar")]
+    if unknown:
+        raise ValueError("Unknown drivers: {}".format(", ".join(unknown)))
+    drivers = []
+    imu = None
+    if "imu" in names:
+        imu = ImuDriver(fake=args.fake, fake_yaw_rate=args.fake_yaw_rate, rate=args.imu_rate,
+                        sample_rate=args.imu_sample_rate, fifo=args.imu_fifo, dlpf=args.imu_dlpf,
+                        kp=args.imu_kp, ki=args.imu_ki, calibration=args.imu_calibration,
+                        online_bias=not args.no_online_bias)
+        drivers.append(imu)
+    if "lidar" in names:
+        history = ImuHistory() if args.deskew else None
+        if history is not None and imu is not None:
+            imu.histories.append((history, args.imu_sign))
+        imu_bias = 0.0
+        if history is not None and imu is None:
+            imu_bias = float(load_calibration(args.imu_calibration)[0].gyro_bias[2])
+        drivers.append(LidarDriver(args, fake=args.fake, fake_yaw_rate=args.fake_yaw_rate,
+                                   policy=args.lidar_policy, rate=args.lidar_rate, ring=args.lidar_ring,
+                                   imu_history=history, imu_sign=args.imu_sign, listen_imu=imu is None,
+                                   imu_bias=imu_bias))
+    return drivers
@@ -0,0 +1,145 @@
+import asyncio
+import os
+import signal
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from common import transport
+from common.metrics import Metrics
+
+# One asyncio process hosting several sensor drivers (drivers.py), instead
+# of one interpreter per sensor.
+#
+#   - Blocking device I/O (an I2C burst read, doProcessSimple) runs in a
+#     small thread pool: runtime.blocking(function, *args). Everything else,
+#     filtering and all ZMQ sends, runs on the event loop thread, so sockets
+#     are only ever touched from one thread.
+#   - All sockets come from one shared ZMQ context, one socket per stream
+#     (runtime.publisher("imu")); drivers publishing on the same stream
+#     share it. Each driver still reports its own metrics under its name.
+#   - Periodic work is scheduled against absolute deadlines (Schedule), so
+#     the time a cycle takes does not add to its period and the rate does
+#     not drift; how late each tick woke is recorded as the "late" histogram.
+#
+# A driver is a class with a name, the executor threads it may keep busy
+# (workers) and:
+#   open()            blocking setup, runs in the executor
+#   async run(rt)     the driver's loop(s), until cancelled
+#   collect()         refresh totals in self.metrics before they are published
+#   status()          short text for the status line
+#   close()           blocking teardown, runs in the executor
+# A driver whose run() returns or raises stops the whole runtime, as the
+# node process would have exited. SIGINT and SIGTERM (supervisor.py) stop
+# it too; either way every opened driver is closed.
+
+class Schedule:
+    # Periodic deadlines: tick n is due at start + n * period. A late tick
+    # does not shift the ones after it; ticks missed completely (a cycle
+    # took several periods) are skipped rather than run back to back.
+    def __init__(self, period, start=None):
+        self.period = period
+        self.next = time.monotonic() if start is None else start
+        self.ticks = 0
+        self.missed = 0
+
+    async def wait(self):
+        # Sleeps until the next deadline; returns how late it woke (s).
+        delay = self.next - time.monotonic()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        now = time.monotonic()
+        late = now - self.next
+        self.next += self.period
+        if now >= self.next:
+            skipped = int((now - self.next) / self.period) + 1
+            self.missed += skipped
+            self.next += skipped * self.period
+        self.ticks += 1
+        return late
+
+class Driver:
+    name = "driver"
+    workers = 1
+
+    def __init__(self):
+        self.metrics = None
+
+    def open(self):
+        pass
+
+    async def run(self, runtime):
+        raise NotImplementedError
+
+    def collect(self):
+        pass
+
+    def status(self):
+        return ""
+
+    def close(self):
+        pass
+
+class SensorRuntime:
+    def __init__(self, drivers, status_interval=1.0):
+        self.drivers = drivers
+        self.status_interval = status_interval
+        self.context = transport.make_context(use_asyncio=True)
+        self.sockets = {}
+        self.executor = ThreadPoolExecutor(max_workers=max(1, sum(d.workers for d in drivers)),
+                                           thread_name_prefix="sensor-io")
+        metrics_socket = self.publisher("metrics")
+        for driver in drivers:
+            driver.metrics = Metrics(driver.name, socket=metrics_socket)
+
+    def publisher(self, stream):
+        # One socket per stream, shared by every driver publishing on it.
+        socket = self.sockets.get(stream)
+        if socket is None:
+            socket = self.sockets[stream] = transport.publisher(self.context, stream)
+        return socket
+
+    def subscriber(self, stream, topic=b""):
+        return transport.subscriber(self.context, stream, topic)
+
+    async def blocking(self, function, *args):
+        return await asyncio.get_running_loop().run_in_executor(self.executor, function, *args)
+
+    async def _status(self):
+        schedule = Schedule(self.status_interval)
+        while True:
+            await schedule.wait()
+            for driver in self.drivers:
+                driver.collect()
+                driver.metrics.publish()
+            print("  ".join("{}: {}".format(d.name, d.status()) for d in self.drivers), end="\r", flush=True)
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        stop = asyncio.Event()
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(signum, stop.set)
+        opened = []
+        try:
+            for driver in self.drivers:
+                await self.blocking(driver.open)
+                opened.append(driver)
+            tasks = {asyncio.ensure_future(driver.run(self)): driver for driver in self.drivers}
+            others = [asyncio.ensure_future(self._status()), asyncio.ensure_future(stop.wait())]
+            done, pending = await asyncio.wait(list(tasks) + others, return_when=asyncio.FIRST_COMPLETED)
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+            for task, driver in tasks.items():
+                if task in done:
+                    print("\n{} stopped".format(driver.name))
+                    if task.exception() is not None:
+                        raise task.exception()
+        finally:
+            for driver in reversed(opened):
+                await self.blocking(driver.close)
+            self.executor.shutdown(wait=False)
+            for socket in self.sockets.values():
+                socket.close(linger=0)
+            self.context.term()
@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+# IMU and LiDAR readers in one asyncio process (runtime.py, drivers.py) in
+# place of imu.py and lidar.py as two processes: one interpreter, one ZMQ
+# context, and deadline-scheduled rates. Streams, messages and metrics are
+# the same, so run this or the two nodes, not both.
+#
+#   python3 sensors.py --fake --fake-yaw-rate 0.5 --imu-fifo --deskew
+#   python3 sensors.py --drivers lidar --deskew        # IMU from imu.py
+import argparse
+import asyncio
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from drivers import make_drivers
+from lidar import add_scan_arguments
+from mpu6050 import DLPF_BANDWIDTH
+from runtime import SensorRuntime
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--drivers", default="imu,lidar", help="Comma separated: imu, lidar")
+    parser.add_argument("--fake", action="store_true",
+                        help="Use the simulated hardware (fake_smbus.py, fake_ydlidar.py)")
+    parser.add_argument("--fake-yaw-rate", type=float, default=0.0,
+                        help="Rotation of the simulated IMU and LiDAR in rad/s (with --fake)")
+
+    imu = parser.add_argument_group("IMU (as imu.py)")
+    imu.add_argument("--imu-rate", type=float, default=20.0, help="Publish rate in Hz")
+    imu.add_argument("--imu-sample-rate", type=float, default=None,
+                     help="MPU6050 sample rate in Hz (default 200, 500 with --imu-fifo)")
+    imu.add_argument("--imu-fifo", action="store_true",
+                     help="Sample through the FIFO and also publish every sample on imu_batch")
+    imu.add_argument("--imu-dlpf", type=int, default=3, choices=sorted(DLPF_BANDWIDTH))
+    imu.add_argument("--imu-kp", type=float, default=1.0, help="Orientation filter accel gain in rad/s")
+    imu.add_argument("--imu-ki", type=float, default=0.05, help="Orientation filter gyro bias gain")
+    imu.add_argument("--imu-calibration", default=None,
+                     help="Calibration file from calibrate.py (also the imu_batch gyro bias for --deskew "
+                          "when the IMU is not hosted)")
+    imu.add_argument("--no-online-bias", action="store_true",
+                     help="Do not refine the gyro bias while the IMU is still (see imu.py --help)")
+
+    lidar = parser.add_argument_group("LiDAR (as lidar.py)")
+    lidar.add_argument("--lidar-policy", choices=["all", "latest"], default="all",
+                       help="all: publish every scan; latest: publish the newest scan at --lidar-rate")
+    lidar.add_argument("--lidar-rate", type=float, default=10.0, help="Publish rate in Hz for the latest policy")
+    lidar.add_argument("--lidar-ring", type=int, default=64, help="Scans buffered between acquisition and publishing")
+    add_scan_arguments(lidar)
+    lidar.add_argument("--deskew", action="store_true",
+                       help="Also publish IMU motion-compensated tiers on lidar/deskewed/<tier>")
+    lidar.add_argument("--imu-sign", type=float, default=1.0,
+                       help="Sign applied to the IMU z rate (-1 if the IMU z axis points down)")
+    args = parser.parse_args()
+
+    try:
+        drivers = make_drivers(args)
+    except ValueError as e:
+        print(e)
+        exit(1)
+    if not drivers:
+        print("No drivers given")
+        exit(1)
+
+    runtime = SensorRuntime(drivers)
+    print("Sensor runtime: {} ({} executor threads)".format(
+        ", ".join(driver.name for driver in drivers), runtime.executor._max_workers))
+    try:
+        asyncio.run(runtime.run())
+    except KeyboardInterrupt:
+        pass
+    print()
+
+if __name__ == "__main__":
+    main()
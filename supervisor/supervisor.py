@@ -0,0 +1,224 @@
+#!/usr/bin/env python3
+# Launches the sensor_nest nodes from one config file (nodes.json), pins
+# each to its cores, sets its scheduling priority, restarts crashed nodes
+# with exponential backoff and reports per-process CPU and memory.
+#
+#   python3 supervisor/supervisor.py                      # everything in nodes.json
+#   python3 supervisor/supervisor.py --fake               # fake hardware stand-ins
+#   python3 supervisor/supervisor.py --only imu,lidar,bridge
+#
+# Per node:
+#   cmd        argv; "python3" is replaced by this interpreter
+#   cwd        working directory, relative to the repository root
+#   cpus       cores to pin to (sched_setaffinity); missing cores are dropped
+#   nice       nice value (negative values need CAP_SYS_NICE)
+#   realtime   SCHED_FIFO priority 1..99 for sensor readers (needs
+#              CAP_SYS_NICE or an rtprio limit; falls back to normal)
+#   fake_args  appended with --fake; nodes without it are skipped then
+#   manual     only run when named in --only (alternatives to other nodes,
+#              e.g. sensors, which replaces imu and lidar:
+#              --only sensors,detection,fusion,odometry,mapping,bridge,http)
+#
+# Affinity and priority are applied in the child between fork and exec, so
+# every thread the node starts inherits them. Node output goes to
+# <log_dir>/<name>.log. A node that stays up for restart.reset_after seconds
+# gets its backoff reset.
+import argparse
+import json
+import os
+import signal
+import subprocess
+import sys
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+DEFAULT_CONFIG = os.path.join(os.path.dirname(os.path.abspath(__file__)), "nodes.json")
+
+CLOCK_TICKS = os.sysconf("SC_CLK_TCK")
+PAGE_SIZE = os.sysconf("SC_PAGE_SIZE")
+
+def read_proc(pid):
+    # (cpu seconds, rss bytes, threads) of a live process from /proc.
+    with open("/proc/{}/stat".format(pid)) as f:
+        # The command name may contain spaces; fields resume after ")".
+        fields = f.read().rsplit(")", 1)[1].split()
+    utime, stime, threads = int(fields[11]), int(fields[12]), int(fields[17])
+    with open("/proc/{}/statm".format(pid)) as f:
+        rss_pages = int(f.read().split()[1])
+    return (utime + stime) / CLOCK_TICKS, rss_pages * PAGE_SIZE, threads
+
+def apply_scheduling(cpus, nice, realtime):
+    # Runs in the child before exec. Each step is tried on its own, so one
+    # failing (a negative nice without CAP_SYS_NICE) does not skip the
+    # others; failures are reported on the node's stderr (its log) and the
+    # node starts anyway.
+    def report(step, e):
+        os.write(2, "supervisor: {} failed: {}\n".format(step, e).encode())
+
+    def setup():
+        if cpus:
+            try:
+                os.sched_setaffinity(0, cpus)
+            except OSError as e:
+                report("CPU affinity {}".format(cpus), e)
+        if nice:
+            try:
+                os.setpriority(os.PRIO_PROCESS, 0, nice)
+            except OSError as e:
+                report("nice {}".format(nice), e)
+        if realtime:
+            try:
+                os.sched_setscheduler(0, os.SCHED_FIFO, os.sched_param(realtime))
+            except OSError as e:
+                report("SCHED_FIFO priority {}".format(realtime), e)
+    return setup
+
+class Node:
+    def __init__(self, name, config, restart, log_dir, fake):
+        self.name = name
+        self.cmd = [sys.executable if arg == "python3" else arg for arg in config["cmd"]]
+        if fake:
+            self.cmd += config.get("fake_args", [])
+        self.cwd = os.path.normpath(os.path.join(ROOT, config.get("cwd", ".")))
+        available = os.sched_getaffinity(0)
+        self.cpus = [cpu for cpu in config.get("cpus", []) if cpu in available]
+        if config.get("cpus") and not self.cpus:
+            print("{}: none of cores {} exist here, not pinning".format(name, config["cpus"]))
+        self.nice = config.get("nice", 0)
+        self.realtime = config.get("realtime", 0)
+        self.restart = restart
+        self.log_path = os.path.join(log_dir, name + ".log")
+        self.process = None
+        self.started = 0.0
+        self.next_start = 0.0
+        self.delay = restart["initial_delay"]
+        self.restarts = 0
+        self.last_exit = None
+        self.cpu_seconds = 0.0
+        self.sample_time = 0.0
+
+    def start(self):
+        log = open(self.log_path, "ab")
+        env = dict(os.environ, PYTHONUNBUFFERED="1")
+        self.process = subprocess.Popen(self.cmd, cwd=self.cwd, stdout=log, stderr=subprocess.STDOUT, env=env,
+                                        stdin=subprocess.DEVNULL,
+                                        preexec_fn=apply_scheduling(self.cpus, self.nice, self.realtime))
+        log.close()
+        self.started = time.monotonic()
+        self.cpu_seconds = 0.0
+        self.sample_time = self.started
+        print("{}: started pid {} ({})".format(self.name, self.process.pid, " ".join(self.cmd[1:])))
+
+    def poll(self, now):
+        # Start or restart as due. Returns False once the node is running.
+        if self.process is not None:
+            code = self.process.poll()
+            if code is None:
+                return False
+            uptime = now - self.started
+            if uptime >= self.restart["reset_after"]:
+                self.delay = self.restart["initial_delay"]
+            self.last_exit = code
+            self.process = None
+            self.next_start = now + self.delay
+            print("{}: exited with {} after {:.1f} s, restarting in {:.1f} s (see {})".format(
+                self.name, code, uptime, self.delay, self.log_path))
+            self.delay = min(self.restart["max_delay"], self.delay * self.restart["factor"])
+            self.restarts += 1
+            return True
+        if now >= self.next_start:
+            self.start()
+        return True
+
+    def stats(self, now):
+        # (cpu %, rss MB, threads, cores, policy) since the previous call.
+        try:
+            cpu_seconds, rss, threads = read_proc(self.process.pid)
+            cores = sorted(os.sched_getaffinity(self.process.pid))
+            policy = os.sched_getscheduler(self.process.pid)
+        except (OSError, ValueError):
+            return None
+        elapsed = max(1e-6, now - self.sample_time)
+        cpu = 100.0 * (cpu_seconds - self.cpu_seconds) / elapsed
+        self.cpu_seconds, self.sample_time = cpu_seconds, now
+        return cpu, rss / 1e6, threads, cores, "fifo" if policy == os.SCHED_FIFO else "other"
+
+    def stop(self):
+        if self.process is not None and self.process.poll() is None:
+            self.process.terminate()
+
+def report(nodes, now):
+    print("{:<10} {:>7} {:>7} {:>9} {:>8} {:>8} {:<10} {}".format(
+        "node", "pid", "cpu %", "rss MB", "threads", "restarts", "policy", "cores"))
+    for node in nodes:
+        stats = node.stats(now) if node.process is not None else None
+        if stats is None:
+            print("{:<10} {:>7} {:>7} {:>9} {:>8} {:>8} {:<10} waiting (last exit {})".format(
+                node.name, "-", "-", "-", "-", node.restarts, "-", node.last_exit))
+            continue
+        cpu, rss, threads, cores, policy = stats
+        print("{:<10} {:>7} {:>7.1f} {:>9.1f} {:>8} {:>8} {:<10} {}".format(
+            node.name, node.process.pid, cpu, rss, threads, node.restarts, policy,
+            ",".join(str(c) for c in cores)))
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--config", default=DEFAULT_CONFIG, help="Supervisor config (JSON)")
+    parser.add_argument("--fake", action="store_true", help="Run fake hardware stand-ins; skip nodes without one")
+    parser.add_argument("--only", default="", help="Comma separated node names to run")
+    args = parser.parse_args()
+
+    with open(args.config) as f:
+        config = json.load(f)
+    os.makedirs(config["log_dir"], exist_ok=True)
+    only = [name for name in args.only.split(",") if name]
+    for name in only:
+        if name not in config["nodes"]:
+            print("Unknown node:", name)
+            exit(1)
+
+    nodes = []
+    for name, node_config in config["nodes"].items():
+        if only and name not in only:
+            continue
+        if node_config.get("manual") and name not in only:
+            continue
+        if args.fake and "fake_args" not in node_config:
+            print("{}: no fake stand-in, skipped".format(name))
+            continue
+        nodes.append(Node(name, node_config, config["restart"], config["log_dir"], args.fake))
+    if not nodes:
+        print("Nothing to run")
+        exit(1)
+
+    stopping = []
+    signal.signal(signal.SIGINT, lambda *_: stopping.append(True))
+    signal.signal(signal.SIGTERM, lambda *_: stopping.append(True))
+
+    print("Supervising {} nodes, logs in {}".format(len(nodes), config["log_dir"]))
+    next_report = time.monotonic() + config["report_interval"]
+    while not stopping:
+        now = time.monotonic()
+        for node in nodes:
+            node.poll(now)
+        if now >= next_report:
+            report(nodes, now)
+            next_report = now + config["report_interval"]
+        time.sleep(0.2)
+
+    print("Stopping nodes...")
+    for node in nodes:
+        node.stop()
+    deadline = time.monotonic() + config["stop_timeout"]
+    for node in nodes:
+        if node.process is None:
+            continue
+        try:
+            node.process.wait(max(0.0, deadline - time.monotonic()))
+        except subprocess.TimeoutExpired:
+            print("{}: did not stop, killing".format(node.name))
+            node.process.kill()
+            node.process.wait()
+
+if __name__ == "__main__":
+    main()